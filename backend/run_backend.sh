@@ -42,4 +42,7 @@ pip3 install aiomysql
 # Assuming the main file is app.py, modify this if it's different
 echo "Starting backend server..."
 python3 src/main.py
+# Multi-worker mode: one AMI ingester feeding several API/Socket.IO workers
+#python3 src/ingester.py &
+#ISPBX_MODE=worker ISPBX_WORKERS=4 python3 src/main.py
 #uvicorn src.main:socket_app --host 0.0.0.0 --port 8000 --reload
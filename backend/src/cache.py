@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/cache.py
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Callable, Awaitable, Hashable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """
+    Bounded LRU cache with per-entry TTL and single-flight fills.
+
+    Concurrent misses on the same key share one fill instead of each running
+    the query. invalidate() bumps a generation counter, so a fill that was
+    already running when the data changed is not stored.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 30.0):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries before the least recently used is evicted
+            ttl: Seconds an entry stays valid
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a cached value if present and fresh.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value or None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_fill(self, key: Hashable, fill: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Get a cached value, filling it with a single shared call on a miss.
+
+        Args:
+            key: Cache key
+            fill: Coroutine factory producing the value
+
+        Returns:
+            The cached or freshly filled value
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        # Fills started before the last invalidation are not shared
+        flight_key = (self._generation, key)
+        inflight = self._inflight.get(flight_key)
+        if inflight:
+            # Another request is already filling this key
+            self.hits += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        generation = self._generation
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = future
+        try:
+            value = await fill()
+            future.set_result(value)
+            if generation == self._generation:
+                self.set(key, value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the error; mark it retrieved in case there are none
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(flight_key, None)
+
+    def invalidate(self):
+        """Drop every entry and discard results of fills already running"""
+        self._entries.clear()
+        self._generation += 1
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary with size, bounds and hit/miss/eviction counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'inflight': len(self._inflight)
+        }
@@ -0,0 +1,672 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/cdr_analytics.py
+
+import os
+import asyncio
+import logging
+import aiomysql
+import numpy as np
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import datetime, timedelta
+from cache import TTLCache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# cdr.start values are naive, so epoch seconds are counted from a naive epoch
+EPOCH = datetime(1970, 1, 1)
+
+# Upper bounds of the call length histogram buckets, in seconds
+LENGTH_BUCKETS = (10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# Named concurrency bucket sizes, in seconds
+BUCKET_SIZES = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Largest concurrency series returned in one response
+MAX_BUCKETS = 10000
+
+# Sections CDRAnalytics.report can compute
+ANALYTICS_SECTIONS = ('summary', 'busy_hour', 'extensions', 'trunks', 'histograms')
+
+# Columns loaded per CDR. The channel peers (PJSIP/<peer>-0000001a) are cut
+# out in SQL so Python never touches the channel strings row by row
+FRAME_QUERY = """
+    SELECT TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', start),
+           COALESCE(duration, 0), COALESCE(billsec, 0),
+           COALESCE(disposition, ''), COALESCE(src, ''), COALESCE(dst, ''),
+           SUBSTRING_INDEX(SUBSTRING_INDEX(COALESCE(channel, ''), '/', -1), '-', 1),
+           SUBSTRING_INDEX(SUBSTRING_INDEX(COALESCE(dstchannel, ''), '/', -1), '-', 1)
+    FROM cdr WHERE {where}
+"""
+
+def factorize(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encode strings as integer codes.
+
+    Args:
+        values: String values
+
+    Returns:
+        Tuple of (codes array, array of distinct values indexed by code)
+    """
+    # A dict lookup per value is far cheaper than np.unique sorting Python strings
+    index: Dict[str, int] = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values),
+                        dtype=np.int32, count=len(values))
+    names = np.empty(len(index), dtype=object)
+    names[:] = list(index)
+    return codes, names
+
+def merge_encoded(parts: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Concatenate dictionary-encoded columns under one shared dictionary.
+
+    Only the dictionaries are walked in Python; codes are remapped with a
+    single fancy-indexing step per part.
+
+    Args:
+        parts: List of (codes, names) pairs
+
+    Returns:
+        Tuple of (codes array, array of distinct values indexed by code)
+    """
+    index: Dict[str, int] = {}
+    merged = []
+    for codes, names in parts:
+        remap = np.fromiter((index.setdefault(name, len(index)) for name in names),
+                            dtype=np.int32, count=len(names))
+        merged.append(remap[codes] if len(codes) else np.zeros(0, dtype=np.int32))
+    names = np.empty(len(index), dtype=object)
+    names[:] = list(index)
+    return (np.concatenate(merged) if merged else np.zeros(0, dtype=np.int32)), names
+
+def channel_peer(channel: str) -> str:
+    """Get the peer of a channel name, like the SUBSTRING_INDEX calls in FRAME_QUERY"""
+    return (channel or '').split('/')[-1].split('-')[0]
+
+def is_trunk_peer(peer: str) -> bool:
+    """Whether a channel peer is a trunk rather than an extension or a Local channel"""
+    return bool(peer) and not peer.isdigit() and '@' not in peer
+
+def encode_columns(columns: List[List[Any]]) -> Dict[str, Any]:
+    """
+    Encode the FRAME_QUERY columns as a part for CDRFrame.from_parts.
+
+    Args:
+        columns: One list per FRAME_QUERY column
+
+    Returns:
+        Encoded part
+    """
+    start, duration, billsec, disposition, src, dst, channel_peer, dstchannel_peer = columns
+    return {
+        'start': np.array(start, dtype=np.int64),
+        'duration': np.array(duration, dtype=np.int32),
+        'billsec': np.array(billsec, dtype=np.int32),
+        'disposition': factorize(disposition),
+        'src': factorize(src),
+        'dst': factorize(dst),
+        'channel_peer': factorize(channel_peer),
+        'dstchannel_peer': factorize(dstchannel_peer)
+    }
+
+class CDRFrame:
+    """
+    CDRs of a date range as NumPy columns.
+
+    start holds seconds since the epoch of the naive cdr.start value, so
+    hours and days fall on database-timezone boundaries like the rollups.
+    Strings are dictionary encoded: disposition, src, dst and trunk are
+    int32 codes into the matching *_names array.
+    """
+
+    def __init__(self, start: np.ndarray, duration: np.ndarray, billsec: np.ndarray,
+                 disposition: np.ndarray, disposition_names: np.ndarray,
+                 src: np.ndarray, dst: np.ndarray, extension_names: np.ndarray,
+                 trunk: np.ndarray, trunk_names: np.ndarray):
+        self.start = start
+        self.duration = duration
+        self.billsec = billsec
+        self.disposition = disposition
+        self.disposition_names = disposition_names
+        self.src = src
+        self.dst = dst
+        self.extension_names = extension_names
+        self.trunk = trunk
+        self.trunk_names = trunk_names
+
+        answered_code = np.flatnonzero(disposition_names == 'ANSWERED')
+        if len(answered_code):
+            self.answered = disposition == answered_code[0]
+        else:
+            self.answered = np.zeros(len(start), dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    @classmethod
+    def from_columns(cls, columns: List[List[Any]]) -> 'CDRFrame':
+        """
+        Build a frame from the FRAME_QUERY columns.
+
+        Args:
+            columns: One list per FRAME_QUERY column
+
+        Returns:
+            The CDR frame
+        """
+        return cls.from_parts([encode_columns(columns)])
+
+    @classmethod
+    def from_parts(cls, parts: List[Dict[str, Any]]) -> 'CDRFrame':
+        """
+        Build a frame from encoded parts, e.g. archive partitions plus MySQL rows.
+
+        Each part holds start, duration and billsec arrays, and disposition,
+        src, dst, channel_peer and dstchannel_peer as (codes, names) pairs.
+
+        Args:
+            parts: Encoded parts
+
+        Returns:
+            The CDR frame
+        """
+        def numeric(name, dtype):
+            return np.concatenate([np.asarray(p[name], dtype=dtype) for p in parts]) if parts else np.zeros(0, dtype=dtype)
+
+        start = numeric('start', np.int64)
+        count = len(start)
+        disposition_codes, disposition_names = merge_encoded([p['disposition'] for p in parts])
+
+        # src and dst share one dictionary so an extension has a single code
+        extension_codes, extension_names = merge_encoded(
+            [p['src'] for p in parts] + [p['dst'] for p in parts]
+        )
+
+        # A trunk is the peer on either side that is not an extension or a
+        # Local channel, preferring the outgoing side
+        peer_codes, peer_names = merge_encoded(
+            [p['channel_peer'] for p in parts] + [p['dstchannel_peer'] for p in parts]
+        )
+        is_trunk = np.array([is_trunk_peer(p) for p in peer_names], dtype=bool)
+        channel_codes, dstchannel_codes = peer_codes[:count], peer_codes[count:]
+        no_trunk = len(peer_names)
+        if count:
+            trunk = np.where(is_trunk[dstchannel_codes], dstchannel_codes,
+                             np.where(is_trunk[channel_codes], channel_codes, no_trunk))
+        else:
+            trunk = np.zeros(0, dtype=np.int32)
+
+        return cls(
+            start=start,
+            duration=numeric('duration', np.int32),
+            billsec=numeric('billsec', np.int32),
+            disposition=disposition_codes,
+            disposition_names=disposition_names,
+            src=extension_codes[:count],
+            dst=extension_codes[count:],
+            extension_names=extension_names,
+            trunk=trunk.astype(np.int32),
+            trunk_names=np.append(peer_names, '')
+        )
+
+def _ratio(numerator, denominator):
+    """Element-wise ratio that is 0 where the denominator is 0"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+def summary(frame: CDRFrame) -> Dict[str, Any]:
+    """
+    Overall KPIs.
+
+    ASR is answered calls over all calls, in percent. ACD is the average
+    billed seconds of answered calls.
+
+    Args:
+        frame: CDR frame
+
+    Returns:
+        Dictionary with call counts, ASR, ACD and disposition counts
+    """
+    calls = len(frame)
+    answered = int(frame.answered.sum())
+    billsec = int(frame.billsec[frame.answered].sum())
+    dispositions = np.bincount(frame.disposition, minlength=len(frame.disposition_names))
+    return {
+        'calls': calls,
+        'answered': answered,
+        'asr': round(100.0 * answered / calls, 2) if calls else 0,
+        'acd': round(billsec / answered, 2) if answered else 0,
+        'billsec': billsec,
+        'disposition_stats': {str(name): int(count) for name, count in zip(frame.disposition_names, dispositions) if count}
+    }
+
+def busy_hour(frame: CDRFrame) -> Dict[str, Any]:
+    """
+    Hourly traffic and the busy hour.
+
+    Traffic is in Erlangs: answered seconds started in an hour divided by
+    3600. The hour-of-day profile averages traffic over the days in range.
+
+    Args:
+        frame: CDR frame
+
+    Returns:
+        Dictionary with the busy hour, per-hour series and hour-of-day profile
+    """
+    if not len(frame):
+        return {'busy_hour': None, 'hours': [], 'hour_of_day': []}
+
+    talk = np.where(frame.answered, frame.billsec, 0).astype(np.float64)
+    hours, index = np.unique(frame.start // 3600, return_inverse=True)
+    calls = np.bincount(index)
+    erlangs = np.bincount(index, weights=talk) / 3600.0
+
+    hour_of_day = (frame.start // 3600) % 24
+    days = len(np.unique(frame.start // 86400))
+    profile_calls = np.bincount(hour_of_day, minlength=24) / days
+    profile_erlangs = np.bincount(hour_of_day, weights=talk, minlength=24) / 3600.0 / days
+
+    def hour_label(hour):
+        return (EPOCH + timedelta(hours=int(hour))).isoformat()
+
+    busiest = int(np.argmax(erlangs))
+    return {
+        'busy_hour': {
+            'hour': hour_label(hours[busiest]),
+            'calls': int(calls[busiest]),
+            'erlangs': round(float(erlangs[busiest]), 3)
+        },
+        'hours': [
+            {'hour': hour_label(h), 'calls': int(c), 'erlangs': round(float(e), 3)}
+            for h, c, e in zip(hours, calls, erlangs)
+        ],
+        'hour_of_day': [
+            {'hour': h, 'calls': round(float(c), 2), 'erlangs': round(float(e), 3)}
+            for h, (c, e) in enumerate(zip(profile_calls, profile_erlangs))
+        ]
+    }
+
+def group_kpis(codes: np.ndarray, names: np.ndarray, frame: CDRFrame,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Per-group KPIs with one bincount per measure.
+
+    Args:
+        codes: Group code of each call
+        names: Group name of each code
+        frame: CDR frame
+        limit: Maximum number of groups, busiest first
+
+    Returns:
+        List of KPI dictionaries, busiest first
+    """
+    size = len(names)
+    calls = np.bincount(codes, minlength=size)
+    answered = np.bincount(codes, weights=frame.answered, minlength=size)
+    billsec = np.bincount(codes, weights=np.where(frame.answered, frame.billsec, 0), minlength=size)
+    asr = 100.0 * _ratio(answered, calls)
+    acd = _ratio(billsec, answered)
+
+    # Busiest first, ignoring the empty name and groups without calls
+    order = np.argsort(-calls, kind='stable')
+    order = order[(calls[order] > 0) & (names[order] != '')]
+    if limit:
+        order = order[:limit]
+
+    return [
+        {
+            'name': str(names[i]),
+            'calls': int(calls[i]),
+            'answered': int(answered[i]),
+            'asr': round(float(asr[i]), 2),
+            'acd': round(float(acd[i]), 2),
+            'billsec': int(billsec[i])
+        }
+        for i in order
+    ]
+
+def extension_kpis(frame: CDRFrame, limit: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    KPIs per extension, as caller (src) and as callee (dst).
+
+    Args:
+        frame: CDR frame
+        limit: Maximum number of extensions per side
+
+    Returns:
+        Dictionary with outbound and inbound KPI lists
+    """
+    return {
+        'outbound': group_kpis(frame.src, frame.extension_names, frame, limit),
+        'inbound': group_kpis(frame.dst, frame.extension_names, frame, limit)
+    }
+
+def trunk_kpis(frame: CDRFrame, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    KPIs per trunk.
+
+    Args:
+        frame: CDR frame
+        limit: Maximum number of trunks
+
+    Returns:
+        List of KPI dictionaries, busiest first
+    """
+    return group_kpis(frame.trunk, frame.trunk_names, frame, limit)
+
+def concurrency(frame: CDRFrame, bucket_seconds: int, lower: int, upper: int,
+                mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Concurrent calls over time with a sweep over call intervals.
+
+    Every call is a [start, start + duration) interval. Starts (+1) and ends
+    (-1) are sorted once, ends before starts at the same second, and a
+    cumulative sum gives the number of calls up after each event. Bucket
+    peaks and averages and the time-weighted percentiles are then read
+    off that sorted sequence with searchsorted/reduceat, so the whole
+    computation is O(n log n) in the number of calls.
+
+    Calls that started before the window are not in the frame, so the
+    first bucket can be undercounted by calls still up at its start.
+
+    Args:
+        frame: CDR frame
+        bucket_seconds: Bucket size in seconds
+        lower: Window start, naive epoch seconds
+        upper: Window end (exclusive), naive epoch seconds
+        mask: Optional selection of calls, e.g. one trunk
+
+    Returns:
+        Dictionary with the peak, time-weighted percentiles and per-bucket series
+    """
+    start = frame.start
+    duration = frame.duration.astype(np.int64)
+    # Zero-length calls occupy nothing and would dip below zero in the sweep
+    keep = duration > 0 if mask is None else mask & (duration > 0)
+    start, end = start[keep], start[keep] + duration[keep]
+
+    edges = np.arange(lower, upper, bucket_seconds, dtype=np.int64)
+    bounds = np.minimum(edges + bucket_seconds, upper)
+
+    times = np.concatenate([start, end])
+    deltas = np.concatenate([np.ones(len(start), dtype=np.int64), -np.ones(len(end), dtype=np.int64)])
+    order = np.lexsort((deltas, times))
+    times, levels = times[order], np.cumsum(deltas[order])
+
+    def level_at(points):
+        """Calls up at each point, after the calls ending there have ended"""
+        if not len(times):
+            return np.zeros(len(points), dtype=np.int64)
+        index = np.searchsorted(times, points, side='right') - 1
+        return np.where(index >= 0, levels[np.maximum(index, 0)], 0)
+
+    # Peak per bucket: the level carried in, or the highest level reached inside
+    peaks = level_at(edges)
+    inside = (times >= lower) & (times < upper)
+    if inside.any():
+        first = np.flatnonzero(inside)[0]
+        buckets = (times[inside] - lower) // bucket_seconds
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        maxima = np.maximum.reduceat(levels[inside], starts)
+        peaks[buckets[starts]] = np.maximum(peaks[buckets[starts]], maxima)
+    else:
+        first = None
+
+    # Area under the level curve, for averages and time-weighted percentiles
+    spans = np.diff(times)
+    area = np.concatenate([[0], np.cumsum(levels[:-1] * spans)]) if len(times) else np.zeros(0)
+
+    def area_at(points):
+        if not len(times):
+            return np.zeros(len(points))
+        index = np.searchsorted(times, points, side='right') - 1
+        safe = np.maximum(index, 0)
+        return np.where(index >= 0, area[safe] + levels[safe] * (points - times[safe]), 0)
+
+    widths = (bounds - edges).astype(np.float64)
+    averages = _ratio(area_at(bounds) - area_at(edges), widths)
+
+    # Seconds spent at each level inside the window
+    percentiles = {'p50': 0, 'p90': 0, 'p95': 0, 'p99': 0}
+    if len(times):
+        clipped = np.clip(times, lower, upper)
+        seconds_at = np.bincount(levels[:-1], weights=np.diff(clipped), minlength=1)
+        seconds_at[0] += max(0, min(times[0], upper) - lower) + max(0, upper - max(times[-1], lower))
+        cumulative = np.cumsum(seconds_at)
+        if cumulative[-1] > 0:
+            for name, q in (('p50', 0.5), ('p90', 0.9), ('p95', 0.95), ('p99', 0.99)):
+                percentiles[name] = int(np.searchsorted(cumulative, q * cumulative[-1], side='left'))
+
+    peak = {'calls': 0, 'at': None}
+    if first is not None:
+        best = int(np.argmax(levels[inside])) + first
+        peak = {'calls': int(levels[best]), 'at': (EPOCH + timedelta(seconds=int(times[best]))).isoformat()}
+    elif len(peaks) and peaks.max() > 0:
+        best = int(np.argmax(peaks))
+        peak = {'calls': int(peaks[best]), 'at': (EPOCH + timedelta(seconds=int(edges[best]))).isoformat()}
+
+    return {
+        'bucket_seconds': bucket_seconds,
+        'calls': int(len(start)),
+        'peak': peak,
+        'percentiles': percentiles,
+        'buckets': [
+            {
+                'start': (EPOCH + timedelta(seconds=int(edge))).isoformat(),
+                'peak': int(p),
+                'average': round(float(a), 3)
+            }
+            for edge, p, a in zip(edges, peaks, averages)
+        ]
+    }
+
+def histograms(frame: CDRFrame) -> Dict[str, Any]:
+    """
+    Call length histograms and percentiles.
+
+    Talk time covers answered calls (billsec). Ring time is duration minus
+    billsec for answered calls, and the whole duration otherwise.
+
+    Args:
+        frame: CDR frame
+
+    Returns:
+        Dictionary with bucket counts and percentiles for talk and ring time
+    """
+    def histogram(values):
+        counts = np.bincount(np.searchsorted(LENGTH_BUCKETS, values, side='left'),
+                             minlength=len(LENGTH_BUCKETS) + 1)
+        buckets = {str(bound): int(count) for bound, count in zip(LENGTH_BUCKETS, counts)}
+        buckets['+Inf'] = int(counts[-1])
+        if len(values):
+            p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+        else:
+            p50 = p90 = p95 = p99 = 0
+        return {
+            'buckets': buckets,
+            'percentiles': {'p50': float(p50), 'p90': float(p90), 'p95': float(p95), 'p99': float(p99)}
+        }
+
+    talk = frame.billsec[frame.answered]
+    ring = np.where(frame.answered, frame.duration - frame.billsec, frame.duration)
+    return {
+        'talk_time': histogram(talk),
+        'ring_time': histogram(np.maximum(ring, 0))
+    }
+
+class CDRAnalytics:
+    """
+    Vectorized CDR analytics over a date range.
+
+    The CDRs of a range are read once through an unbuffered cursor into
+    NumPy columns (CDRFrame); every KPI is then a handful of bincount /
+    unique calls over those arrays instead of a Python loop over rows.
+    Frames are cached for a short TTL rather than invalidated on every new
+    call, since re-reading a large range per finished call would cost more
+    than slightly stale analytics.
+    """
+
+    def __init__(self, cdr_manager, default_days: int = 7):
+        """
+        Initialize the analytics engine.
+
+        Args:
+            cdr_manager: CDRManager whose pool and filter helpers are used
+            default_days: Days covered when no start date is given
+        """
+        self.cdr_manager = cdr_manager
+        self.default_days = default_days
+        self.cache = TTLCache(
+            maxsize=int(os.getenv('CDR_ANALYTICS_CACHE_SIZE', '4')),
+            ttl=float(os.getenv('CDR_ANALYTICS_CACHE_TTL', '60'))
+        )
+
+    def _default_start(self, start_date: Optional[str]) -> str:
+        """Default the start date to default_days ago"""
+        if start_date:
+            return start_date
+        start = datetime.now(self.cdr_manager.timezone) - timedelta(days=self.default_days - 1)
+        return start.strftime('%Y-%m-%d')
+
+    async def load(self, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None,
+                   src: Optional[str] = None,
+                   dst: Optional[str] = None,
+                   disposition: Optional[str] = None) -> CDRFrame:
+        """
+        Load the CDRs matching the filters into a frame.
+
+        Args:
+            start_date: Start date (defaults to default_days ago)
+            end_date: End date, inclusive
+            src: Filter by source extension
+            dst: Filter by destination extension
+            disposition: Filter by call disposition
+
+        Returns:
+            The CDR frame
+        """
+        start_date = self._default_start(start_date)
+        filters = {'src': src, 'dst': dst, 'disposition': disposition}
+        where, params = self.cdr_manager.build_filters(start_date=start_date, end_date=end_date, **filters)
+        key = ('frame', where, tuple(params))
+        return await self.cache.get_or_fill(
+            key, lambda: self._load_frame(start_date, end_date, filters)
+        )
+
+    async def _load_frame(self, start_date: Optional[str], end_date: Optional[str],
+                          filters: Dict[str, Optional[str]]) -> CDRFrame:
+        """
+        Read the frame columns and build the arrays off the loop.
+
+        Days before the archive cutoff come from the columnar archive
+        (cdr_archive.py); only the rest is read from MySQL.
+        """
+        started = asyncio.get_running_loop().time()
+        lower, upper = self.cdr_manager.date_range(start_date, end_date)
+        archive = self.cdr_manager.archive
+        cutoff = archive.cutoff if archive else None
+
+        parts = []
+        if cutoff and (lower is None or lower < cutoff):
+            parts = await asyncio.to_thread(archive.frame_parts, lower, upper, filters)
+
+        columns = [[] for _ in range(8)]
+        if not cutoff or upper is None or upper > cutoff:
+            if not self.cdr_manager.pool:
+                await self.cdr_manager.connect()
+            where, params = self.cdr_manager.build_filters(
+                start_date=start_date, end_date=end_date, not_before=cutoff, **filters
+            )
+            async with self.cdr_manager.pool.acquire() as conn:
+                async with conn.cursor(aiomysql.SSCursor) as cur:
+                    await cur.execute(FRAME_QUERY.format(where=where), params)
+                    while True:
+                        rows = await cur.fetchmany(10000)
+                        if not rows:
+                            break
+                        for column, values in zip(columns, zip(*rows)):
+                            column.extend(values)
+
+        frame = await asyncio.to_thread(lambda: CDRFrame.from_parts(parts + [encode_columns(columns)]))
+        elapsed = asyncio.get_running_loop().time() - started
+        logger.info(f"Loaded {len(frame)} CDRs for analytics ({len(parts)} archived days) in {elapsed:.2f}s")
+        return frame
+
+    async def report(self, start_date: Optional[str] = None,
+                     end_date: Optional[str] = None,
+                     src: Optional[str] = None,
+                     dst: Optional[str] = None,
+                     disposition: Optional[str] = None,
+                     sections: Tuple[str, ...] = ('summary', 'busy_hour'),
+                     limit: Optional[int] = 20) -> Dict[str, Any]:
+        """
+        Compute analytics sections for the filters.
+
+        Args:
+            start_date: Start date (defaults to default_days ago)
+            end_date: End date, inclusive
+            src: Filter by source extension
+            dst: Filter by destination extension
+            disposition: Filter by call disposition
+            sections: Any of summary, busy_hour, extensions, trunks, histograms
+            limit: Maximum number of groups in extensions and trunks
+
+        Returns:
+            Dictionary with one entry per requested section
+        """
+        frame = await self.load(start_date, end_date, src, dst, disposition)
+        builders = {
+            'summary': lambda: summary(frame),
+            'busy_hour': lambda: busy_hour(frame),
+            'extensions': lambda: extension_kpis(frame, limit),
+            'trunks': lambda: trunk_kpis(frame, limit),
+            'histograms': lambda: histograms(frame)
+        }
+        return {section: builders[section]() for section in sections}
+
+    async def concurrency(self, start_date: Optional[str] = None,
+                          end_date: Optional[str] = None,
+                          bucket: str = 'hour',
+                          trunk: Optional[str] = None,
+                          src: Optional[str] = None,
+                          dst: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Concurrent calls timeline for a date range.
+
+        Args:
+            start_date: Start date (defaults to default_days ago)
+            end_date: End date, inclusive (defaults to now)
+            bucket: minute, hour, day or a number of seconds
+            trunk: Only calls over this trunk
+            src: Filter by source extension
+            dst: Filter by destination extension
+
+        Returns:
+            Dictionary with the peak, percentiles and per-bucket series
+
+        Raises:
+            ValueError: If the bucket is invalid or the range has too many buckets
+        """
+        bucket_seconds = BUCKET_SIZES.get(bucket) or int(bucket)
+        if bucket_seconds < 60:
+            raise ValueError("Bucket must be at least 60 seconds")
+
+        start_date = self._default_start(start_date)
+        lower, upper = self.cdr_manager.date_range(start_date, end_date)
+        if upper is None:
+            upper = datetime.now(self.cdr_manager.db_timezone).replace(tzinfo=None)
+        lower_epoch = (lower - EPOCH) // timedelta(seconds=1)
+        upper_epoch = (upper - EPOCH) // timedelta(seconds=1)
+        if (upper_epoch - lower_epoch) / bucket_seconds > MAX_BUCKETS:
+            raise ValueError(f"Range has more than {MAX_BUCKETS} buckets, use a larger bucket")
+
+        frame = await self.load(start_date, end_date, src, dst)
+        mask = None
+        if trunk:
+            codes = np.flatnonzero(frame.trunk_names == trunk)
+            mask = frame.trunk == codes[0] if len(codes) else np.zeros(len(frame), dtype=bool)
+        return await asyncio.to_thread(concurrency, frame, bucket_seconds, lower_epoch, upper_epoch, mask)
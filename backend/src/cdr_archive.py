@@ -0,0 +1,613 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/cdr_archive.py
+"""Day-partitioned columnar archive of closed CDR days.
+
+Each archived day is a directory holding one .npy file per cdr column and
+a meta.json manifest. Datetimes and integers are stored as fixed-width
+int64 arrays (naive epoch seconds for datetimes), strings as int32 codes
+into a per-day dictionary kept in the manifest. Columns are opened with
+np.load(mmap_mode='r'), so a query only pages in the parts of the files it
+touches. Rows are sorted by (start, uniqueid), so a time range is two
+binary searches on the start column.
+
+Historical queries read archived days from disk and only the days after
+the archive cutoff from MySQL, keeping them off the database Asterisk
+writes to. The archive never deletes anything from the cdr table.
+
+Usage:
+    CDR_ARCHIVE_DIR=/var/lib/ispbx/cdr python3 src/cdr_archive.py   # archive every closed day
+"""
+
+import os
+import json
+import shutil
+import asyncio
+import logging
+import aiomysql
+import numpy as np
+from decimal import Decimal
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import datetime, date, timedelta
+from cdr_analytics import channel_peer
+from cdr_search import matches
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT_VERSION = 1
+
+# MySQL named lock held while archiving, so only one worker process exports
+ARCHIVE_LOCK = 'cdr_archive'
+
+# cdr.start values are naive, so epoch seconds are counted from a naive epoch
+EPOCH = datetime(1970, 1, 1)
+
+# Stored in place of NULL in fixed-width integer columns
+NULL_INT = np.iinfo(np.int64).min
+
+def to_epoch(value: datetime) -> int:
+    """Convert a naive datetime to epoch seconds, rounding up partial seconds"""
+    seconds = (value - EPOCH) // timedelta(seconds=1)
+    return seconds + 1 if value.microsecond else seconds
+
+def from_epoch(seconds: int) -> datetime:
+    """Convert epoch seconds back to a naive datetime"""
+    return EPOCH + timedelta(seconds=int(seconds))
+
+def column_kind(values: List[Any]) -> str:
+    """Pick the storage kind of a column from its first non-NULL value"""
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, datetime):
+            return 'datetime'
+        if isinstance(value, Decimal):
+            return 'float'
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return 'str'
+        return 'int' if isinstance(value, int) else 'float'
+    return 'str'
+
+class ArchivePartition:
+    """One archived day, with its columns memory-mapped on first use"""
+
+    def __init__(self, path: str):
+        """
+        Open an archived day.
+
+        Args:
+            path: Directory of the day
+        """
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.day = date.fromisoformat(meta['day'])
+        self.rows = meta['rows']
+        self.columns = [column['name'] for column in meta['columns']]
+        self.kinds = {column['name']: column['kind'] for column in meta['columns']}
+        self.dictionaries = {}
+        for column in meta['columns']:
+            if column['kind'] == 'str':
+                names = np.empty(len(column['values']), dtype=object)
+                names[:] = column['values']
+                self.dictionaries[column['name']] = names
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._lookups: Dict[str, Dict[str, int]] = {}
+        self._peers: Dict[str, np.ndarray] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        """Get a column as a read-only memory-mapped array"""
+        array = self._arrays.get(name)
+        if array is None:
+            if self.rows:
+                array = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+            else:
+                # Empty files cannot be memory-mapped
+                dtype = np.int32 if self.kinds[name] == 'str' else np.float64 if self.kinds[name] == 'float' else np.int64
+                array = np.zeros(0, dtype=dtype)
+            self._arrays[name] = array
+        return array
+
+    def code(self, name: str, value: str) -> Optional[int]:
+        """Get the dictionary code of a string value, None if it never occurs"""
+        lookup = self._lookups.get(name)
+        if lookup is None:
+            lookup = self._lookups[name] = {v: i for i, v in enumerate(self.dictionaries[name])}
+        return lookup.get(value)
+
+    def select(self, lower: Optional[datetime], upper: Optional[datetime],
+               filters: Dict[str, Any]) -> np.ndarray:
+        """
+        Get the row indexes matching a start range and the CDR filters.
+
+        Args:
+            lower: Inclusive lower bound on start
+            upper: Exclusive upper bound on start
+            filters: src, dst and disposition equality filters, and optionally
+                     search, search_field and search_mode as in build_filters
+
+        Returns:
+            Ascending array of row indexes
+        """
+        start = self.column('start')
+        first = int(np.searchsorted(start, to_epoch(lower), side='left')) if lower else 0
+        last = int(np.searchsorted(start, to_epoch(upper), side='left')) if upper else self.rows
+        indexes = np.arange(first, max(first, last))
+
+        for name in ('src', 'dst', 'disposition'):
+            value = filters.get(name)
+            if not value or not len(indexes):
+                continue
+            code = self.code(name, value) if name in self.dictionaries else None
+            if code is None:
+                return indexes[:0]
+            indexes = indexes[self.column(name)[indexes] == code]
+
+        search = filters.get('search')
+        if search and len(indexes):
+            # Match the dictionary once, then keep the rows whose code matched
+            field, mode = filters.get('search_field', 'src'), filters.get('search_mode', 'contains')
+            text = search.casefold()
+            dictionary = self.dictionaries.get(field, ())
+            matched = np.fromiter((matches(value, mode, text) for value in dictionary),
+                                  dtype=bool, count=len(dictionary))
+            # NULL is stored as -1, which picks the trailing False
+            matched = np.append(matched, False)
+            indexes = indexes[matched[self.column(field)[indexes]]]
+        return indexes
+
+    def value(self, name: str, index: int) -> Any:
+        """Decode one stored value"""
+        raw = self.column(name)[index]
+        kind = self.kinds[name]
+        if kind == 'str':
+            return None if raw < 0 else self.dictionaries[name][raw]
+        if kind == 'float':
+            return None if np.isnan(raw) else float(raw)
+        if raw == NULL_INT:
+            return None
+        return from_epoch(raw).isoformat() if kind == 'datetime' else int(raw)
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """Decode one row into a record shaped like get_cdr_records output"""
+        return {name: self.value(name, index) for name in self.columns}
+
+    def encoded(self, name: str, indexes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Get a string column as (codes, names) with NULL mapped to ''"""
+        names = np.append(self.dictionaries[name], '')
+        codes = np.asarray(self.column(name)[indexes])
+        return np.where(codes < 0, len(names) - 1, codes).astype(np.int32), names
+
+    def encoded_peer(self, name: str, indexes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the channel peers of a channel column as (codes, names)"""
+        peers = self._peers.get(name)
+        if peers is None:
+            names = np.empty(len(self.dictionaries[name]) + 1, dtype=object)
+            names[:] = [channel_peer(channel) for channel in self.dictionaries[name]] + ['']
+            peers = self._peers[name] = names
+        codes = np.asarray(self.column(name)[indexes])
+        return np.where(codes < 0, len(peers) - 1, codes).astype(np.int32), peers
+
+    def frame_part(self, indexes: np.ndarray) -> Dict[str, Any]:
+        """Get the selected rows as an encoded part for CDRFrame.from_parts"""
+        return {
+            'start': np.asarray(self.column('start')[indexes]),
+            'duration': np.maximum(np.asarray(self.column('duration')[indexes]), 0),
+            'billsec': np.maximum(np.asarray(self.column('billsec')[indexes]), 0),
+            'disposition': self.encoded('disposition', indexes),
+            'src': self.encoded('src', indexes),
+            'dst': self.encoded('dst', indexes),
+            'channel_peer': self.encoded_peer('channel', indexes),
+            'dstchannel_peer': self.encoded_peer('dstchannel', indexes)
+        }
+
+class CDRArchive:
+    """
+    Exports closed CDR days into the columnar archive and reads them back.
+
+    A day is closed once it ended more than close_after ago in the database
+    timezone, leaving time for calls that crossed midnight to be written.
+    Calls longer than that still land after their day was archived, so the
+    last recheck_days archived days are counted again on every run and
+    re-exported when MySQL holds a different number of rows. Days without
+    calls are archived as empty partitions, so the archived days form a
+    contiguous run and everything before the cutoff can be served from disk.
+    """
+
+    def __init__(self, cdr_manager, path: str, interval: float = 3600.0,
+                 close_after: float = 21600.0, recheck_days: int = 3, max_open: int = 64):
+        """
+        Initialize the archive.
+
+        Args:
+            cdr_manager: CDRManager whose pool is used for exports
+            path: Archive directory
+            interval: Seconds between background archive runs
+            close_after: Seconds after midnight before the previous day is archived
+            recheck_days: Number of most recent archived days re-counted on each run
+            max_open: Number of partitions kept open
+        """
+        self.cdr_manager = cdr_manager
+        self.path = path
+        self.interval = interval
+        self.close_after = close_after
+        self.recheck_days = recheck_days
+        self.max_open = max_open
+        self._days: List[date] = []
+        self._cutoff: Optional[datetime] = None
+        self._open: OrderedDict = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.last_run = None
+
+    @property
+    def cutoff(self) -> Optional[datetime]:
+        """Naive database-time instant before which every CDR is archived"""
+        return self._cutoff
+
+    def scan(self):
+        """Find the archived days and the cutoff of their contiguous run"""
+        os.makedirs(self.path, exist_ok=True)
+        days = []
+        for name in os.listdir(self.path):
+            if os.path.exists(os.path.join(self.path, name, 'meta.json')):
+                try:
+                    days.append(date.fromisoformat(name))
+                except ValueError:
+                    continue
+        days.sort()
+
+        cutoff = None
+        for i, day in enumerate(days):
+            if i and day != days[i - 1] + timedelta(days=1):
+                break
+            cutoff = datetime.combine(day + timedelta(days=1), datetime.min.time())
+
+        self._days = days
+        self._cutoff = cutoff
+        self._open.clear()
+
+    def partition(self, day: date) -> ArchivePartition:
+        """Get an archived day, keeping recently used ones open"""
+        partition = self._open.get(day)
+        if partition is None:
+            partition = ArchivePartition(os.path.join(self.path, day.isoformat()))
+            self._open[day] = partition
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        else:
+            self._open.move_to_end(day)
+        return partition
+
+    def _days_in(self, lower: Optional[datetime], upper: Optional[datetime]) -> List[date]:
+        """Get the archived days before the cutoff overlapping [lower, upper)"""
+        upper = min(upper, self._cutoff) if upper else self._cutoff
+        return [
+            day for day in self._days
+            if (lower is None or day >= lower.date())
+            and datetime.combine(day, datetime.min.time()) < upper
+        ]
+
+    def query_records(self, lower: Optional[datetime], upper: Optional[datetime],
+                      filters: Dict[str, Any], limit: int, offset: int = 0,
+                      seek: Optional[Tuple[datetime, str]] = None) -> List[Dict[str, Any]]:
+        """
+        Get archived records ordered by (start, uniqueid) descending.
+
+        Args:
+            lower: Inclusive lower bound on start
+            upper: Exclusive upper bound on start (clamped to the cutoff)
+            filters: CDR filters, as in ArchivePartition.select
+            limit: Maximum number of records
+            offset: Number of matching records to skip
+            seek: (start, uniqueid) of the last record of the previous page
+
+        Returns:
+            List of CDR records as dictionaries
+        """
+        if not self._cutoff or limit <= 0:
+            return []
+        upper = min(upper, self._cutoff) if upper else self._cutoff
+        if seek:
+            # The seek is exclusive, so rows at the seek second are checked below
+            upper = min(upper, seek[0] + timedelta(seconds=1))
+
+        records = []
+        for day in reversed(self._days_in(lower, upper)):
+            partition = self.partition(day)
+            indexes = partition.select(lower, upper, filters)
+            if seek and len(indexes):
+                seek_epoch = to_epoch(seek[0])
+                starts = partition.column('start')[indexes]
+                at_seek = starts == seek_epoch
+                if at_seek.any():
+                    before = np.array([
+                        partition.value('uniqueid', i) < seek[1] for i in indexes[at_seek]
+                    ], dtype=bool)
+                    keep = ~at_seek
+                    keep[at_seek] = before
+                    indexes = indexes[keep]
+
+            if offset >= len(indexes):
+                offset -= len(indexes)
+                continue
+            newest_first = indexes[::-1][offset:offset + limit - len(records)]
+            offset = 0
+            records.extend(partition.record(i) for i in newest_first)
+            if len(records) >= limit:
+                break
+        return records
+
+    def frame_parts(self, lower: Optional[datetime], upper: Optional[datetime],
+                    filters: Dict[str, Optional[str]]) -> List[Dict[str, Any]]:
+        """
+        Get archived rows as encoded parts for CDRFrame.from_parts.
+
+        Args:
+            lower: Inclusive lower bound on start
+            upper: Exclusive upper bound on start (clamped to the cutoff)
+            filters: src, dst and disposition filters
+
+        Returns:
+            One encoded part per archived day in range
+        """
+        if not self._cutoff:
+            return []
+        upper = min(upper, self._cutoff) if upper else self._cutoff
+        parts = []
+        for day in self._days_in(lower, upper):
+            partition = self.partition(day)
+            parts.append(partition.frame_part(partition.select(lower, upper, filters)))
+        return parts
+
+    async def start(self):
+        """Scan the archive and start archiving closed days in the background"""
+        await asyncio.to_thread(self.scan)
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the background archiver"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """Archive closed days every interval"""
+        while True:
+            try:
+                await self.archive_closed_days()
+            except Exception as e:
+                logger.error(f"Error archiving CDRs: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _last_closed_day(self) -> date:
+        """Get the most recent day that can no longer receive CDRs"""
+        now = datetime.now(self.cdr_manager.db_timezone).replace(tzinfo=None)
+        return (now - timedelta(seconds=self.close_after)).date() - timedelta(days=1)
+
+    async def archive_closed_days(self) -> List[date]:
+        """
+        Archive every closed day after the archived run, and re-export the
+        recently archived days that gained or lost rows since.
+
+        With several worker processes only the one holding the MySQL named
+        lock exports; the others only rescan for partitions it wrote.
+
+        Returns:
+            List of newly archived or re-exported days
+        """
+        async with self._lock:
+            if not self.cdr_manager.pool:
+                await self.cdr_manager.connect()
+            # The lock belongs to this connection and is kept for the whole run
+            async with self.cdr_manager.pool.acquire() as lock_conn:
+                async with lock_conn.cursor() as cur:
+                    await cur.execute("SELECT GET_LOCK(%s, 0)", (ARCHIVE_LOCK,))
+                    locked = (await cur.fetchone())[0] == 1
+                if not locked:
+                    await asyncio.to_thread(self.scan)
+                    logger.debug("CDRs are being archived by another process")
+                    return []
+                try:
+                    return await self._archive_closed_days()
+                finally:
+                    async with lock_conn.cursor() as cur:
+                        await cur.execute("SELECT RELEASE_LOCK(%s)", (ARCHIVE_LOCK,))
+
+    async def _archive_closed_days(self) -> List[date]:
+        """Export the closed days after the archived run, holding the lock"""
+        # Partitions written by the previous lock holder count as archived
+        await asyncio.to_thread(self.scan)
+
+        archived = await self._recheck_days()
+
+        if self._cutoff:
+            first = self._cutoff.date()
+        else:
+            async with self.cdr_manager.pool.acquire() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT MIN(start) FROM cdr")
+                    (oldest,) = await cur.fetchone()
+            if not oldest:
+                return archived
+            first = oldest.date()
+
+        day = first
+        last = self._last_closed_day()
+        while day <= last:
+            await self.archive_day(day)
+            archived.append(day)
+            day += timedelta(days=1)
+
+        if archived:
+            await asyncio.to_thread(self.scan)
+            # Historical queries can move off MySQL now
+            self.cdr_manager.invalidate_cache()
+            logger.info(f"Archived {len(archived)} CDR days, cutoff now {self._cutoff}")
+        self.last_run = datetime.now()
+        return archived
+
+    async def _recheck_days(self) -> List[date]:
+        """Re-export the recent archived days whose row count changed in MySQL"""
+        days = self._days[-self.recheck_days:] if self.recheck_days > 0 else []
+        if not days:
+            return []
+
+        lower = datetime.combine(days[0], datetime.min.time())
+        upper = datetime.combine(days[-1] + timedelta(days=1), datetime.min.time())
+        async with self.cdr_manager.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT DATE(start), COUNT(*) FROM cdr WHERE start >= %s AND start < %s GROUP BY 1",
+                    (lower, upper)
+                )
+                counts = {row[0]: row[1] for row in await cur.fetchall()}
+
+        changed = []
+        for day in days:
+            archived_rows = self.partition(day).rows
+            if counts.get(day, 0) != archived_rows:
+                logger.warning(f"CDR count for archived day {day} changed from {archived_rows} "
+                               f"to {counts.get(day, 0)}, re-exporting it")
+                await self.archive_day(day, replace=True)
+                changed.append(day)
+        return changed
+
+    async def archive_day(self, day: date, replace: bool = False) -> int:
+        """
+        Export one day of CDRs into a partition.
+
+        The partition is written to a temporary directory and renamed into
+        place, so readers never see a half-written day.
+
+        Args:
+            day: Day to export, in the database timezone
+            replace: Swap out an existing partition of the day instead of keeping it
+
+        Returns:
+            Number of archived rows
+        """
+        lower = datetime.combine(day, datetime.min.time())
+        columns: List[str] = []
+        values: List[List[Any]] = []
+        async with self.cdr_manager.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.SSCursor) as cur:
+                await cur.execute(
+                    "SELECT * FROM cdr WHERE start >= %s AND start < %s ORDER BY start, uniqueid",
+                    (lower, lower + timedelta(days=1))
+                )
+                columns = [column[0] for column in cur.description]
+                values = [[] for _ in columns]
+                while True:
+                    rows = await cur.fetchmany(10000)
+                    if not rows:
+                        break
+                    for column, chunk in zip(values, zip(*rows)):
+                        column.extend(chunk)
+
+        rows = await asyncio.to_thread(self._write_partition, day, columns, values, replace)
+        logger.info(f"Archived {rows} CDRs for {day}")
+        return rows
+
+    def _write_partition(self, day: date, columns: List[str], values: List[List[Any]],
+                         replace: bool = False) -> int:
+        """Encode the columns and write the partition atomically"""
+        target = os.path.join(self.path, day.isoformat())
+        tmp = f"{target}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        meta_columns = []
+        rows = len(values[0]) if values else 0
+        for name, column in zip(columns, values):
+            kind = column_kind(column)
+            meta = {'name': name, 'kind': kind}
+            if kind == 'str':
+                index: Dict[str, int] = {}
+                array = np.fromiter(
+                    (-1 if v is None else index.setdefault(v.decode() if isinstance(v, bytes) else str(v), len(index))
+                     for v in column),
+                    dtype=np.int32, count=rows
+                )
+                meta['values'] = list(index)
+            elif kind == 'datetime':
+                array = np.fromiter((NULL_INT if v is None else to_epoch(v) for v in column),
+                                    dtype=np.int64, count=rows)
+            elif kind == 'int':
+                array = np.fromiter((NULL_INT if v is None else v for v in column),
+                                    dtype=np.int64, count=rows)
+            else:
+                array = np.fromiter((np.nan if v is None else float(v) for v in column),
+                                    dtype=np.float64, count=rows)
+            np.save(os.path.join(tmp, f'{name}.npy'), array)
+            meta_columns.append(meta)
+
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({
+                'version': ARCHIVE_FORMAT_VERSION,
+                'day': day.isoformat(),
+                'rows': rows,
+                'columns': meta_columns
+            }, f)
+
+        if replace and os.path.exists(target):
+            # Directories can't be renamed over, so move the old day aside first;
+            # open memory maps keep reading the unlinked files
+            old = f"{target}.old-{os.getpid()}"
+            shutil.rmtree(old, ignore_errors=True)
+            os.rename(target, old)
+            os.rename(tmp, target)
+            shutil.rmtree(old, ignore_errors=True)
+            return rows
+
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # Another worker archived the same day first
+            shutil.rmtree(tmp, ignore_errors=True)
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get archive status.
+
+        Returns:
+            Dictionary with archived day range, cutoff and last run
+        """
+        return {
+            'path': self.path,
+            'days': len(self._days),
+            'first_day': self._days[0].isoformat() if self._days else None,
+            'last_day': self._days[-1].isoformat() if self._days else None,
+            'cutoff': self._cutoff.isoformat() if self._cutoff else None,
+            'open_partitions': len(self._open),
+            'last_run': self.last_run.isoformat() if self.last_run else None
+        }
+
+async def main():
+    from cdr_manager import CDRManager
+
+    cdr_manager = CDRManager(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        port=int(os.getenv('MYSQL_PORT', '3306')),
+        user=os.getenv('MYSQL_USER', 'asteriskuser'),
+        password=os.getenv('MYSQL_PASSWORD', 'asteriskpassword'),
+        db=os.getenv('CDR_MYSQL_DATABASE', 'asterisk')
+    )
+    archive = CDRArchive(cdr_manager, os.getenv('CDR_ARCHIVE_DIR', 'cdr_archive'))
+    try:
+        archived = await archive.archive_closed_days()
+        logger.info(f"Archived days: {[d.isoformat() for d in archived] or 'none'}")
+        logger.info(f"Archive status: {archive.stats()}")
+    finally:
+        await cdr_manager.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
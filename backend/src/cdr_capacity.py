@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/cdr_capacity.py
+
+import asyncio
+import logging
+import aiomysql
+import numpy as np
+from typing import Dict, List, Optional, Any
+from datetime import datetime, timedelta
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Largest installed trunk line count accepted, bounds the Erlang-B table
+MAX_TRUNK_LINES = 10000
+
+# Queue calls per queue and hour of day. The caller's CDR of a queued call
+# ends in the Queue application with the queue name first in lastdata.
+QUEUE_TRAFFIC_QUERY = """
+    SELECT SUBSTRING_INDEX(lastdata, ',', 1) AS queue, HOUR(start) AS hour,
+           COUNT(*) AS calls,
+           SUM(disposition = 'ANSWERED') AS answered,
+           SUM(CASE WHEN disposition = 'ANSWERED' THEN billsec ELSE 0 END) AS talk
+    FROM cdr
+    WHERE lastapp = 'Queue' AND {where}
+    GROUP BY queue, hour
+"""
+
+def erlang_b_table(traffic: np.ndarray, max_servers: int) -> np.ndarray:
+    """
+    Erlang-B blocking for every cell and server count.
+
+    Uses the recursion B(n) = A B(n-1) / (n + A B(n-1)), which is stable
+    for any load, vectorized over the cells.
+
+    Args:
+        traffic: Offered traffic of each cell in Erlangs
+        max_servers: Largest server count
+
+    Returns:
+        Array of shape (cells, max_servers + 1), column n holding B(n)
+    """
+    table = np.empty((len(traffic), max_servers + 1))
+    table[:, 0] = 1.0
+    for n in range(1, max_servers + 1):
+        previous = traffic * table[:, n - 1]
+        table[:, n] = previous / (n + previous)
+    return table
+
+def erlang_c_table(traffic: np.ndarray, max_agents: int) -> np.ndarray:
+    """
+    Erlang-C probability of waiting for every cell and agent count.
+
+    Derived from Erlang-B as C(n) = n B(n) / (n - A (1 - B(n))). With no
+    more agents than Erlangs the queue never drains and every call waits.
+
+    Args:
+        traffic: Offered traffic of each cell in Erlangs
+        max_agents: Largest agent count
+
+    Returns:
+        Array of shape (cells, max_agents + 1), column n holding C(n)
+    """
+    blocking = erlang_b_table(traffic, max_agents)
+    agents = np.arange(max_agents + 1)
+    load = traffic[:, None]
+    stable = agents > load
+    with np.errstate(divide='ignore', invalid='ignore'):
+        waiting = agents * blocking / (agents - load * (1.0 - blocking))
+    return np.where(stable, waiting, 1.0)
+
+def first_meeting(ok: np.ndarray) -> np.ndarray:
+    """Get the first column where ok holds in each row, -1 when none does"""
+    found = ok.any(axis=1)
+    return np.where(found, ok.argmax(axis=1), -1)
+
+def staffing(traffic: np.ndarray, handle_time: np.ndarray, answer_time: np.ndarray,
+             target: float, max_agents: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Erlang-C staffing for a grid of cells in one pass.
+
+    Service level is the share of calls answered within the answer time,
+    SL(n) = 1 - C(n) exp(-(n - A) T / AHT). The required agents are the
+    smallest n reaching the target.
+
+    Args:
+        traffic: Offered traffic of each cell in Erlangs
+        handle_time: Average handle time of each cell in seconds
+        answer_time: Service level answer time of each cell in seconds
+        target: Service level target as a fraction, e.g. 0.8
+        max_agents: Largest agent count tried (defaults to well past square-root staffing)
+
+    Returns:
+        Dictionary of per-cell arrays: agents, service_level, asa (average
+        speed of answer in seconds) and occupancy at the required agents
+    """
+    if max_agents is None:
+        peak = float(traffic.max()) if len(traffic) else 0.0
+        max_agents = int(np.ceil(peak + 6 * np.sqrt(peak) + 10))
+
+    waiting = erlang_c_table(traffic, max_agents)
+    agents = np.arange(max_agents + 1)
+    load = traffic[:, None]
+    handle = np.where(handle_time > 0, handle_time, 1.0)[:, None]
+    with np.errstate(over='ignore'):
+        levels = 1.0 - waiting * np.exp(-(agents - load) * answer_time[:, None] / handle)
+    levels = np.where(agents > load, levels, 0.0)
+
+    required = first_meeting(levels >= target)
+    idle = traffic <= 0
+    required = np.where(idle, 0, required)
+
+    rows = np.arange(len(traffic))
+    column = np.clip(required, 0, max_agents)
+    level = np.where(idle, 1.0, levels[rows, column])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        asa = np.where(idle, 0.0, waiting[rows, column] * handle[:, 0] / (column - traffic))
+        occupancy = np.where(idle, 0.0, traffic / column)
+    unmet = required < 0
+    return {
+        'agents': required,
+        'service_level': np.where(unmet, np.nan, level),
+        'asa': np.where(unmet, np.nan, asa),
+        'occupancy': np.where(unmet, np.nan, occupancy)
+    }
+
+def trunk_lines(traffic: np.ndarray, blocking_target: float,
+                lines: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Erlang-B trunk sizing for a grid of cells in one pass.
+
+    Args:
+        traffic: Offered line traffic of each cell in Erlangs
+        blocking_target: Acceptable blocking as a fraction, e.g. 0.01
+        lines: Installed line count to report the blocking of
+
+    Returns:
+        Dictionary of per-cell arrays: lines_required and, when lines is
+        given, blocking at the installed lines
+    """
+    peak = float(traffic.max()) if len(traffic) else 0.0
+    max_servers = max(int(np.ceil(peak + 6 * np.sqrt(peak) + 10)), lines or 0)
+    table = erlang_b_table(traffic, max_servers)
+    required = first_meeting(table <= blocking_target)
+    result = {'lines_required': np.where(traffic > 0, required, 0)}
+    if lines is not None:
+        result['blocking'] = table[:, lines]
+    return result
+
+def _number(value: float, digits: int = 2) -> Optional[float]:
+    """Round a float for JSON, NaN becomes None"""
+    return None if np.isnan(value) else round(float(value), digits)
+
+class CapacityPlanner:
+    """
+    Queue staffing and trunk sizing from historical traffic.
+
+    Arrival rates and handle times per queue and hour of day come from one
+    grouped query over queued calls in the CDR; service level answer times
+    and wrap-up times from the queue configuration. Erlang-C staffing and
+    Erlang-B trunk blocking are then computed for the whole queue x hour
+    grid at once with NumPy, one row per cell and one column per agent or
+    line count.
+
+    Handle time is the billed time of answered queue calls plus the queue's
+    wrap-up time. Calls answered by the dialplan before Queue() bill their
+    waiting time too, which makes the sizing err on the safe side. Hours
+    with calls but none answered use the queue's average over all hours,
+    or default_handle_time for queues that never answered a call, so they
+    are not planned with zero agents.
+    """
+
+    def __init__(self, cdr_manager, queue_manager, analytics, default_days: int = 28,
+                 default_handle_time: float = 180.0):
+        """
+        Initialize the planner.
+
+        Args:
+            cdr_manager: CDRManager whose pool, filters and cache are used
+            queue_manager: QueueManager for service level and wrap-up settings
+            analytics: CDRAnalytics whose frames give the trunk traffic
+            default_days: Days of history used when no start date is given
+            default_handle_time: Handle time in seconds for queues without
+                                 any answered call
+        """
+        self.cdr_manager = cdr_manager
+        self.queue_manager = queue_manager
+        self.analytics = analytics
+        self.default_days = default_days
+        self.default_handle_time = default_handle_time
+
+    async def plan(self, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None,
+                   target: float = 80.0,
+                   blocking: float = 1.0,
+                   lines: Optional[int] = None,
+                   weekdays: bool = False,
+                   default_answer_time: int = 60) -> Dict[str, Any]:
+        """
+        Compute the staffing and trunk plan of an average day.
+
+        Args:
+            start_date: Start of the history (defaults to default_days ago)
+            end_date: End of the history, inclusive
+            target: Service level target in percent
+            blocking: Trunk blocking target in percent
+            lines: Installed trunk lines, to report their blocking
+            weekdays: Only use Monday to Friday traffic
+            default_answer_time: Answer time for queues without a service level
+
+        Returns:
+            Dictionary with per-queue hourly staffing and hourly trunk sizing
+
+        Raises:
+            ValueError: If a date, target or line count is invalid
+        """
+        if not 0 < target < 100 or not 0 < blocking < 100:
+            raise ValueError("Targets must be percentages between 0 and 100")
+        if lines is not None and not 0 <= lines <= MAX_TRUNK_LINES:
+            raise ValueError(f"Lines must be between 0 and {MAX_TRUNK_LINES}")
+        if not start_date:
+            start = datetime.now(self.cdr_manager.timezone) - timedelta(days=self.default_days - 1)
+            start_date = start.strftime('%Y-%m-%d')
+        where, params = self.cdr_manager.build_filters(start_date=start_date, end_date=end_date)
+
+        key = ('capacity', where, tuple(params), target, blocking, lines, weekdays, default_answer_time)
+        return await self.cdr_manager.cache.get_or_fill(
+            key, lambda: self._plan(start_date, end_date, where, params, target / 100.0,
+                                    blocking / 100.0, lines, weekdays, default_answer_time)
+        )
+
+    async def _queue_traffic(self, where: str, params: List[Any], weekdays: bool) -> List[Dict[str, Any]]:
+        """Run the grouped queue traffic query"""
+        if weekdays:
+            where += " AND WEEKDAY(start) < 5"
+        if not self.cdr_manager.pool:
+            await self.cdr_manager.connect()
+        async with self.cdr_manager.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(QUEUE_TRAFFIC_QUERY.format(where=where), params)
+                return await cur.fetchall()
+
+    async def _plan(self, start_date: str, end_date: Optional[str], where: str, params: List[Any],
+                    target: float, blocking: float, lines: Optional[int], weekdays: bool,
+                    default_answer_time: int) -> Dict[str, Any]:
+        """Gather traffic and settings, then size the grid off the loop"""
+        frame, rows, settings = await asyncio.gather(
+            self.analytics.load(start_date, end_date),
+            self._queue_traffic(where, params, weekdays),
+            self.queue_manager.get_queue_settings()
+        )
+        return await asyncio.to_thread(
+            self._size, frame, rows, settings, start_date, end_date,
+            target, blocking, lines, weekdays, default_answer_time
+        )
+
+    def _size(self, frame, rows: List[Dict[str, Any]], settings: Dict[str, Dict[str, Any]],
+              start_date: str, end_date: Optional[str], target: float, blocking: float,
+              lines: Optional[int], weekdays: bool, default_answer_time: int) -> Dict[str, Any]:
+        """Build the queue x hour and hour grids and size them"""
+        day = frame.start // 86400
+        # 1970-01-01 was a Thursday, so (day + 3) % 7 is 0 on Mondays
+        keep = (day + 3) % 7 < 5 if weekdays else np.ones(len(day), dtype=bool)
+        days = max(len(np.unique(day[keep])), 1)
+
+        queues = sorted({row['queue'] for row in rows if row['queue']})
+        index = {queue: i for i, queue in enumerate(queues)}
+        shape = (len(queues), 24)
+        calls = np.zeros(shape)
+        answered = np.zeros(shape)
+        talk = np.zeros(shape)
+        for row in rows:
+            if row['queue'] in index:
+                cell = (index[row['queue']], int(row['hour']))
+                calls[cell] = int(row['calls'])
+                answered[cell] = int(row['answered'] or 0)
+                talk[cell] = float(row['talk'] or 0)
+
+        wrapup = np.array([float(settings.get(q, {}).get('wrapuptime') or 0) for q in queues])
+        answer_time = np.array([float(settings.get(q, {}).get('servicelevel') or default_answer_time)
+                                for q in queues])
+
+        # Calls per hour of an average day, handle time per call
+        rate = calls / days
+        queue_answered = answered.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            observed = np.where(answered > 0, talk / answered, 0.0)
+            # Unanswered hours still need agents, use the queue's all-hours average
+            average = np.where(queue_answered > 0, talk.sum(axis=1) / queue_answered, self.default_handle_time)
+        estimated = (calls > 0) & (answered == 0)
+        handle = np.where(estimated, average[:, None], observed)
+        handle = np.where(calls > 0, handle + wrapup[:, None], 0.0)
+        traffic = rate * handle / 3600.0
+
+        plan = staffing(traffic.ravel(), handle.ravel(), np.repeat(answer_time, 24), target)
+        grid = {name: values.reshape(shape) for name, values in plan.items()}
+
+        queue_plans = []
+        for i, queue in enumerate(queues):
+            hours = [
+                {
+                    'hour': hour,
+                    'calls_per_hour': round(float(rate[i, hour]), 2),
+                    'handle_time': round(float(handle[i, hour]), 1),
+                    'handle_time_estimated': bool(estimated[i, hour]),
+                    'erlangs': round(float(traffic[i, hour]), 3),
+                    'agents': int(grid['agents'][i, hour]),
+                    'service_level': _number(grid['service_level'][i, hour] * 100),
+                    'asa': _number(grid['asa'][i, hour], 1),
+                    'occupancy': _number(grid['occupancy'][i, hour] * 100)
+                }
+                for hour in range(24)
+            ]
+            queue_plans.append({
+                'queue': queue,
+                'answer_time': int(answer_time[i]),
+                'wrapuptime': int(wrapup[i]),
+                'peak_agents': int(grid['agents'][i].max()),
+                'hours': hours
+            })
+
+        # Trunk lines are held for the whole call, ringing and queueing included
+        trunk_calls = keep & (frame.trunk_names[frame.trunk] != '')
+        hour_of_day = (frame.start[trunk_calls] // 3600) % 24
+        trunk_rate = np.bincount(hour_of_day, minlength=24) / days
+        trunk_traffic = np.bincount(hour_of_day, weights=frame.duration[trunk_calls], minlength=24) / 3600.0 / days
+        trunk_plan = trunk_lines(trunk_traffic, blocking, lines)
+
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'days': days,
+            'weekdays_only': weekdays,
+            'service_level_target': round(target * 100, 2),
+            'queues': queue_plans,
+            'trunks': {
+                'blocking_target': round(blocking * 100, 2),
+                'lines': lines,
+                'peak_lines': int(trunk_plan['lines_required'].max()),
+                'hours': [
+                    {
+                        'hour': hour,
+                        'calls_per_hour': round(float(trunk_rate[hour]), 2),
+                        'erlangs': round(float(trunk_traffic[hour]), 3),
+                        'lines_required': int(trunk_plan['lines_required'][hour]),
+                        'blocking': _number(trunk_plan['blocking'][hour] * 100, 3) if lines is not None else None
+                    }
+                    for hour in range(24)
+                ]
+            }
+        }
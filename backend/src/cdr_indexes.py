@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/cdr_indexes.py
+"""Index migration and checker for the Asterisk cdr table.
+
+CDRManager filters on half-open ranges over the bare start column, combined
+with equality on src, dst or disposition. These composite indexes let every
+such filter shape, including its ORDER BY start DESC, uniqueid DESC and the
+keyset seek on (start, uniqueid), run as an index range scan instead of a
+full table scan.
+
+Suffix searches on src and dst use virtual generated columns holding the
+reversed number, so "ends with 1234" becomes an indexed prefix search on
+src_rev/dst_rev. The columns are virtual and invisible: they take no space in
+the row, stay out of SELECT * and are ignored by Asterisk when it writes CDRs.
+
+Usage:
+    python3 src/cdr_indexes.py            # report missing indexes and query plans
+    python3 src/cdr_indexes.py --create   # create missing indexes, then report
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import aiomysql
+from typing import Dict, List, Optional, Any, Set
+from datetime import datetime, timedelta
+from cdr_manager import CDRManager
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Index name -> columns, in index order
+CDR_INDEXES = {
+    'idx_cdr_start': ('start', 'uniqueid'),
+    'idx_cdr_src_start': ('src', 'start', 'uniqueid'),
+    'idx_cdr_dst_start': ('dst', 'start', 'uniqueid'),
+    'idx_cdr_disposition_start': ('disposition', 'start', 'uniqueid'),
+    # Watermark scans of the CDR rollups (cdr_rollup.py)
+    'idx_cdr_end': ('end',),
+    # Leg lookups of CDR sessions (CDRManager.get_cdr_sessions)
+    'idx_cdr_linkedid': ('linkedid', 'start'),
+    'idx_cdr_uniqueid': ('uniqueid',),
+    # Prefix and suffix searches (cdr_search.py)
+    'idx_cdr_clid_start': ('clid', 'start', 'uniqueid'),
+    'idx_cdr_src_rev': ('src_rev', 'start', 'uniqueid'),
+    'idx_cdr_dst_rev': ('dst_rev', 'start', 'uniqueid'),
+}
+
+# Generated column name -> definition
+CDR_GENERATED_COLUMNS = {
+    'src_rev': 'VARCHAR(80) AS (REVERSE(src)) VIRTUAL INVISIBLE',
+    'dst_rev': 'VARCHAR(80) AS (REVERSE(dst)) VIRTUAL INVISIBLE',
+}
+
+# Representative filter shapes checked with EXPLAIN
+FILTER_SHAPES = {
+    'date_range': {},
+    'src_date_range': {'src': '1001'},
+    'dst_date_range': {'dst': '1001'},
+    'disposition_date_range': {'disposition': 'ANSWERED'},
+    'dst_prefix_date_range': {'search': '3493', 'search_field': 'dst', 'search_mode': 'prefix'},
+    'dst_suffix_date_range': {'search': '1234', 'search_field': 'dst', 'search_mode': 'suffix'},
+}
+
+async def get_existing_indexes(cdr_manager: CDRManager) -> Dict[str, List[str]]:
+    """
+    Get the indexes currently defined on the cdr table.
+
+    Args:
+        cdr_manager: Connected CDR manager
+
+    Returns:
+        Dictionary of index name to ordered column list
+    """
+    if not cdr_manager.pool:
+        await cdr_manager.connect()
+
+    indexes = {}
+    async with cdr_manager.pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            await cur.execute("SHOW INDEX FROM cdr")
+            for row in await cur.fetchall():
+                indexes.setdefault(row['Key_name'], []).append((row['Seq_in_index'], row['Column_name']))
+
+    return {name: [col for _, col in sorted(cols)] for name, cols in indexes.items()}
+
+async def probe_column(cdr_manager: CDRManager) -> Optional[str]:
+    """
+    Get the column whose MAX() the cache probe can read from an index.
+
+    Args:
+        cdr_manager: Connected CDR manager
+
+    Returns:
+        'end' or 'start' when an index leads with it, None when neither
+        does and MAX() would scan the table
+    """
+    leading = {columns[0] for columns in (await get_existing_indexes(cdr_manager)).values()}
+    for column in ('end', 'start'):
+        if column in leading:
+            return column
+    return None
+
+async def get_existing_columns(cdr_manager: CDRManager) -> List[str]:
+    """
+    Get the columns of the cdr table.
+
+    Args:
+        cdr_manager: Connected CDR manager
+
+    Returns:
+        List of column names
+    """
+    if not cdr_manager.pool:
+        await cdr_manager.connect()
+
+    async with cdr_manager.pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SHOW COLUMNS FROM cdr")
+            return [row[0] for row in await cur.fetchall()]
+
+async def reversed_columns(cdr_manager: CDRManager) -> Set[str]:
+    """
+    Get the columns that have a reversed generated column.
+
+    Args:
+        cdr_manager: Connected CDR manager
+
+    Returns:
+        Set of column names, e.g. {'src', 'dst'}
+    """
+    columns = await get_existing_columns(cdr_manager)
+    return {name[:-len('_rev')] for name in CDR_GENERATED_COLUMNS if name in columns}
+
+async def create_missing_columns(cdr_manager: CDRManager) -> List[str]:
+    """
+    Add the generated columns that are missing.
+
+    Args:
+        cdr_manager: Connected CDR manager
+
+    Returns:
+        List of created column names
+    """
+    existing = await get_existing_columns(cdr_manager)
+    created = []
+    async with cdr_manager.pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            for name, definition in CDR_GENERATED_COLUMNS.items():
+                if name in existing:
+                    continue
+                logger.info(f"Adding generated column {name} to cdr ({definition})")
+                await cur.execute(f"ALTER TABLE cdr ADD COLUMN {name} {definition}")
+                created.append(name)
+    return created
+
+async def check_indexes(cdr_manager: CDRManager) -> Dict[str, Any]:
+    """
+    Check which required indexes are present.
+
+    An index counts as present when any existing index starts with the
+    required columns, whatever its name.
+
+    Args:
+        cdr_manager: Connected CDR manager
+
+    Returns:
+        Dictionary with present and missing index names
+    """
+    existing = await get_existing_indexes(cdr_manager)
+    present, missing = [], []
+    for name, columns in CDR_INDEXES.items():
+        covered = any(tuple(cols[:len(columns)]) == columns for cols in existing.values())
+        (present if covered else missing).append(name)
+    return {'present': present, 'missing': missing, 'existing': existing}
+
+async def create_missing_indexes(cdr_manager: CDRManager) -> List[str]:
+    """
+    Create the required indexes that are missing.
+
+    Args:
+        cdr_manager: Connected CDR manager
+
+    Returns:
+        List of created index names
+    """
+    # Indexes on the reversed numbers need their columns first
+    await create_missing_columns(cdr_manager)
+    status = await check_indexes(cdr_manager)
+    created = []
+    async with cdr_manager.pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            for name in status['missing']:
+                columns = ', '.join(f'`{column}`' for column in CDR_INDEXES[name])
+                if name in status['existing']:
+                    # An older definition with the same name, replace it in one statement
+                    logger.info(f"Rebuilding index {name} on cdr ({columns})")
+                    await cur.execute(f"ALTER TABLE cdr DROP INDEX {name}, ADD INDEX {name} ({columns})")
+                else:
+                    logger.info(f"Creating index {name} on cdr ({columns})")
+                    await cur.execute(f"CREATE INDEX {name} ON cdr ({columns})")
+                created.append(name)
+    return created
+
+async def explain_filters(cdr_manager: CDRManager) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Run EXPLAIN for each filter shape CDRManager generates.
+
+    Args:
+        cdr_manager: Connected CDR manager
+
+    Returns:
+        Dictionary of filter shape name to EXPLAIN rows
+    """
+    if not cdr_manager.pool:
+        await cdr_manager.connect()
+
+    end = datetime.now()
+    start = end - timedelta(days=7)
+    plans = {}
+    async with cdr_manager.pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            for shape, filters in FILTER_SHAPES.items():
+                where, params = cdr_manager.build_filters(
+                    start_date=start.strftime('%Y-%m-%d'),
+                    end_date=end.strftime('%Y-%m-%d'),
+                    **filters
+                )
+                await cur.execute(
+                    f"EXPLAIN SELECT * FROM cdr WHERE {where} ORDER BY start DESC, uniqueid DESC LIMIT 100",
+                    params
+                )
+                plans[shape] = await cur.fetchall()
+    return plans
+
+async def report(cdr_manager: CDRManager) -> Dict[str, Any]:
+    """
+    Report index status and the plan each filter shape gets.
+
+    Args:
+        cdr_manager: Connected CDR manager
+
+    Returns:
+        Dictionary with index status and per-shape plan summaries
+    """
+    status = await check_indexes(cdr_manager)
+    plans = await explain_filters(cdr_manager)
+    summary = {}
+    for shape, rows in plans.items():
+        row = rows[0] if rows else {}
+        summary[shape] = {
+            'type': row.get('type'),
+            'key': row.get('key'),
+            'rows': row.get('rows'),
+            'extra': row.get('Extra'),
+            # A 'range'/'ref' access on a key means no full scan
+            'uses_index': bool(row.get('key')) and row.get('type') != 'ALL'
+        }
+    return {'present': status['present'], 'missing': status['missing'], 'plans': summary}
+
+async def main():
+    cdr_manager = CDRManager(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        port=int(os.getenv('MYSQL_PORT', '3306')),
+        user=os.getenv('MYSQL_USER', 'asteriskuser'),
+        password=os.getenv('MYSQL_PASSWORD', 'asteriskpassword'),
+        db=os.getenv('CDR_MYSQL_DATABASE', 'asterisk')
+    )
+    await cdr_manager.connect()
+    try:
+        if '--create' in sys.argv:
+            created = await create_missing_indexes(cdr_manager)
+            logger.info(f"Created indexes: {created or 'none'}")
+
+        cdr_manager.reversed_columns = await reversed_columns(cdr_manager)
+
+        result = await report(cdr_manager)
+        logger.info(f"Present indexes: {result['present']}")
+        logger.info(f"Missing indexes: {result['missing']}")
+        for shape, plan in result['plans'].items():
+            logger.info(f"{shape}: type={plan['type']} key={plan['key']} rows={plan['rows']} extra={plan['extra']}")
+    finally:
+        await cdr_manager.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
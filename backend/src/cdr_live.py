@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/cdr_live.py
+
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Any
+from datetime import datetime
+from parser import parse_extension
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# AMI Cdr event field -> cdr table column
+CDR_EVENT_FIELDS = {
+    'AccountCode': 'accountcode',
+    'Source': 'src',
+    'Destination': 'dst',
+    'DestinationContext': 'dcontext',
+    'CallerID': 'clid',
+    'Channel': 'channel',
+    'DestinationChannel': 'dstchannel',
+    'LastApplication': 'lastapp',
+    'LastData': 'lastdata',
+    'StartTime': 'start',
+    'AnswerTime': 'answer',
+    'EndTime': 'end',
+    'Duration': 'duration',
+    'BillableSeconds': 'billsec',
+    'Disposition': 'disposition',
+    'AMAFlags': 'amaflags',
+    'UniqueID': 'uniqueid',
+    'UserField': 'userfield',
+}
+
+def parse_cdr_event(event_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert an AMI Cdr event into a record shaped like a cdr table row.
+
+    Args:
+        event_data: AMI Cdr event payload
+
+    Returns:
+        Dictionary with cdr column names, times as ISO strings
+    """
+    record = {}
+    for field, column in CDR_EVENT_FIELDS.items():
+        value = event_data.get(field)
+        if column in ('duration', 'billsec'):
+            try:
+                value = int(value or 0)
+            except ValueError:
+                value = 0
+        elif column in ('start', 'answer', 'end'):
+            # AMI sends 'YYYY-MM-DD HH:MM:SS' (empty when never answered)
+            value = value.replace(' ', 'T') if value else None
+        record[column] = value
+    return record
+
+def start_day(start: Optional[str], timezone=None, db_timezone=None) -> Optional[str]:
+    """
+    Get the day a call started on, in the timezone that defines "today".
+
+    cdr.start and the AMI StartTime are naive database-time values; this is
+    the inverse of CDRManager._parse_date, so the day matches the one that
+    date filters (and the seeded counters) put the call in.
+
+    Args:
+        start: ISO start time as in a cdr record
+        timezone: Timezone of date filters (None keeps database time)
+        db_timezone: Timezone of cdr.start (None for local time)
+
+    Returns:
+        Date as YYYY-MM-DD, or None without a start time
+    """
+    if not start:
+        return None
+    if timezone is None:
+        return start[:10]
+    try:
+        parsed = datetime.fromisoformat(start)
+    except ValueError:
+        return start[:10]
+    parsed = parsed.replace(tzinfo=db_timezone) if db_timezone else parsed.astimezone()
+    return parsed.astimezone(timezone).strftime('%Y-%m-%d')
+
+class LiveCDRStream:
+    """
+    In-memory view of calls as they finish, fed by AMI Cdr events.
+
+    Keeps today's counters (calls, dispositions, average billsec of answered
+    calls), a bounded list of the latest calls and the last N calls of each
+    extension, so the "latest calls" views need no database round trip.
+    """
+
+    def __init__(self, per_extension: int = 20, max_recent: int = 200,
+                 max_extensions: int = 5000, timezone=None, db_timezone=None):
+        """
+        Initialize the live CDR stream.
+
+        Args:
+            per_extension: Number of calls kept per extension
+            max_recent: Number of calls kept overall
+            max_extensions: Number of extensions tracked before the least recent is dropped
+            timezone: Timezone that defines "today" (tzinfo or None for local time)
+            db_timezone: Timezone of the record start times (tzinfo or None for local time)
+        """
+        self.per_extension = per_extension
+        self.max_extensions = max_extensions
+        self.timezone = timezone
+        self.db_timezone = db_timezone
+        self._recent = deque(maxlen=max_recent)
+        self._by_extension: OrderedDict = OrderedDict()
+        self._reset_day(self._today())
+
+    def _today(self) -> str:
+        """Get today's date in the configured timezone"""
+        return datetime.now(self.timezone).strftime('%Y-%m-%d')
+
+    def _reset_day(self, day: str):
+        """Start counting a new day"""
+        self._day = day
+        self._calls_today = 0
+        self._dispositions: Dict[str, int] = {}
+        self._answered = 0
+        self._answered_billsec = 0
+
+    def _extensions(self, record: Dict[str, Any]) -> List[str]:
+        """Get the extensions a call belongs to"""
+        extensions = {record.get('src'), record.get('dst'),
+                      parse_extension(record.get('channel') or ''),
+                      parse_extension(record.get('dstchannel') or '')}
+        return [e for e in extensions if e]
+
+    def add(self, record: Dict[str, Any], count: bool = True):
+        """
+        Add a finished call.
+
+        Args:
+            record: CDR record shaped like a cdr table row
+            count: Whether to include the call in today's counters
+        """
+        today = self._today()
+        if today != self._day:
+            self._reset_day(today)
+
+        if count and start_day(record.get('start'), self.timezone, self.db_timezone) == today:
+            self._calls_today += 1
+            disposition = record.get('disposition') or 'UNKNOWN'
+            self._dispositions[disposition] = self._dispositions.get(disposition, 0) + 1
+            if disposition == 'ANSWERED':
+                self._answered += 1
+                self._answered_billsec += record.get('billsec') or 0
+
+        self._recent.appendleft(record)
+        for extension in self._extensions(record):
+            calls = self._by_extension.get(extension)
+            if calls is None:
+                calls = self._by_extension[extension] = deque(maxlen=self.per_extension)
+                if len(self._by_extension) > self.max_extensions:
+                    self._by_extension.popitem(last=False)
+            else:
+                self._by_extension.move_to_end(extension)
+            calls.appendleft(record)
+
+    def ingest(self, event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add a call from an AMI Cdr event.
+
+        Args:
+            event_data: AMI Cdr event payload
+
+        Returns:
+            The parsed CDR record
+        """
+        record = parse_cdr_event(event_data)
+        self.add(record)
+        return record
+
+    async def seed(self, cdr_manager):
+        """
+        Load today's counters and the latest calls from the database once at startup.
+
+        Args:
+            cdr_manager: Connected CDRManager
+        """
+        today = self._today()
+        stats = await cdr_manager.get_cdr_stats(start_date=today, end_date=today)
+        records = await cdr_manager.get_cdr_records(limit=self._recent.maxlen)
+
+        self._reset_day(today)
+        self._calls_today = stats['total_calls']
+        self._dispositions = dict(stats['disposition_stats'])
+        self._answered = self._dispositions.get('ANSWERED', 0)
+        self._answered_billsec = stats['avg_duration'] * self._answered
+
+        # Oldest first, so the newest ends up at the front
+        for record in reversed(records):
+            self.add(record, count=False)
+        logger.info(f"Seeded live CDR stream with {len(records)} records, {self._calls_today} calls today")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get today's live counters.
+
+        Returns:
+            Dictionary with calls today, disposition counts and average billsec
+        """
+        if self._today() != self._day:
+            self._reset_day(self._today())
+        return {
+            'day': self._day,
+            'calls_today': self._calls_today,
+            'disposition_stats': dict(self._dispositions),
+            'avg_duration': round(self._answered_billsec / self._answered, 2) if self._answered else 0
+        }
+
+    def recent(self, extension: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get the latest calls, newest first.
+
+        Args:
+            extension: Only calls of this extension
+            limit: Maximum number of calls
+
+        Returns:
+            List of CDR records
+        """
+        calls = self._by_extension.get(extension, ()) if extension else self._recent
+        calls = list(calls)
+        return calls[:limit] if limit else calls
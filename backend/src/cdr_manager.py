@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
 # /home/ubuntu/Documents/ispbx/backend/src/cdr_manager.py
 
+import os
+import json
+import time
+import base64
+import asyncio
 import logging
 import aiomysql
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple, AsyncIterator
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from cache import TTLCache
+from cdr_search import SEARCH_FIELDS, SEARCH_MODES, escape_like
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -20,7 +28,8 @@ class CDRManager:
     
     def __init__(self, host: str = 'localhost', port: int = 3306,
                  user: str = 'asteriskuser', password: str = 'asteriskpassword',
-                 db: str = 'asteriskcdr'):
+                 db: str = 'asteriskcdr', timezone: Optional[str] = None,
+                 db_timezone: Optional[str] = None):
         """
         Initialize the CDR manager with database connection parameters.
         
@@ -30,6 +39,9 @@ class CDRManager:
             user: MySQL username
             password: MySQL password
             db: MySQL database name
+            timezone: Timezone that date filters are given in (defaults to CDR_TIMEZONE or local time)
+            db_timezone: Timezone of the naive datetimes Asterisk stores in the cdr table
+                         (defaults to CDR_DB_TIMEZONE or the same as timezone)
         """
         self.db_config = {
             'host': host,
@@ -40,6 +52,30 @@ class CDRManager:
             'autocommit': True
         }
         self.pool = None
+        self.rollup = None  # Will be set externally
+        self.archive = None  # Will be set externally
+        self.search_index = None  # Will be set externally
+        self.reversed_columns = set()  # Columns with a *_rev generated column, set externally
+        
+        # Query result cache, invalidated when new CDRs land
+        self.cache = TTLCache(
+            maxsize=int(os.getenv('CDR_CACHE_SIZE', '256')),
+            ttl=float(os.getenv('CDR_CACHE_TTL', '30'))
+        )
+        self.probe_interval = float(os.getenv('CDR_CACHE_PROBE_INTERVAL', '5'))
+        self.probe_column = None  # Indexed column for the probe, set externally
+        self._last_probe = 0.0
+        self._last_seen_end = None
+        self._probe_lock = asyncio.Lock()
+        
+        # Wide record queries are split into this many concurrent time slices
+        self.query_slices = int(os.getenv('CDR_QUERY_SLICES', '4'))
+        self.query_slice_span = timedelta(hours=float(os.getenv('CDR_QUERY_SLICE_HOURS', '24')))
+        
+        timezone = timezone or os.getenv('CDR_TIMEZONE')
+        db_timezone = db_timezone or os.getenv('CDR_DB_TIMEZONE')
+        self.timezone = ZoneInfo(timezone) if timezone else None
+        self.db_timezone = ZoneInfo(db_timezone) if db_timezone else self.timezone
     
     async def connect(self):
         """Establish connection pool to the MySQL database"""
@@ -66,10 +102,22 @@ class CDRManager:
                              dst: Optional[str] = None,
                              disposition: Optional[str] = None,
                              limit: int = 100,
-                             offset: int = 0) -> List[Dict[str, Any]]:
+                             offset: int = 0,
+                             cursor: Optional[str] = None,
+                             search: Optional[str] = None,
+                             search_field: str = 'src',
+                             search_mode: str = 'contains') -> List[Dict[str, Any]]:
         """
         Get CDR records with optional filtering.
         
+        Records are ordered by (start, uniqueid) descending. Passing the cursor
+        returned for the previous page seeks directly past its last record,
+        so the cost does not grow with page depth the way OFFSET does.
+        
+        Partial searches within the recent window of the in-memory n-gram
+        index (cdr_search.py) are answered from the index, and only the
+        matching page is fetched from the database.
+        
         Args:
             start_date: Filter by start date (format: YYYY-MM-DD)
             end_date: Filter by end date (format: YYYY-MM-DD)
@@ -77,7 +125,11 @@ class CDRManager:
             dst: Filter by destination extension
             disposition: Filter by call disposition (ANSWERED, NO ANSWER, BUSY, FAILED)
             limit: Maximum number of records to return
-            offset: Number of records to skip
+            offset: Number of records to skip (ignored when a cursor is given)
+            cursor: Opaque cursor from encode_cursor() for keyset pagination
+            search: Partial text to look for in search_field
+            search_field: src, dst or clid
+            search_mode: prefix, suffix or contains
             
         Returns:
             List of CDR records as dictionaries
@@ -85,83 +137,753 @@ class CDRManager:
         if not self.pool:
             await self.connect()
             
-        query = "SELECT * FROM cdr WHERE 1=1"
-        params = []
+        filters = {
+            'src': src,
+            'dst': dst,
+            'disposition': disposition,
+            'search': search,
+            'search_field': search_field,
+            'search_mode': search_mode
+        }
+        where, params = self.build_filters(start_date=start_date, end_date=end_date, **filters)
+        
+        # Normalized filters as key, so equivalent date spellings share an entry
+        key = ('records', where, tuple(params), limit, 0 if cursor else offset, cursor)
+        await self._probe_changes()
+        
+        lower, upper = self.date_range(start_date, end_date)
+        if search and self.search_index and self.search_index.covers(lower):
+            return await self.cache.get_or_fill(
+                key, lambda: self._query_indexed_records(filters, lower, upper, limit, offset, cursor)
+            )
+        
+        cutoff = self.archive.cutoff if self.archive else None
+        if cutoff and (lower is None or lower < cutoff):
+            return await self.cache.get_or_fill(
+                key, lambda: self._query_archived_records(
+                    start_date, end_date, filters, lower, upper, cutoff, limit, offset, cursor
+                )
+            )
+        
+        return await self.cache.get_or_fill(
+            key, lambda: self._query_cdr_records(where, params, limit, offset, cursor, lower, upper)
+        )
+    
+    async def _query_indexed_records(self, filters: Dict[str, Any],
+                                     lower: Optional[datetime], upper: Optional[datetime],
+                                     limit: int, offset: int,
+                                     cursor: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Run a partial search from the n-gram index.
+        
+        The index yields the (start, uniqueid) keys of every match in order,
+        pagination is applied to those keys, and only the page is read from
+        the database through the (start, uniqueid) index.
+        """
+        keys = await asyncio.to_thread(
+            self.search_index.search,
+            filters['search_field'], filters['search_mode'], filters['search'],
+            lower, upper, filters
+        )
+        if cursor:
+            seek = self.decode_cursor(cursor)
+            keys = [k for k in keys if k < seek]
+        else:
+            keys = keys[offset:]
+        page = keys[:limit]
+        if not page:
+            return []
+        
+        where = f"(start, uniqueid) IN ({', '.join(['(%s, %s)'] * len(page))})"
+        params = [value for k in page for value in k]
+        return await self._fetch_records(where, params, limit, 0, None)
+    
+    async def _query_archived_records(self, start_date: Optional[str], end_date: Optional[str],
+                                      filters: Dict[str, Any],
+                                      lower: Optional[datetime], upper: Optional[datetime],
+                                      cutoff: datetime, limit: int, offset: int,
+                                      cursor: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Run a records query spanning the archive cutoff.
+        
+        Days from the cutoff on come from MySQL, older days from the archive.
+        Both are ordered by (start, uniqueid) descending and the MySQL part is
+        entirely newer, so the pages join by simple concatenation.
+        """
+        seek = self.decode_cursor(cursor) if cursor else None
+        offset = 0 if cursor else offset
+        
+        records = []
+        if (upper is None or upper > cutoff) and (seek is None or seek[0] >= cutoff):
+            where, params = self.build_filters(
+                start_date=start_date, end_date=end_date, not_before=cutoff, **filters
+            )
+            records = await self._query_cdr_records(
+                where, params, offset + limit, 0, cursor, max(lower or cutoff, cutoff), upper
+            )
+        
+        if len(records) >= offset + limit:
+            return records[offset:offset + limit]
+        
+        # The MySQL part ran out, continue into the archive
+        page = records[offset:]
+        archived = await asyncio.to_thread(
+            self.archive.query_records, lower, upper, filters,
+            limit - len(page), max(0, offset - len(records)), seek
+        )
+        return page + archived
+    
+    async def _query_cdr_records(self, where: str, params: List[Any], limit: int,
+                                 offset: int, cursor: Optional[str],
+                                 lower: Optional[datetime] = None,
+                                 upper: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Run the CDR records query for a WHERE clause built by build_filters.
         
-        # Apply filters
-        if start_date:
-            query += " AND DATE(start) >= %s"
-            params.append(start_date)
+        lower and upper are the start bounds the clause filters on. When they
+        span a wide range, first pages and cursor pages are split into time
+        slices that run concurrently on separate pooled connections (see
+        _query_sliced). Offset pages use the single query, so MySQL skips the
+        offset instead of every slice sending back offset + limit rows.
+        """
+        seek = self.decode_cursor(cursor) if cursor else None
+        if seek:
+            offset = 0
+            # Nothing newer than the seek position can match
+            ceiling = seek[0] + timedelta(microseconds=1)
+            upper = min(upper, ceiling) if upper else ceiling
+        
+        slices = self._time_slices(lower, upper) if offset == 0 else []
+        if slices:
+            return await self._query_sliced(where, params, limit, offset, seek, slices)
+        return await self._fetch_records(where, params, limit, offset, seek)
+    
+    def _time_slices(self, lower: Optional[datetime],
+                     upper: Optional[datetime]) -> List[Tuple[datetime, Optional[datetime]]]:
+        """
+        Split [lower, upper) into equal time slices, newest first.
+        
+        Returns no slices when the range is open at the bottom or narrower
+        than two slices of query_slice_span. An open upper bound stays open
+        on the newest slice.
+        """
+        if not lower or self.query_slices < 2:
+            return []
+        
+        end = upper or datetime.now(self.db_timezone).replace(tzinfo=None)
+        count = min(self.query_slices, int((end - lower) / self.query_slice_span))
+        if count < 2:
+            return []
+        
+        step = timedelta(seconds=int((end - lower).total_seconds() // count))
+        bounds = [lower + step * i for i in range(count)] + [upper]
+        return [(bounds[i], bounds[i + 1]) for i in reversed(range(count))]
+    
+    async def _query_sliced(self, where: str, params: List[Any], limit: int, offset: int,
+                            seek: Optional[Tuple[datetime, str]],
+                            slices: List[Tuple[datetime, Optional[datetime]]]) -> List[Dict[str, Any]]:
+        """
+        Run one query per time slice concurrently and merge the results.
+        
+        Each slice returns its own rows ordered by (start, uniqueid)
+        descending, and the slices are disjoint and ordered newest first, so
+        the k-way merge reduces to draining them in slice order. Rows are
+        taken as soon as every newer slice has finished, and the older
+        slices still running are cancelled once offset + limit rows are in.
+        Only used for first and cursor pages, where offset is 0. One pool
+        connection is left free for other requests.
+        """
+        wanted = offset + limit
+        semaphore = asyncio.Semaphore(max(1, self.pool.maxsize - 1))
+        
+        async def run_slice(slice_lower, slice_upper):
+            slice_where = f"{where} AND start >= %s"
+            slice_params = list(params) + [slice_lower]
+            if slice_upper:
+                slice_where += " AND start < %s"
+                slice_params.append(slice_upper)
+            async with semaphore:
+                return await self._fetch_records(slice_where, slice_params, wanted, 0, seek)
+        
+        # Created newest first, so the newest slices get connections first
+        tasks = [asyncio.create_task(run_slice(lo, hi)) for lo, hi in slices]
+        records = []
+        try:
+            for task in tasks:
+                records.extend(await task)
+                if len(records) >= wanted:
+                    break
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                logger.debug(f"Cancelled {len(pending)} of {len(tasks)} CDR query slices")
+        
+        return records[offset:offset + limit]
+    
+    async def _fetch_records(self, where: str, params: List[Any], limit: int, offset: int,
+                             seek: Optional[Tuple[datetime, str]]) -> List[Dict[str, Any]]:
+        """Run a single CDR records query on one pooled connection"""
+        params = list(params)
+        query = f"SELECT * FROM cdr WHERE {where}"
+        
+        if seek:
+            # Seek past the last record of the previous page
+            last_start, last_uniqueid = seek
+            query += " AND (start < %s OR (start = %s AND uniqueid < %s))"
+            params.extend([last_start, last_start, last_uniqueid])
             
-        if end_date:
-            query += " AND DATE(end) <= %s"
-            params.append(end_date)
+        # Add ordering and pagination
+        query += " ORDER BY start DESC, uniqueid DESC LIMIT %s"
+        params.append(limit)
+        if not seek:
+            query += " OFFSET %s"
+            params.append(offset)
+        
+        try:
+            async with self.pool.acquire() as conn:
+                try:
+                    async with conn.cursor(aiomysql.DictCursor) as cur:
+                        await cur.execute(query, params)
+                        records = await cur.fetchall()
+                except asyncio.CancelledError:
+                    # A query cut off mid-result leaves the connection unusable
+                    conn.close()
+                    raise
+                    
+            # Convert datetime objects to strings for JSON serialization
+            for record in records:
+                for key, value in record.items():
+                    if isinstance(value, datetime):
+                        record[key] = value.isoformat()
             
-        if src:
-            query += " AND src = %s"
-            params.append(src)
+            return records
+        except Exception as e:
+            logger.error(f"Error fetching CDR records: {e}")
+            raise
+    
+    async def stream_cdr_records(self,
+                                 start_date: Optional[str] = None,
+                                 end_date: Optional[str] = None,
+                                 src: Optional[str] = None,
+                                 dst: Optional[str] = None,
+                                 disposition: Optional[str] = None,
+                                 chunk_size: int = 1000,
+                                 search: Optional[str] = None,
+                                 search_field: str = 'src',
+                                 search_mode: str = 'contains') -> AsyncIterator[Tuple[List[str], List[tuple]]]:
+        """
+        Stream CDR records in chunks through an unbuffered server-side cursor.
+        
+        Rows are read from the server as they are consumed instead of being
+        materialized with fetchall(), so memory stays bounded by chunk_size
+        however large the date range is. The pooled connection stays busy
+        until the generator is exhausted or closed.
+        
+        Args:
+            start_date: Filter by start date (format: YYYY-MM-DD)
+            end_date: Filter by end date (format: YYYY-MM-DD)
+            src: Filter by source extension
+            dst: Filter by destination extension
+            disposition: Filter by call disposition
+            chunk_size: Number of rows fetched per round trip
+            search: Partial text to look for in search_field
+            search_field: src, dst or clid
+            search_mode: prefix, suffix or contains
             
-        if dst:
-            query += " AND dst = %s"
-            params.append(dst)
+        Yields:
+            Tuples of (column names, list of row tuples), oldest calls first
+        """
+        if not self.pool:
+            await self.connect()
             
-        if disposition:
-            query += " AND disposition = %s"
-            params.append(disposition)
+        where, params = self.build_filters(
+            start_date=start_date,
+            end_date=end_date,
+            src=src,
+            dst=dst,
+            disposition=disposition,
+            search=search,
+            search_field=search_field,
+            search_mode=search_mode
+        )
+        query = f"SELECT * FROM cdr WHERE {where} ORDER BY start, uniqueid"
+        
+        async with self.pool.acquire() as conn:
+            cur = await conn.cursor(aiomysql.SSCursor)
+            finished = False
+            try:
+                await cur.execute(query, params)
+                columns = [column[0] for column in cur.description]
+                while True:
+                    rows = await cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield columns, rows
+                finished = True
+            finally:
+                if finished:
+                    await cur.close()
+                else:
+                    # Closing an unbuffered cursor drains every remaining row,
+                    # so drop the connection instead when the client goes away
+                    logger.warning("CDR export stopped early, discarding connection")
+                    conn.close()
+    
+    async def get_cdr_sessions(self,
+                               start_date: Optional[str] = None,
+                               end_date: Optional[str] = None,
+                               src: Optional[str] = None,
+                               dst: Optional[str] = None,
+                               disposition: Optional[str] = None,
+                               limit: int = 50,
+                               offset: int = 0,
+                               cursor: Optional[str] = None,
+                               search: Optional[str] = None,
+                               search_field: str = 'src',
+                               search_mode: str = 'contains') -> List[Dict[str, Any]]:
+        """
+        Get calls as sessions, with the CDR legs of each call grouped together.
+        
+        A transferred or queued call writes one CDR per leg, all sharing the
+        linkedid of the first channel. Rows are grouped by linkedid (uniqueid
+        for rows written without one) in the database, and a session matches
+        when any of its legs matches the filters. Sessions are ordered by the
+        start of their first matching leg, descending, and paginate by offset
+        or by a cursor from session_cursor() like get_cdr_records.
+        
+        The page is fetched in two queries whatever its size: one GROUP BY
+        picking the sessions, one reading every leg of those sessions.
+        
+        Args:
+            start_date: Filter by start date (format: YYYY-MM-DD)
+            end_date: Filter by end date (format: YYYY-MM-DD)
+            src: Filter by source extension
+            dst: Filter by destination extension
+            disposition: Filter by call disposition
+            limit: Maximum number of sessions to return
+            offset: Number of sessions to skip (ignored when a cursor is given)
+            cursor: Opaque cursor from session_cursor() for keyset pagination
+            search: Partial text to look for in search_field
+            search_field: src, dst or clid
+            search_mode: prefix, suffix or contains
             
-        # Add ordering and pagination
-        query += " ORDER BY start DESC LIMIT %s OFFSET %s"
+        Returns:
+            List of sessions with their legs ordered by start
+        """
+        if not self.pool:
+            await self.connect()
+        
+        where, params = self.build_filters(
+            start_date=start_date,
+            end_date=end_date,
+            src=src,
+            dst=dst,
+            disposition=disposition,
+            search=search,
+            search_field=search_field,
+            search_mode=search_mode
+        )
+        
+        key = ('sessions', where, tuple(params), limit, 0 if cursor else offset, cursor)
+        await self._probe_changes()
+        return await self.cache.get_or_fill(
+            key, lambda: self._query_cdr_sessions(where, params, limit, offset, cursor)
+        )
+    
+    async def _query_cdr_sessions(self, where: str, params: List[Any], limit: int,
+                                  offset: int, cursor: Optional[str]) -> List[Dict[str, Any]]:
+        """Pick a page of sessions, then read all of their legs in one query"""
+        params = list(params)
+        query = f"""
+            SELECT COALESCE(NULLIF(linkedid, ''), uniqueid) AS session_id, MIN(start) AS session_start
+            FROM cdr WHERE {where}
+        """
+        
+        seek = self.decode_cursor(cursor) if cursor else None
+        if seek:
+            # The first leg of every older session starts at or before the
+            # seek position, so later legs can be left out of the scan
+            # without changing any MIN(start)
+            last_start, last_session = seek
+            query += " AND start <= %s"
+            params.append(last_start)
+        
+        query += " GROUP BY session_id"
+        if seek:
+            query += " HAVING session_start < %s OR (session_start = %s AND session_id < %s)"
+            params.extend([last_start, last_start, last_session])
+        
+        query += " ORDER BY session_start DESC, session_id DESC LIMIT %s"
         params.append(limit)
-        params.append(offset)
+        if not seek:
+            query += " OFFSET %s"
+            params.append(offset)
         
         try:
             async with self.pool.acquire() as conn:
                 async with conn.cursor(aiomysql.DictCursor) as cur:
                     await cur.execute(query, params)
-                    records = await cur.fetchall()
-                    
-                    # Convert datetime objects to strings for JSON serialization
-                    for record in records:
-                        for key, value in record.items():
-                            if isinstance(value, datetime):
-                                record[key] = value.isoformat()
+                    page = await cur.fetchall()
+                    if not page:
+                        return []
                     
-                    return records
+                    ids = [row['session_id'] for row in page]
+                    placeholders = ', '.join(['%s'] * len(ids))
+                    # Served by idx_cdr_linkedid and idx_cdr_uniqueid (cdr_indexes.py)
+                    await cur.execute(f"""
+                        SELECT *, COALESCE(NULLIF(linkedid, ''), uniqueid) AS session_id FROM cdr
+                        WHERE linkedid IN ({placeholders})
+                           OR (uniqueid IN ({placeholders}) AND (linkedid IS NULL OR linkedid = ''))
+                        ORDER BY start, uniqueid
+                    """, ids + ids)
+                    legs = await cur.fetchall()
         except Exception as e:
-            logger.error(f"Error fetching CDR records: {e}")
+            logger.error(f"Error fetching CDR sessions: {e}")
             raise
+        
+        by_session: Dict[str, List[Dict[str, Any]]] = {session_id: [] for session_id in ids}
+        for leg in legs:
+            by_session[leg.pop('session_id')].append(leg)
+        
+        return [self._build_session(row['session_id'], row['session_start'], by_session[row['session_id']])
+                for row in page]
     
-    async def get_cdr_stats(self) -> Dict[str, Any]:
+    @staticmethod
+    def _build_session(session_id: str, session_start: datetime,
+                       legs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Aggregate the legs of one call.
+        
+        The call counts as answered when any leg was answered, e.g. a queue
+        call that rang two agents before the third picked up; otherwise the
+        disposition of the last leg stands.
+        
+        Args:
+            session_id: linkedid (or uniqueid) shared by the legs
+            session_start: Start of the first matching leg, the pagination key
+            legs: CDR rows of the session ordered by start
+            
+        Returns:
+            Dictionary describing the session, with its legs
+        """
+        dispositions = [leg['disposition'] for leg in legs]
+        ends = [leg['end'] for leg in legs if leg.get('end')]
+        first = legs[0] if legs else {}
+        last = legs[-1] if legs else {}
+        start = first.get('start') or session_start
+        end = max(ends) if ends else None
+        
+        for leg in legs:
+            for key, value in leg.items():
+                if isinstance(value, datetime):
+                    leg[key] = value.isoformat()
+        
+        return {
+            'session_id': session_id,
+            # Position of the session in the listing, see session_cursor()
+            'sort_start': session_start.isoformat(),
+            'start': start.isoformat() if isinstance(start, datetime) else start,
+            'end': end.isoformat() if end else None,
+            'duration': int((end - start).total_seconds()) if end and isinstance(start, datetime) else 0,
+            'talk_time': sum(leg.get('billsec') or 0 for leg in legs),
+            'src': first.get('src'),
+            'dst': last.get('dst'),
+            'clid': first.get('clid'),
+            'disposition': 'ANSWERED' if 'ANSWERED' in dispositions else last.get('disposition'),
+            'leg_count': len(legs),
+            'legs': legs
+        }
+    
+    def invalidate_cache(self):
+        """Drop cached query results, e.g. when an AMI Cdr event reports a new call"""
+        self.cache.invalidate()
+    
+    async def _probe_changes(self):
+        """
+        Invalidate the cache if new CDRs were written since the last probe.
+        
+        Runs at most once per probe_interval, and only when probe_column is
+        set to a column an index leads with, so MAX() is a single index
+        lookup. end (idx_cdr_end) moves forward with every finished call;
+        start (idx_cdr_start) misses long calls that started before the
+        newest one, which the Cdr events and the cache TTL still catch.
+        Without either index the probe is disabled rather than scan the table.
+        """
+        if not self.probe_column:
+            return
+        if time.monotonic() - self._last_probe < self.probe_interval or self._probe_lock.locked():
+            return
+        
+        async with self._probe_lock:
+            self._last_probe = time.monotonic()
+            try:
+                async with self.pool.acquire() as conn:
+                    async with conn.cursor() as cur:
+                        await cur.execute(f"SELECT MAX(`{self.probe_column}`) FROM cdr")
+                        (latest_end,) = await cur.fetchone()
+            except Exception as e:
+                logger.error(f"Error probing for new CDR records: {e}")
+                return
+            
+            if latest_end != self._last_seen_end:
+                if self._last_seen_end is not None:
+                    logger.info("New CDR records detected, invalidating cache")
+                    self.cache.invalidate()
+                self._last_seen_end = latest_end
+    
+    @staticmethod
+    def encode_cursor(record: Dict[str, Any]) -> str:
+        """
+        Encode the keyset position of a record as an opaque cursor.
+        
+        Args:
+            record: CDR record as returned by get_cdr_records
+            
+        Returns:
+            URL-safe cursor string
+        """
+        start = record['start']
+        if isinstance(start, datetime):
+            start = start.isoformat()
+        payload = json.dumps([start, record['uniqueid']], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+    
+    @classmethod
+    def session_cursor(cls, session: Dict[str, Any]) -> str:
+        """
+        Encode the keyset position of a session returned by get_cdr_sessions.
+        
+        Args:
+            session: CDR session
+            
+        Returns:
+            URL-safe cursor string
+        """
+        return cls.encode_cursor({'start': session['sort_start'], 'uniqueid': session['session_id']})
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+        """
+        Decode a cursor produced by encode_cursor.
+        
+        Args:
+            cursor: Cursor string
+            
+        Returns:
+            Tuple of (start, uniqueid) of the last record of the previous page
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            start, uniqueid = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(start), str(uniqueid)
+        except Exception as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+    
+    def _parse_date(self, value: str) -> datetime:
+        """
+        Parse a date filter value into a naive datetime in the database timezone.
+        
+        Args:
+            value: Date (YYYY-MM-DD) or ISO datetime, optionally with an offset
+            
+        Returns:
+            Naive datetime comparable with the cdr.start column
+        """
+        parsed = datetime.fromisoformat(value)
+        
+        if parsed.tzinfo is None and self.timezone:
+            parsed = parsed.replace(tzinfo=self.timezone)
+        if parsed.tzinfo is not None:
+            if self.db_timezone:
+                parsed = parsed.astimezone(self.db_timezone)
+            else:
+                parsed = parsed.astimezone()
+            parsed = parsed.replace(tzinfo=None)
+        
+        return parsed
+    
+    def date_range(self, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """
+        Convert date filters into a half-open [lower, upper) range on cdr.start.
+        
+        A plain end date (YYYY-MM-DD) includes that whole day, so the upper
+        bound is the start of the following day. Day boundaries are taken in
+        the filter timezone and converted to the database timezone.
+        
+        Args:
+            start_date: Inclusive start date or datetime
+            end_date: Inclusive end date, or exclusive end datetime
+            
+        Returns:
+            Tuple of (lower, upper) naive datetimes, either may be None
+        """
+        lower = self._parse_date(start_date) if start_date else None
+        upper = None
+        if end_date:
+            if len(end_date) == 10:
+                next_day = datetime.fromisoformat(end_date) + timedelta(days=1)
+                upper = self._parse_date(next_day.isoformat())
+            else:
+                upper = self._parse_date(end_date)
+        return lower, upper
+    
+    def build_filters(self,
+                      start_date: Optional[str] = None,
+                      end_date: Optional[str] = None,
+                      src: Optional[str] = None,
+                      dst: Optional[str] = None,
+                      disposition: Optional[str] = None,
+                      not_before: Optional[datetime] = None,
+                      search: Optional[str] = None,
+                      search_field: str = 'src',
+                      search_mode: str = 'contains') -> Tuple[str, List[Any]]:
+        """
+        Build the WHERE clause for CDR filters.
+        
+        Date filters are emitted as half-open range predicates on the bare
+        start column (start >= %s AND start < %s) instead of DATE(start), so
+        MySQL can use the (start) and (col, start) indexes from cdr_indexes.py.
+        
+        Args:
+            start_date: Filter by start date (format: YYYY-MM-DD or ISO datetime)
+            end_date: Filter by end date, inclusive (format: YYYY-MM-DD or ISO datetime)
+            src: Filter by source extension
+            dst: Filter by destination extension
+            disposition: Filter by call disposition
+            not_before: Naive database-time lower bound applied on top of start_date,
+                        e.g. the archive cutoff
+            search: Partial text to look for in search_field
+            search_field: src, dst or clid
+            search_mode: prefix, suffix or contains
+            
+        Returns:
+            Tuple of (where clause, params)
+            
+        Raises:
+            ValueError: If a date, search field or search mode is invalid
+        """
+        clauses = []
+        params = []
+        
+        # Equality predicates first, matching the (col, start) index prefix
+        if src:
+            clauses.append("src = %s")
+            params.append(src)
+            
+        if dst:
+            clauses.append("dst = %s")
+            params.append(dst)
+            
+        if disposition:
+            clauses.append("disposition = %s")
+            params.append(disposition)
+        
+        if search:
+            clause, pattern = self._search_predicate(search_field, search_mode, search)
+            clauses.append(clause)
+            params.append(pattern)
+        
+        lower, upper = self.date_range(start_date, end_date)
+        if not_before and (lower is None or lower < not_before):
+            lower = not_before
+        if lower:
+            clauses.append("start >= %s")
+            params.append(lower)
+            
+        if upper:
+            clauses.append("start < %s")
+            params.append(upper)
+        
+        return (" AND ".join(clauses) if clauses else "1=1"), params
+    
+    def _search_predicate(self, field: str, mode: str, text: str) -> Tuple[str, str]:
+        """
+        Build the LIKE predicate of a partial search.
+        
+        Prefix searches use the (col, start) indexes. Suffix searches on src
+        and dst become prefix searches on the reversed generated column when
+        it exists (see cdr_indexes.py). Contains searches can't use a B-tree
+        index and rely on the date range, or on the n-gram index for
+        recent days.
+        
+        Returns:
+            Tuple of (clause, LIKE pattern)
+        """
+        if field not in SEARCH_FIELDS:
+            raise ValueError(f"Search field must be one of {', '.join(SEARCH_FIELDS)}")
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Search mode must be one of {', '.join(SEARCH_MODES)}")
+        
+        if mode == 'prefix':
+            return f"{field} LIKE %s", escape_like(text) + '%'
+        if mode == 'suffix' and field in self.reversed_columns:
+            return f"{field}_rev LIKE %s", escape_like(text[::-1]) + '%'
+        if mode == 'suffix':
+            return f"{field} LIKE %s", '%' + escape_like(text)
+        return f"{field} LIKE %s", '%' + escape_like(text) + '%'
+    
+    async def get_cdr_stats(self, start_date: Optional[str] = None,
+                            end_date: Optional[str] = None) -> Dict[str, Any]:
         """
         Get CDR statistics.
         
+        Served from the rollup tables once they have been built (see
+        cdr_rollup.py), otherwise aggregated from the cdr table directly.
+        
+        Args:
+            start_date: Optional start date (format: YYYY-MM-DD)
+            end_date: Optional end date, inclusive (format: YYYY-MM-DD)
+        
         Returns:
             Dictionary with CDR statistics
         """
         if not self.pool:
             await self.connect()
+        
+        range_where, range_params = self.build_filters(start_date=start_date, end_date=end_date)
+        today = datetime.now(self.timezone).strftime('%Y-%m-%d')
+        
+        key = ('stats', range_where, tuple(range_params), today)
+        await self._probe_changes()
+        return await self.cache.get_or_fill(
+            key, lambda: self._query_cdr_stats(start_date, end_date, range_where, range_params)
+        )
+    
+    async def _query_cdr_stats(self, start_date: Optional[str], end_date: Optional[str],
+                               range_where: str, range_params: List[Any]) -> Dict[str, Any]:
+        """Aggregate CDR statistics from the rollups or the cdr table"""
+        if self.rollup and self.rollup.ready:
+            return await self.rollup.get_stats(start_date, end_date)
             
         try:
             async with self.pool.acquire() as conn:
                 async with conn.cursor(aiomysql.DictCursor) as cur:
                     # Total calls
-                    await cur.execute("SELECT COUNT(*) as total FROM cdr")
+                    await cur.execute(f"SELECT COUNT(*) as total FROM cdr WHERE {range_where}", range_params)
                     total_result = await cur.fetchone()
                     total_calls = total_result['total'] if total_result else 0
                     
                     # Calls by disposition
-                    await cur.execute("SELECT disposition, COUNT(*) as count FROM cdr GROUP BY disposition")
+                    await cur.execute(f"SELECT disposition, COUNT(*) as count FROM cdr WHERE {range_where} GROUP BY disposition", range_params)
                     disposition_results = await cur.fetchall()
                     disposition_stats = {r['disposition']: r['count'] for r in disposition_results}
                     
                     # Calls today
-                    today = datetime.now().strftime('%Y-%m-%d')
-                    await cur.execute("SELECT COUNT(*) as count FROM cdr WHERE DATE(start) = %s", (today,))
+                    today = datetime.now(self.timezone).strftime('%Y-%m-%d')
+                    where, params = self.build_filters(start_date=today, end_date=today)
+                    await cur.execute(f"SELECT COUNT(*) as count FROM cdr WHERE {where}", params)
                     today_result = await cur.fetchone()
                     calls_today = today_result['count'] if today_result else 0
                     
                     # Average call duration (for answered calls)
-                    await cur.execute("SELECT AVG(billsec) as avg_duration FROM cdr WHERE disposition = 'ANSWERED'")
+                    await cur.execute(f"SELECT AVG(billsec) as avg_duration FROM cdr WHERE {range_where} AND disposition = 'ANSWERED'", range_params)
                     avg_result = await cur.fetchone()
                     avg_duration = avg_result['avg_duration'] if avg_result and avg_result['avg_duration'] else 0
                     
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/cdr_rollup.py
+
+import asyncio
+import logging
+import aiomysql
+from typing import Dict, List, Optional, Any, Set, AsyncIterator
+from datetime import datetime, timedelta
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# MySQL named lock held while refreshing, so only one worker process refreshes
+ROLLUP_LOCK = 'cdr_rollup'
+
+ROLLUP_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS cdr_rollup_hourly (
+        bucket DATETIME NOT NULL,
+        disposition VARCHAR(45) NOT NULL,
+        src VARCHAR(80) NOT NULL,
+        dst VARCHAR(80) NOT NULL,
+        calls INT UNSIGNED NOT NULL,
+        billsec_sum BIGINT UNSIGNED NOT NULL,
+        max_uniqueid VARCHAR(150) NOT NULL,
+        PRIMARY KEY (bucket, disposition, src, dst)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cdr_rollup_daily (
+        day DATE NOT NULL,
+        disposition VARCHAR(45) NOT NULL,
+        src VARCHAR(80) NOT NULL,
+        dst VARCHAR(80) NOT NULL,
+        calls INT UNSIGNED NOT NULL,
+        billsec_sum BIGINT UNSIGNED NOT NULL,
+        max_uniqueid VARCHAR(150) NOT NULL,
+        PRIMARY KEY (day, disposition, src, dst)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cdr_rollup_state (
+        name VARCHAR(45) NOT NULL PRIMARY KEY,
+        last_end DATETIME NULL,
+        updated_at DATETIME NOT NULL
+    )
+    """
+]
+
+class CDRRollup:
+    """
+    Hourly and daily CDR aggregates per disposition, src and dst.
+
+    Rollups are maintained incrementally: every refresh looks at CDR rows
+    written since the last watermark (on the `end` column, since Asterisk
+    writes a CDR when the call ends), works out which hours they fall in, and
+    rebuilds just those hour buckets and their days. Rebuilding a bucket is
+    idempotent, so overlapping refreshes never double count. Both watermark
+    queries read cdr.end, so the refresher must only run with an index on
+    it (see cdr_indexes.probe_column).
+    """
+
+    def __init__(self, cdr_manager, interval: float = 60.0, overlap: int = 300):
+        """
+        Initialize the rollup subsystem.
+
+        Args:
+            cdr_manager: CDRManager whose pool and filter helpers are used
+            interval: Seconds between background refreshes
+            overlap: Seconds re-scanned before the watermark to catch late writes
+        """
+        self.cdr_manager = cdr_manager
+        self.interval = interval
+        self.overlap = overlap
+        self._ready = False
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.last_refresh = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the rollups have been built at least once"""
+        return self._ready
+
+    async def _pool(self):
+        """Get the CDR connection pool, connecting if needed"""
+        if not self.cdr_manager.pool:
+            await self.cdr_manager.connect()
+        return self.cdr_manager.pool
+
+    async def create_tables(self):
+        """Create the rollup tables if they do not exist"""
+        pool = await self._pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                for ddl in ROLLUP_TABLES:
+                    await cur.execute(ddl)
+                await cur.execute("SELECT name FROM cdr_rollup_state WHERE name = 'cdr'")
+                self._ready = bool(await cur.fetchone())
+
+    async def start(self):
+        """Create the tables and start refreshing in the background"""
+        await self.create_tables()
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the background refresh"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """Refresh the rollups every interval"""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing CDR rollups: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self) -> Dict[str, Any]:
+        """
+        Bring the rollups up to date with new CDR rows.
+
+        With several worker processes only the one holding the MySQL named
+        lock refreshes; the others skip and only pick up whether the rollups
+        have been built.
+
+        Returns:
+            Dictionary with the number of hour and day buckets rebuilt and
+            whether the refresh was skipped
+        """
+        async with self._lock:
+            pool = await self._pool()
+            # The lock belongs to this connection and is kept for the whole refresh
+            async with pool.acquire() as lock_conn:
+                async with lock_conn.cursor() as cur:
+                    await cur.execute("SELECT GET_LOCK(%s, 0)", (ROLLUP_LOCK,))
+                    locked = (await cur.fetchone())[0] == 1
+                if not locked:
+                    async with lock_conn.cursor() as cur:
+                        await cur.execute("SELECT name FROM cdr_rollup_state WHERE name = 'cdr'")
+                        self._ready = bool(await cur.fetchone())
+                    logger.debug("CDR rollups are being refreshed by another process")
+                    return {'hours': 0, 'days': 0, 'skipped': True}
+                try:
+                    return await self._refresh(pool)
+                finally:
+                    async with lock_conn.cursor() as cur:
+                        await cur.execute("SELECT RELEASE_LOCK(%s)", (ROLLUP_LOCK,))
+
+    async def _refresh(self, pool) -> Dict[str, Any]:
+        """Rebuild the buckets touched since the watermark, holding the lock"""
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT last_end FROM cdr_rollup_state WHERE name = 'cdr'")
+                state = await cur.fetchone()
+                last_end = state[0] if state else None
+
+                # Hours touched by rows written since the watermark (all hours on first run)
+                query = (
+                    "SELECT DISTINCT DATE_FORMAT(start, '%%Y-%%m-%%d %%H:00:00') FROM cdr"
+                    " WHERE start IS NOT NULL"
+                )
+                params = []
+                if last_end:
+                    query += " AND `end` >= %s"
+                    params.append(last_end - timedelta(seconds=self.overlap))
+                await cur.execute(query, params)
+                hours = sorted(datetime.fromisoformat(str(row[0])) for row in await cur.fetchall())
+
+                await cur.execute("SELECT MAX(`end`) FROM cdr")
+                new_end = (await cur.fetchone())[0]
+
+        days = await self._rebuild(hours)
+
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """REPLACE INTO cdr_rollup_state (name, last_end, updated_at)
+                       VALUES ('cdr', %s, %s)""",
+                    (new_end or last_end, datetime.now())
+                )
+
+        self._ready = True
+        self.last_refresh = datetime.now()
+        if hours:
+            logger.info(f"Rebuilt {len(hours)} hourly and {len(days)} daily CDR rollup buckets")
+            # Cached stats were computed from the old buckets
+            self.cdr_manager.invalidate_cache()
+        return {'hours': len(hours), 'days': len(days), 'skipped': False}
+
+    async def _rebuild(self, hours: List[datetime]) -> Set[datetime]:
+        """
+        Rebuild the given hour buckets and the days containing them.
+
+        Each day is rebuilt in its own transaction, so readers never see a
+        half-rebuilt day.
+
+        Args:
+            hours: Hour buckets to rebuild
+
+        Returns:
+            Set of rebuilt days
+        """
+        by_day: Dict[datetime, List[datetime]] = {}
+        for hour in hours:
+            by_day.setdefault(hour.replace(hour=0), []).append(hour)
+
+        pool = await self._pool()
+        async with pool.acquire() as conn:
+            for day, day_hours in by_day.items():
+                await conn.begin()
+                try:
+                    async with conn.cursor() as cur:
+                        for hour in day_hours:
+                            await cur.execute("DELETE FROM cdr_rollup_hourly WHERE bucket = %s", (hour,))
+                            await cur.execute(
+                                """INSERT INTO cdr_rollup_hourly
+                                       (bucket, disposition, src, dst, calls, billsec_sum, max_uniqueid)
+                                   SELECT %s, COALESCE(disposition, ''), COALESCE(src, ''), COALESCE(dst, ''),
+                                          COUNT(*), COALESCE(SUM(billsec), 0), COALESCE(MAX(uniqueid), '')
+                                   FROM cdr
+                                   WHERE start >= %s AND start < %s
+                                   GROUP BY 2, 3, 4""",
+                                (hour, hour, hour + timedelta(hours=1))
+                            )
+
+                        await cur.execute("DELETE FROM cdr_rollup_daily WHERE day = %s", (day.date(),))
+                        await cur.execute(
+                            """INSERT INTO cdr_rollup_daily
+                                   (day, disposition, src, dst, calls, billsec_sum, max_uniqueid)
+                               SELECT %s, disposition, src, dst, SUM(calls), SUM(billsec_sum), MAX(max_uniqueid)
+                               FROM cdr_rollup_hourly
+                               WHERE bucket >= %s AND bucket < %s
+                               GROUP BY disposition, src, dst""",
+                            (day.date(), day, day + timedelta(days=1))
+                        )
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+
+        return set(by_day)
+
+    def _source(self, lower: Optional[datetime], upper: Optional[datetime]) -> tuple:
+        """
+        Pick the rollup table and bucket column for a range.
+
+        The daily table is used when both bounds fall on midnight (in the
+        database timezone), otherwise the hourly one.
+        """
+        def midnight(value):
+            return value is None or value == value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        if midnight(lower) and midnight(upper):
+            return 'cdr_rollup_daily', 'day'
+        return 'cdr_rollup_hourly', 'bucket'
+
+    async def get_stats(self, start_date: Optional[str] = None,
+                        end_date: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get CDR statistics from the rollups.
+
+        Returns the same shape as CDRManager.get_cdr_stats. Partial hours at
+        the edges of a datetime range are rounded to whole hour buckets.
+
+        Args:
+            start_date: Start date (YYYY-MM-DD or ISO datetime)
+            end_date: End date, inclusive (YYYY-MM-DD or ISO datetime)
+
+        Returns:
+            Dictionary with CDR statistics
+        """
+        lower, upper = self.cdr_manager.date_range(start_date, end_date)
+        table, column = self._source(lower, upper)
+
+        clauses, params = [], []
+        if lower:
+            clauses.append(f"{column} >= %s")
+            params.append(lower)
+        if upper:
+            clauses.append(f"{column} < %s")
+            params.append(upper)
+        where = " AND ".join(clauses) if clauses else "1=1"
+
+        today = datetime.now(self.cdr_manager.timezone).strftime('%Y-%m-%d')
+        today_lower, today_upper = self.cdr_manager.date_range(today, today)
+        today_table, today_column = self._source(today_lower, today_upper)
+
+        pool = await self._pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(
+                    f"""SELECT disposition, SUM(calls) AS calls, SUM(billsec_sum) AS billsec
+                        FROM {table} WHERE {where} GROUP BY disposition""",
+                    params
+                )
+                rows = await cur.fetchall()
+
+                await cur.execute(
+                    f"SELECT COALESCE(SUM(calls), 0) AS count FROM {today_table}"
+                    f" WHERE {today_column} >= %s AND {today_column} < %s",
+                    (today_lower, today_upper)
+                )
+                today_result = await cur.fetchone()
+
+        disposition_stats = {r['disposition']: int(r['calls']) for r in rows}
+        answered = next((r for r in rows if r['disposition'] == 'ANSWERED'), None)
+        avg_duration = float(answered['billsec']) / int(answered['calls']) if answered and answered['calls'] else 0
+
+        return {
+            "total_calls": sum(disposition_stats.values()),
+            "disposition_stats": disposition_stats,
+            "calls_today": int(today_result['count']) if today_result else 0,
+            "avg_duration": round(avg_duration, 2) if avg_duration else 0
+        }
+
+    async def stream_rows(self, start_date: Optional[str] = None,
+                          end_date: Optional[str] = None,
+                          chunk_size: int = 10000) -> AsyncIterator[List[tuple]]:
+        """
+        Stream the rollup rows of a range without aggregating them in MySQL.
+
+        Rows are read through an unbuffered cursor, so callers can fold them
+        into their own totals without a GROUP BY ... ORDER BY on the server.
+        Partial hours at the edges of a datetime range are rounded to whole
+        hour buckets, as in get_stats.
+
+        Args:
+            start_date: Start date (YYYY-MM-DD or ISO datetime)
+            end_date: End date, inclusive (YYYY-MM-DD or ISO datetime)
+            chunk_size: Number of rows fetched per round trip
+
+        Yields:
+            Lists of (disposition, src, dst, calls, billsec_sum) tuples
+        """
+        lower, upper = self.cdr_manager.date_range(start_date, end_date)
+        table, column = self._source(lower, upper)
+
+        clauses, params = [], []
+        if lower:
+            clauses.append(f"{column} >= %s")
+            params.append(lower)
+        if upper:
+            clauses.append(f"{column} < %s")
+            params.append(upper)
+        where = " AND ".join(clauses) if clauses else "1=1"
+
+        pool = await self._pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.SSCursor) as cur:
+                await cur.execute(
+                    f"SELECT disposition, src, dst, calls, billsec_sum FROM {table} WHERE {where}",
+                    params
+                )
+                while True:
+                    rows = await cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
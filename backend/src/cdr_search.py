@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/cdr_search.py
+
+import asyncio
+import logging
+import aiomysql
+from array import array
+from typing import Dict, List, Optional, Any, Tuple, Set
+from datetime import datetime, date, timedelta
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Columns that support partial matching
+SEARCH_FIELDS = ('src', 'dst', 'clid')
+
+# Partial match modes
+SEARCH_MODES = ('prefix', 'suffix', 'contains')
+
+def matches(value: Optional[str], mode: str, text: str) -> bool:
+    """
+    Check a partial match the way the SQL LIKE predicate does (case-insensitive).
+
+    Args:
+        value: Column value
+        mode: prefix, suffix or contains
+        text: Case-folded search text
+
+    Returns:
+        True if the value matches
+    """
+    if not value:
+        return False
+    value = value.casefold()
+    if mode == 'prefix':
+        return value.startswith(text)
+    if mode == 'suffix':
+        return value.endswith(text)
+    return text in value
+
+def escape_like(text: str) -> str:
+    """Escape LIKE wildcards so the search text is matched literally"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+class _DayIndex:
+    """Trigram postings of the CDRs that started on one day"""
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.uniqueids: List[str] = []
+        self.dispositions: List[Optional[str]] = []
+        self.values: Dict[str, List[Optional[str]]] = {field: [] for field in SEARCH_FIELDS}
+        self.postings: Dict[Tuple[str, str], array] = {}
+        self.keys: Set[Tuple[datetime, str]] = set()
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+class NgramIndex:
+    """
+    In-memory trigram index over src, dst and clid of the recent CDR window.
+
+    Partial matches can't use a B-tree index in the middle of a string, so
+    for the last few days every call's src, dst and clid are split into
+    case-folded trigrams with postings per day. A search intersects the
+    postings of the search text's trigrams, verifies the few candidates
+    and returns their (start, uniqueid) keys; full rows are then fetched by
+    primary position instead of scanning the cdr table. The index is
+    loaded once at startup and kept current from AMI Cdr events.
+    """
+
+    def __init__(self, days: int = 7, n: int = 3):
+        """
+        Initialize the index.
+
+        Args:
+            days: Number of days kept, today included
+            n: Gram length
+        """
+        self.days = days
+        self.n = n
+        self._days: Dict[date, _DayIndex] = {}
+        self._window_start: Optional[datetime] = None
+        self.ready = False
+
+    def _grams(self, value: str) -> Set[str]:
+        """Get the distinct grams of a case-folded value"""
+        return {value[i:i + self.n] for i in range(len(value) - self.n + 1)}
+
+    def covers(self, lower: Optional[datetime]) -> bool:
+        """Whether every CDR from lower on is in the index"""
+        return self.ready and lower is not None and self._window_start is not None \
+            and lower >= self._window_start
+
+    def add(self, record: Dict[str, Any]):
+        """
+        Index one CDR.
+
+        Args:
+            record: CDR record with start (datetime or ISO string), uniqueid,
+                    disposition, src, dst and clid
+        """
+        start = record.get('start')
+        if not start:
+            return
+        if isinstance(start, str):
+            start = datetime.fromisoformat(start)
+
+        day = self._days.get(start.date())
+        if day is None:
+            if self._window_start and start < self._window_start:
+                return
+            day = self._days[start.date()] = _DayIndex()
+            self._evict(start.date())
+
+        key = (start, record.get('uniqueid') or '')
+        if key in day.keys:
+            return
+        day.keys.add(key)
+
+        row = len(day)
+        day.starts.append(start)
+        day.uniqueids.append(key[1])
+        day.dispositions.append(record.get('disposition'))
+        for field in SEARCH_FIELDS:
+            value = record.get(field)
+            day.values[field].append(value)
+            for gram in self._grams((value or '').casefold()):
+                postings = day.postings.get((field, gram))
+                if postings is None:
+                    postings = day.postings[(field, gram)] = array('I')
+                postings.append(row)
+
+    def _evict(self, newest: date):
+        """Drop days that fell out of the window"""
+        oldest = newest - timedelta(days=self.days - 1)
+        for day in [d for d in self._days if d < oldest]:
+            del self._days[day]
+        if self._window_start and self._window_start.date() < oldest:
+            self._window_start = datetime.combine(oldest, datetime.min.time())
+
+    async def load(self, cdr_manager, today: Optional[date] = None):
+        """
+        Load the window from the database.
+
+        Args:
+            cdr_manager: Connected CDRManager
+            today: Newest day of the window in the database timezone
+        """
+        today = today or datetime.now(cdr_manager.db_timezone).date()
+        window_start = datetime.combine(today - timedelta(days=self.days - 1), datetime.min.time())
+        self._window_start = window_start
+
+        if not cdr_manager.pool:
+            await cdr_manager.connect()
+        count = 0
+        async with cdr_manager.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.SSCursor) as cur:
+                await cur.execute(
+                    "SELECT start, uniqueid, disposition, src, dst, clid FROM cdr WHERE start >= %s",
+                    (window_start,)
+                )
+                while True:
+                    rows = await cur.fetchmany(5000)
+                    if not rows:
+                        break
+                    for start, uniqueid, disposition, src, dst, clid in rows:
+                        self.add({'start': start, 'uniqueid': uniqueid, 'disposition': disposition,
+                                  'src': src, 'dst': dst, 'clid': clid})
+                    count += len(rows)
+                    # Indexing is CPU work, let other tasks run between chunks
+                    await asyncio.sleep(0)
+
+        self.ready = True
+        logger.info(f"Loaded {count} CDRs into the search index from {window_start}")
+
+    def search(self, field: str, mode: str, text: str,
+               lower: Optional[datetime], upper: Optional[datetime],
+               filters: Dict[str, Optional[str]]) -> List[Tuple[datetime, str]]:
+        """
+        Find the CDRs whose field matches the search text.
+
+        Args:
+            field: src, dst or clid
+            mode: prefix, suffix or contains
+            text: Search text
+            lower: Inclusive lower bound on start
+            upper: Exclusive upper bound on start
+            filters: Exact src, dst and disposition filters
+
+        Returns:
+            List of (start, uniqueid) keys ordered newest first
+        """
+        text = text.casefold()
+        grams = self._grams(text)
+        keys = []
+        # Runs in a worker thread while add() and _evict() change the days on
+        # the loop, so iterate over a snapshot of them
+        for _, day in sorted(self._days.items(), key=lambda item: item[0], reverse=True):
+            if grams:
+                # Smallest postings first, so the intersection shrinks fast
+                lists = sorted((day.postings.get((field, gram), ()) for gram in grams), key=len)
+                if not lists[0]:
+                    continue
+                candidates = set(lists[0])
+                for postings in lists[1:]:
+                    candidates.intersection_update(postings)
+                    if not candidates:
+                        break
+            else:
+                # Shorter than one gram, check every call of the day
+                candidates = range(len(day))
+
+            values = day.values[field]
+            for row in candidates:
+                start = day.starts[row]
+                if (lower and start < lower) or (upper and start >= upper):
+                    continue
+                if not matches(values[row], mode, text):
+                    continue
+                if filters.get('disposition') and day.dispositions[row] != filters['disposition']:
+                    continue
+                if any(filters.get(f) and day.values[f][row] != filters[f] for f in ('src', 'dst')):
+                    continue
+                keys.append((start, day.uniqueids[row]))
+
+        keys.sort(reverse=True)
+        return keys
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get index size.
+
+        Returns:
+            Dictionary with window, day count, indexed calls and posting lists
+        """
+        return {
+            'ready': self.ready,
+            'window_start': self._window_start.isoformat() if self._window_start else None,
+            'days': len(self._days),
+            'calls': sum(len(day) for day in self._days.values()),
+            'postings': sum(len(day.postings) for day in self._days.values())
+        }
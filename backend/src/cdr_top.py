@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/cdr_top.py
+
+import heapq
+import asyncio
+import logging
+import numpy as np
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, List, Optional, Any
+from datetime import datetime, timedelta
+from cdr_live import start_day
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class TopTotals:
+    """
+    Call count and billed seconds per extension and per destination prefix.
+
+    Totals are plain counters updated in O(1) per call or rollup row; the
+    top N is picked with heapq.nlargest in O(K log N) over the K keys, so
+    nothing is ever fully sorted.
+    """
+
+    def __init__(self, prefix_digits: int = 4):
+        """
+        Initialize empty totals.
+
+        Args:
+            prefix_digits: Leading digits of an external number that make up
+                           its destination prefix
+        """
+        self.prefix_digits = prefix_digits
+        self.extension_calls: Counter = Counter()
+        self.extension_billsec: Counter = Counter()
+        self.prefix_calls: Counter = Counter()
+        self.prefix_billsec: Counter = Counter()
+
+    def prefix(self, number: Optional[str]) -> Optional[str]:
+        """
+        Get the destination prefix of a number.
+
+        Args:
+            number: Dialed number
+
+        Returns:
+            The first prefix_digits digits, or None for numbers no longer than
+            a prefix (internal extensions) and non-numeric destinations
+        """
+        if not number or len(number) <= self.prefix_digits or not number.lstrip('+').isdigit():
+            return None
+        return number[:self.prefix_digits]
+
+    def add(self, src: Optional[str], dst: Optional[str], calls: int = 1, billsec: int = 0):
+        """
+        Count calls from src to dst.
+
+        Args:
+            src: Calling extension
+            dst: Dialed number
+            calls: Number of calls
+            billsec: Billed seconds of those calls
+        """
+        if src:
+            self.extension_calls[src] += calls
+            self.extension_billsec[src] += billsec
+        prefix = self.prefix(dst)
+        if prefix:
+            self.prefix_calls[prefix] += calls
+            self.prefix_billsec[prefix] += billsec
+
+    def top(self, limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Pick the top extensions and destination prefixes.
+
+        Args:
+            limit: Number of entries per list
+
+        Returns:
+            Dictionary with extensions by minutes, extensions by calls and
+            destination prefixes by calls
+        """
+        def entries(key_name, ranked, calls, billsec):
+            return [
+                {key_name: key, 'calls': calls[key], 'minutes': round(billsec[key] / 60, 1)}
+                for key, _ in ranked
+            ]
+
+        by_minutes = heapq.nlargest(limit, self.extension_billsec.items(), key=itemgetter(1))
+        by_calls = heapq.nlargest(limit, self.extension_calls.items(), key=itemgetter(1))
+        prefixes = heapq.nlargest(limit, self.prefix_calls.items(), key=itemgetter(1))
+        return {
+            'extensions_by_minutes': entries('extension', [e for e in by_minutes if e[1] > 0],
+                                             self.extension_calls, self.extension_billsec),
+            'extensions_by_calls': entries('extension', by_calls,
+                                           self.extension_calls, self.extension_billsec),
+            'destinations': entries('prefix', prefixes, self.prefix_calls, self.prefix_billsec)
+        }
+
+    def add_frame(self, frame):
+        """
+        Fold a CDR frame into the totals.
+
+        Calls and answered billsec are summed per extension code with
+        bincount, so only one add per distinct number runs in Python.
+
+        Args:
+            frame: CDRFrame from cdr_analytics
+        """
+        size = len(frame.extension_names)
+        billsec = np.where(frame.answered, frame.billsec, 0)
+        src_calls = np.bincount(frame.src, minlength=size)
+        src_billsec = np.bincount(frame.src, weights=billsec, minlength=size)
+        dst_calls = np.bincount(frame.dst, minlength=size)
+        dst_billsec = np.bincount(frame.dst, weights=billsec, minlength=size)
+
+        names = frame.extension_names
+        for code in np.flatnonzero(src_calls):
+            self.add(str(names[code]), None, int(src_calls[code]), int(src_billsec[code]))
+        for code in np.flatnonzero(dst_calls):
+            self.add(None, str(names[code]), int(dst_calls[code]), int(dst_billsec[code]))
+
+class CDRTop:
+    """
+    Top-N talkers and destinations over arbitrary windows and live for today.
+
+    Windows are answered from the hourly/daily rollups (cdr_rollup.py),
+    streamed row by row into TopTotals instead of a GROUP BY ... ORDER BY,
+    or from a columnar CDR frame (cdr_analytics.py) while the rollups are
+    not built yet. Today's totals are kept in memory, seeded once at startup
+    and updated from every AMI Cdr event.
+    """
+
+    def __init__(self, cdr_manager, analytics, prefix_digits: int = 4):
+        """
+        Initialize the top-N engine.
+
+        Args:
+            cdr_manager: CDRManager whose rollups, cache and timezone are used
+            analytics: CDRAnalytics that loads frames when the rollups are not ready
+            prefix_digits: Default destination prefix length
+        """
+        self.cdr_manager = cdr_manager
+        self.analytics = analytics
+        self.prefix_digits = prefix_digits
+        self._day = self._today()
+        self._live = TopTotals(prefix_digits)
+
+    def _today(self) -> str:
+        """Get today's date in the CDR timezone"""
+        return datetime.now(self.cdr_manager.timezone).strftime('%Y-%m-%d')
+
+    async def top(self, start_date: Optional[str] = None,
+                  end_date: Optional[str] = None,
+                  limit: int = 20,
+                  prefix_digits: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get the top extensions and destinations of a window.
+
+        Args:
+            start_date: Start date (defaults to the analytics default window)
+            end_date: End date, inclusive
+            limit: Number of entries per list
+            prefix_digits: Destination prefix length
+
+        Returns:
+            Dictionary with the top lists and the source they were computed from
+        """
+        if not start_date:
+            start = datetime.now(self.cdr_manager.timezone) - timedelta(days=self.analytics.default_days - 1)
+            start_date = start.strftime('%Y-%m-%d')
+        prefix_digits = prefix_digits or self.prefix_digits
+        lower, upper = self.cdr_manager.date_range(start_date, end_date)
+
+        # Shares the CDR query cache, dropped whenever new CDRs land
+        key = ('top', lower, upper, limit, prefix_digits)
+        return await self.cdr_manager.cache.get_or_fill(
+            key, lambda: self._query_top(start_date, end_date, limit, prefix_digits)
+        )
+
+    async def _query_top(self, start_date: str, end_date: Optional[str],
+                         limit: int, prefix_digits: int) -> Dict[str, Any]:
+        """Fold the window into totals from the rollups or a frame, then select"""
+        totals = TopTotals(prefix_digits)
+        rollup = self.cdr_manager.rollup
+        if rollup and rollup.ready:
+            source = 'rollup'
+            async for rows in rollup.stream_rows(start_date, end_date):
+                for disposition, src, dst, calls, billsec in rows:
+                    totals.add(src, dst, int(calls), int(billsec) if disposition == 'ANSWERED' else 0)
+                # Folding is CPU work, let other tasks run between chunks
+                await asyncio.sleep(0)
+        else:
+            source = 'frame'
+            frame = await self.analytics.load(start_date, end_date)
+            await asyncio.to_thread(totals.add_frame, frame)
+
+        return {'source': source, 'start_date': start_date, 'end_date': end_date, **totals.top(limit)}
+
+    async def seed(self):
+        """Load today's totals once at startup, later calls come from Cdr events"""
+        today = self._today()
+        frame = await self.analytics.load(today, today)
+        totals = TopTotals(self.prefix_digits)
+        await asyncio.to_thread(totals.add_frame, frame)
+        self._day, self._live = today, totals
+        logger.info(f"Seeded live top-N with {len(frame)} CDRs from {today}")
+
+    def add(self, record: Dict[str, Any]):
+        """
+        Count a finished call in today's totals.
+
+        Args:
+            record: CDR record as parsed by cdr_live.parse_cdr_event
+        """
+        today = self._today()
+        if today != self._day:
+            self._day, self._live = today, TopTotals(self.prefix_digits)
+        if start_day(record.get('start'), self.cdr_manager.timezone, self.cdr_manager.db_timezone) != today:
+            return
+        billsec = (record.get('billsec') or 0) if record.get('disposition') == 'ANSWERED' else 0
+        self._live.add(record.get('src'), record.get('dst'), 1, billsec)
+
+    def today(self, limit: int = 20) -> Dict[str, Any]:
+        """
+        Get today's top extensions and destinations.
+
+        Args:
+            limit: Number of entries per list
+
+        Returns:
+            Dictionary with the day and the top lists
+        """
+        if self._today() != self._day:
+            self._day, self._live = self._today(), TopTotals(self.prefix_digits)
+        return {'source': 'live', 'day': self._day, **self._live.top(limit)}
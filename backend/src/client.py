@@ -3,6 +3,7 @@
 from typing import Dict, List, Optional
 from panoramisk import Manager
 from parser import parse_endpoint_callerid, parse_active_calls
+from dispatcher import PartitionedDispatcher
 import logging
 
 # Configure logging
@@ -18,7 +19,7 @@ class AmiClient:
     
     def __init__(self, host: str = '127.0.0.1', port: int = 5038,
                  username: str = 'admin', password: str = 'admin',
-                 event_callback=None):
+                 event_callback=None, events: bool = True, partitions: int = 0):
         """Initialize AMI client
         
         Args:
@@ -27,14 +28,21 @@ class AmiClient:
             username: AMI username
             password: AMI password
             event_callback: Optional callback for handling AMI events
+            events: Whether Asterisk should send events on this session
+                    (disabled for action-only sessions in worker processes)
+            partitions: Number of partitions for concurrent event processing
+                        (0 processes events serially on the AMI reader)
         """
         self.event_callback = event_callback
+        # Events of the same call/device stay ordered, different calls run concurrently
+        self.dispatcher = PartitionedDispatcher(self._process_event, partitions) if partitions > 0 else None
         self.manager = Manager(
             host=host,
             port=port,
             username=username,
             secret=password,  # Panoramisk uses 'secret' instead of 'password'
-            ping_delay=10  # Ping every 10 seconds to keep connection alive
+            ping_delay=10,  # Ping every 10 seconds to keep connection alive
+            events='on' if events else 'off'
         )
         self._connected = False
 
@@ -47,9 +55,12 @@ class AmiClient:
                 logger.info("Connected to AMI")
                 # Register event handlers
                 if self.event_callback:
+                    if self.dispatcher:
+                        await self.dispatcher.start()
                     # Register for each event type separately
                     for event in [
-                        'DeviceStateChange', 'Newchannel', 'DialState', 'Newstate', 'DialEnd', 'Hangup'
+                        'DeviceStateChange', 'Newchannel', 'DialBegin', 'DialState', 'Newstate', 'DialEnd', 'Hangup',
+                        'Cdr', 'Reload', 'ContactStatus'
                     ]:
                         self.manager.register_event(event, self._handle_event)
                     # Log successful registration
@@ -63,6 +74,14 @@ class AmiClient:
             event_type = event.get('Event')
             event_data = dict(event)
             
+            if self.dispatcher:
+                await self.dispatcher.dispatch(event_type, event_data)
+            else:
+                await self._process_event(event_type, event_data)
+
+    async def _process_event(self, event_type: str, event_data: Dict):
+        """Log an AMI event and pass it to the callback"""
+        if self.event_callback:
             # Enhanced logging for all AMI events
             logger.info(f"Received AMI event: {event_type}")
             logger.debug(f"AMI event details: {event_data}")
@@ -79,6 +98,8 @@ class AmiClient:
                 
     async def close(self):
         """Close AMI connection"""
+        if self.dispatcher:
+            await self.dispatcher.close()
         if self._connected and self.manager:
             try:
                 if hasattr(self.manager, 'protocol') and self.manager.protocol:
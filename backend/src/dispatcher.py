@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/dispatcher.py
+
+import zlib
+import asyncio
+import logging
+from typing import Dict, List, Optional, Any, Callable, Awaitable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Event fields used as partition key, in order of preference. Linkedid keeps
+# every leg of a call on the same partition; Device covers state changes.
+PARTITION_KEY_FIELDS = ('Linkedid', 'Uniqueid', 'Device', 'Channel', 'Interface', 'Queue')
+
+def partition_key(event_type: str, event_data: Dict[str, Any]) -> str:
+    """
+    Get the ordering key of an event.
+
+    Args:
+        event_type: AMI event name
+        event_data: AMI event payload
+
+    Returns:
+        str: Key whose events must be processed in order
+    """
+    for field in PARTITION_KEY_FIELDS:
+        value = event_data.get(field)
+        if value:
+            return value
+    return event_type
+
+class PartitionedDispatcher:
+    """
+    Dispatches events onto K worker tasks by hashing their partition key.
+
+    Events sharing a key (the same call, device or queue) always land on the
+    same partition and are handled in arrival order, while events for
+    different calls are handled concurrently.
+    """
+
+    def __init__(self, handler: Callable[[str, Dict[str, Any]], Awaitable[None]],
+                 partitions: int = 4, max_queue: int = 10000):
+        """
+        Initialize the dispatcher.
+
+        Args:
+            handler: Coroutine called as handler(event_type, event_data)
+            partitions: Number of worker tasks
+            max_queue: Per-partition queue bound; dispatch() waits when full
+        """
+        self.handler = handler
+        self.partitions = partitions
+        self.max_queue = max_queue
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._processed = [0] * partitions
+        self._errors = [0] * partitions
+
+    @property
+    def running(self) -> bool:
+        """Whether the worker tasks have been started"""
+        return bool(self._workers)
+
+    async def start(self):
+        """Create the partition queues and start one worker task per partition"""
+        if self._workers:
+            return
+        self._queues = [asyncio.Queue(maxsize=self.max_queue) for _ in range(self.partitions)]
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.partitions)
+        ]
+        logger.info(f"Started event dispatcher with {self.partitions} partitions")
+
+    async def close(self):
+        """Stop all worker tasks, discarding queued events"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queues = []
+        logger.info("Stopped event dispatcher")
+
+    def partition_for(self, event_type: str, event_data: Dict[str, Any]) -> int:
+        """Get the partition index an event is routed to"""
+        key = partition_key(event_type, event_data)
+        return zlib.crc32(key.encode()) % self.partitions
+
+    async def dispatch(self, event_type: str, event_data: Dict[str, Any]):
+        """
+        Queue an event on its partition.
+
+        Args:
+            event_type: AMI event name
+            event_data: AMI event payload
+        """
+        if not self._workers:
+            await self.start()
+        index = self.partition_for(event_type, event_data)
+        await self._queues[index].put((event_type, event_data))
+
+    async def _worker(self, index: int):
+        """Process the events of one partition in order"""
+        queue = self._queues[index]
+        while True:
+            event_type, event_data = await queue.get()
+            try:
+                await self.handler(event_type, event_data)
+                self._processed[index] += 1
+            except Exception as e:
+                self._errors[index] += 1
+                logger.error(f"Error handling {event_type} on partition {index}: {e}")
+            finally:
+                queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get per-partition statistics.
+
+        Returns:
+            Dictionary with queue depth, processed and error counts per partition
+        """
+        return {
+            'partitions': self.partitions,
+            'running': self.running,
+            'queue_depths': [q.qsize() for q in self._queues],
+            'processed': list(self._processed),
+            'errors': list(self._errors)
+        }
@@ -1,14 +1,21 @@
 #!/usr/bin/env python3
 # /home/ubuntu/Documents/ispbx/backend/src/endpoint_manager.py
 
+import os
 import logging
 import aiomysql
+from contextlib import asynccontextmanager
+from pymysql.constants import CLIENT, ER
 from typing import Dict, List, Optional, Union, Any
+from cache import TTLCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Times a bulk create is attempted when ids are created concurrently
+BULK_CREATE_ATTEMPTS = 3
+
 class EndpointManager:
     """
     Manager for SIP endpoint operations using MySQL database.
@@ -36,10 +43,19 @@ class EndpointManager:
             'user': user,
             'password': password,
             'db': db,
-            'autocommit': True
+            'autocommit': True,
+            # rowcount counts matched rows, so an unchanged row still reads as found
+            'client_flag': CLIENT.FOUND_ROWS
         }
         self.pool = None
         self.ami_client = None  # Will be set externally
+        self.reload_scheduler = None  # Will be set externally
+        
+        # Endpoint config by id (and the full list), invalidated on writes and PJSIP reloads
+        self.cache = TTLCache(
+            maxsize=int(os.getenv('ENDPOINT_CACHE_SIZE', '1024')),
+            ttl=float(os.getenv('ENDPOINT_CACHE_TTL', '300'))
+        )
     
     async def connect(self):
         """Establish connection pool to the MySQL database"""
@@ -58,13 +74,50 @@ class EndpointManager:
             await self.pool.wait_closed()
             self.pool = None
             logger.info("Disconnected from MySQL database")
+
+    @asynccontextmanager
+    async def _transaction(self):
+        """
+        Run statements in one transaction.
+        
+        Yields:
+            Cursor whose statements are committed together when the block
+            exits, or rolled back if it raises
+        """
+        if not self.pool:
+            await self.connect()
+        
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await conn.begin()
+                try:
+                    yield cursor
+                    await conn.commit()
+                except BaseException:
+                    await conn.rollback()
+                    raise
+    
+    def _request_reload(self):
+        """Ask the reload scheduler to reload res_pjsip"""
+        if self.reload_scheduler:
+            self.reload_scheduler.request('res_pjsip')
+        else:
+            logger.warning("Reload scheduler not set, unable to reload configuration")
+    
+    def invalidate_cache(self):
+        """Drop cached endpoint config, e.g. after a write or a PJSIP reload"""
+        self.cache.invalidate()
     
     async def create_endpoint(self, endpoint_id: str, password: str, name: str = None,
                               context: str = 'from-internal', transport: str = 'transport-udp',
-                              codecs: List[str] = None, max_contacts: int = 1) -> bool:
+                              codecs: List[str] = None, max_contacts: int = 1) -> Optional[bool]:
         """
         Create a new SIP endpoint in the database.
         
+        The AOR, auth and endpoint rows are inserted in one transaction. An
+        existing endpoint is detected from the duplicate-key error rather
+        than read beforehand.
+        
         Args:
             endpoint_id: The extension number/endpoint ID
             password: Authentication password for the endpoint
@@ -75,11 +128,9 @@ class EndpointManager:
             max_contacts: Maximum number of contacts for the endpoint
             
         Returns:
-            bool: True if endpoint was created successfully, False otherwise
+            True if the endpoint was created, None if it already exists,
+            False on any other error
         """
-        if not self.pool:
-            await self.connect()
-        
         # Set defaults
         if name is None:
             name = endpoint_id
@@ -89,149 +140,265 @@ class EndpointManager:
         allow = ','.join(codecs)
         
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    # 1. Create AOR (Address of Record) with qualify parameters for device state events
-                    await cursor.execute(
-                        "INSERT INTO ps_aors (id, max_contacts, qualify_frequency, qualify_timeout) VALUES (%s, %s, %s, %s)",
-                        (endpoint_id, max_contacts, 60, 3.0)
-                    )
-                    
-                    # 2. Create Authentication
-                    await cursor.execute(
-                        "INSERT INTO ps_auths (id, auth_type, password, username) VALUES (%s, %s, %s, %s)",
-                        (endpoint_id, 'userpass', password, endpoint_id)
-                    )
-                    
-                    # 3. Create Endpoint with caller ID
-                    callerid = f'"{name}" <{endpoint_id}>'
-                    await cursor.execute(
-                        """INSERT INTO ps_endpoints 
-                           (id, transport, aors, auth, context, disallow, allow, direct_media, callerid) 
-                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                        (endpoint_id, transport, endpoint_id, endpoint_id, context, 'all', allow, 'no', callerid)
-                    )
-                    
-                    logger.info(f"Created endpoint {endpoint_id} with name '{name}'")
-                    
-                    # # Trigger Asterisk to reload configuration and generate events
-                    # if self.ami_client:
-                    #     try:
-                    #         # Use PJSIPReload action to reload PJSIP configuration
-                    #         logger.info(f"Reloading PJSIP configuration after endpoint creation")
-                    #         reload_result = await self.ami_client.manager.send_action({
-                    #             'Action': 'PJSIPReload'
-                    #         })
-                    #         logger.info(f"PJSIP configuration reloaded: {reload_result}")
-                    #         
-                    #         # Force a device state refresh for this endpoint
-                    #         logger.info(f"Triggering device state refresh for endpoint {endpoint_id}")
-                    #         state_result = await self.ami_client.manager.send_action({
-                    #             'Action': 'DeviceStateList'
-                    #         })
-                    #         logger.info(f"Device state refresh triggered")
-                    #     except Exception as e:
-                    #         logger.error(f"Failed to reload PJSIP configuration: {e}")
-                    # else:
-                    #     logger.warning("AMI client not set, unable to reload configuration")
-                    return True
+            async with self._transaction() as cursor:
+                # 1. Create AOR (Address of Record) with qualify parameters for device state events
+                await cursor.execute(
+                    "INSERT INTO ps_aors (id, max_contacts, qualify_frequency, qualify_timeout) VALUES (%s, %s, %s, %s)",
+                    (endpoint_id, max_contacts, 60, 3.0)
+                )
+                
+                # 2. Create Authentication
+                await cursor.execute(
+                    "INSERT INTO ps_auths (id, auth_type, password, username) VALUES (%s, %s, %s, %s)",
+                    (endpoint_id, 'userpass', password, endpoint_id)
+                )
+                
+                # 3. Create Endpoint with caller ID
+                callerid = f'"{name}" <{endpoint_id}>'
+                await cursor.execute(
+                    """INSERT INTO ps_endpoints 
+                       (id, transport, aors, auth, context, disallow, allow, direct_media, callerid) 
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                    (endpoint_id, transport, endpoint_id, endpoint_id, context, 'all', allow, 'no', callerid)
+                )
+            
+            self.invalidate_cache()
+            logger.info(f"Created endpoint {endpoint_id} with name '{name}'")
+            return True
                     
+        except aiomysql.IntegrityError as e:
+            if e.args[0] != ER.DUP_ENTRY:
+                logger.error(f"Failed to create endpoint {endpoint_id}: {e}")
+                return False
+            logger.warning(f"Endpoint {endpoint_id} already exists")
+            return None
         except Exception as e:
             logger.error(f"Failed to create endpoint {endpoint_id}: {e}")
             return False
     
+    async def create_endpoints(self, specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Create many SIP endpoints in one transaction.
+        
+        Specs are validated first; inside the transaction, existing ids are
+        found with a single query over the three tables instead of one lookup
+        per endpoint and the remaining rows are written with one multi-row
+        INSERT per table (executemany), so either all new endpoints are
+        created or none. If another writer creates one of the ids meanwhile,
+        the batch is retried so only that id is reported as existing. No
+        reload is sent, the caller reloads once.
+        
+        Args:
+            specs: List of endpoint specs with the create_endpoint arguments
+                   (endpoint_id, password, name, context, transport, codecs, max_contacts)
+            
+        Returns:
+            One result per spec, in order, with endpoint_id, status
+            (created, exists, invalid or error) and detail
+        """
+        if not self.pool:
+            await self.connect()
+        
+        results = []
+        seen = set()
+        for spec in specs:
+            endpoint_id = (spec.get('endpoint_id') or '').strip()
+            result = {'endpoint_id': endpoint_id, 'status': None, 'detail': None}
+            if not endpoint_id:
+                result.update(status='invalid', detail='endpoint_id is required')
+            elif not spec.get('password'):
+                result.update(status='invalid', detail='password is required')
+            elif spec.get('max_contacts') is not None and spec['max_contacts'] < 1:
+                result.update(status='invalid', detail='max_contacts must be at least 1')
+            elif endpoint_id in seen:
+                result.update(status='invalid', detail='Duplicate endpoint_id in request')
+            seen.add(endpoint_id)
+            results.append(result)
+        
+        pending = [i for i, result in enumerate(results) if result['status'] is None]
+        if not pending:
+            return results
+        
+        created = 0
+        try:
+            # An endpoint created concurrently after the existence check
+            # fails the INSERT with a duplicate key; the batch is rolled back
+            # and retried, and the re-check marks just that id as existing
+            for attempt in range(BULK_CREATE_ATTEMPTS):
+                try:
+                    created = await self._insert_endpoints(specs, results, pending)
+                    break
+                except aiomysql.IntegrityError as e:
+                    if e.args[0] != ER.DUP_ENTRY or attempt == BULK_CREATE_ATTEMPTS - 1:
+                        raise
+                    logger.warning(f"Endpoint created concurrently, retrying bulk create: {e}")
+                    for i in pending:
+                        results[i].update(status=None, detail=None)
+                    
+        except Exception as e:
+            logger.error(f"Failed to create endpoints in bulk: {e}")
+            for i in pending:
+                if results[i]['status'] is None:
+                    results[i].update(status='error', detail=str(e))
+            return results
+        
+        if created:
+            self.invalidate_cache()
+        for i in pending:
+            if results[i]['status'] is None:
+                results[i]['status'] = 'created'
+        logger.info(f"Created {created} endpoints in bulk ({len(specs)} requested)")
+        return results
+    
+    async def _insert_endpoints(self, specs: List[Dict[str, Any]], results: List[Dict[str, Any]],
+                                pending: List[int]) -> int:
+        """Insert the pending specs that do not exist yet in one transaction"""
+        async with self._transaction() as cursor:
+            # A leftover AOR or auth with the id would fail the whole batch
+            ids = [results[i]['endpoint_id'] for i in pending]
+            placeholders = ', '.join(['%s'] * len(ids))
+            await cursor.execute(
+                f"""SELECT id FROM ps_endpoints WHERE id IN ({placeholders})
+                    UNION SELECT id FROM ps_aors WHERE id IN ({placeholders})
+                    UNION SELECT id FROM ps_auths WHERE id IN ({placeholders})""",
+                ids * 3
+            )
+            existing = {row[0] for row in await cursor.fetchall()}
+            
+            aors, auths, endpoints = [], [], []
+            for i in pending:
+                spec, endpoint_id = specs[i], results[i]['endpoint_id']
+                if endpoint_id in existing:
+                    results[i].update(status='exists', detail=f'Endpoint {endpoint_id} already exists')
+                    continue
+                name = spec.get('name') or endpoint_id
+                allow = ','.join(spec.get('codecs') or ['g722'])
+                max_contacts = spec['max_contacts'] if spec.get('max_contacts') is not None else 1
+                aors.append((endpoint_id, max_contacts, 60, 3.0))
+                auths.append((endpoint_id, 'userpass', spec['password'], endpoint_id))
+                endpoints.append((
+                    endpoint_id, spec.get('transport') or 'transport-udp', endpoint_id, endpoint_id,
+                    spec.get('context') or 'from-internal', 'all', allow, 'no', f'"{name}" <{endpoint_id}>'
+                ))
+            
+            if endpoints:
+                await cursor.executemany(
+                    "INSERT INTO ps_aors (id, max_contacts, qualify_frequency, qualify_timeout) VALUES (%s, %s, %s, %s)",
+                    aors
+                )
+                await cursor.executemany(
+                    "INSERT INTO ps_auths (id, auth_type, password, username) VALUES (%s, %s, %s, %s)",
+                    auths
+                )
+                await cursor.executemany(
+                    """INSERT INTO ps_endpoints 
+                       (id, transport, aors, auth, context, disallow, allow, direct_media, callerid) 
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                    endpoints
+                )
+            return len(endpoints)
+    
     async def get_endpoint(self, endpoint_id: str) -> Optional[Dict[str, Any]]:
         """
         Get details for a specific endpoint.
         
+        Served from the endpoint cache when possible; a miss reads the
+        endpoint, AOR and auth rows with one JOINed query, and concurrent
+        misses for the same id share that query. The returned dictionary is
+        shared with the cache and must not be modified.
+        
         Args:
             endpoint_id: The extension number/endpoint ID
             
         Returns:
             Dict containing endpoint details or None if not found
         """
-        if not self.pool:
-            await self.connect()
-            
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor(aiomysql.DictCursor) as cursor:
-                    # Get endpoint details
-                    await cursor.execute(
-                        "SELECT * FROM ps_endpoints WHERE id = %s",
-                        (endpoint_id,)
-                    )
-                    endpoint = await cursor.fetchone()
-                    
-                    if not endpoint:
-                        return None
-                    
-                    # Get AOR details
-                    await cursor.execute(
-                        "SELECT * FROM ps_aors WHERE id = %s",
-                        (endpoint_id,)
-                    )
-                    aor = await cursor.fetchone()
-                    
-                    # Get auth details
-                    await cursor.execute(
-                        "SELECT * FROM ps_auths WHERE id = %s",
-                        (endpoint_id,)
-                    )
-                    auth = await cursor.fetchone()
-                    
-                    # Combine all details
-                    result = {
-                        'endpoint': endpoint,
-                        'aor': aor,
-                        'auth': auth
-                    }
-                    
-                    return result
-                    
+            return await self.cache.get_or_fill(endpoint_id, lambda: self._query_endpoint(endpoint_id))
         except Exception as e:
             logger.error(f"Failed to get endpoint {endpoint_id}: {e}")
             return None
     
+    async def _query_endpoint(self, endpoint_id: str) -> Optional[Dict[str, Any]]:
+        """Read an endpoint with its AOR and auth in a single query"""
+        if not self.pool:
+            await self.connect()
+            
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                # Marker columns split the row back into the three tables and
+                # tell a missing AOR/auth apart from one with NULL columns
+                await cursor.execute(
+                    """SELECT e.*, a.id IS NOT NULL AS _aor, a.*, u.id IS NOT NULL AS _auth, u.*
+                       FROM ps_endpoints e
+                       LEFT JOIN ps_aors a ON a.id = e.id
+                       LEFT JOIN ps_auths u ON u.id = e.id
+                       WHERE e.id = %s""",
+                    (endpoint_id,)
+                )
+                row = await cursor.fetchone()
+                if not row:
+                    return None
+                
+                columns = [column[0] for column in cursor.description]
+                aor_at, auth_at = columns.index('_aor'), columns.index('_auth')
+                
+                # Combine all details
+                return {
+                    'endpoint': dict(zip(columns[:aor_at], row[:aor_at])),
+                    'aor': dict(zip(columns[aor_at + 1:auth_at], row[aor_at + 1:auth_at])) if row[aor_at] else None,
+                    'auth': dict(zip(columns[auth_at + 1:], row[auth_at + 1:])) if row[auth_at] else None
+                }
+    
     async def list_endpoints(self) -> List[Dict[str, Any]]:
         """
         List all endpoints in the database.
         
+        The list is cached with the endpoint config and dropped on the same
+        writes and reloads. The returned list is shared with the cache and
+        must not be modified.
+        
         Returns:
             List of dictionaries containing basic endpoint information
         """
-        if not self.pool:
-            await self.connect()
-            
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor(aiomysql.DictCursor) as cursor:
-                    # Join tables to get comprehensive endpoint information
-                    await cursor.execute("""
-                        SELECT 
-                            e.id, e.context, e.callerid, e.transport,
-                            a.max_contacts,
-                            u.username, u.auth_type
-                        FROM 
-                            ps_endpoints e
-                        LEFT JOIN 
-                            ps_aors a ON e.id = a.id
-                        LEFT JOIN 
-                            ps_auths u ON e.id = u.id
-                    """)
-                    
-                    endpoints = await cursor.fetchall()
-                    return endpoints
-                    
+            return await self.cache.get_or_fill(('list',), self._query_endpoints)
         except Exception as e:
             logger.error(f"Failed to list endpoints: {e}")
             return []
     
+    async def _query_endpoints(self) -> List[Dict[str, Any]]:
+        """Read config of all endpoints joined with their AOR and auth"""
+        if not self.pool:
+            await self.connect()
+            
+        async with self.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                # Join tables to get comprehensive endpoint information
+                await cursor.execute("""
+                    SELECT 
+                        e.id, e.context, e.callerid, e.transport,
+                        a.max_contacts,
+                        u.username, u.auth_type
+                    FROM 
+                        ps_endpoints e
+                    LEFT JOIN 
+                        ps_aors a ON e.id = a.id
+                    LEFT JOIN 
+                        ps_auths u ON e.id = u.id
+                """)
+                
+                return list(await cursor.fetchall())
+    
     async def update_endpoint(self, endpoint_id: str, 
-                              updates: Dict[str, Any]) -> bool:
+                              updates: Dict[str, Any]) -> Optional[bool]:
         """
         Update an existing endpoint.
         
+        All statements run in one transaction. The ps_endpoints row is
+        updated first, so a missing endpoint is detected from its rowcount
+        before anything else is written.
+        
         Args:
             endpoint_id: The extension number/endpoint ID
             updates: Dictionary containing fields to update
@@ -246,171 +413,97 @@ class EndpointManager:
                      - qualify_timeout: Timeout in seconds for qualify checks
                      
         Returns:
-            bool: True if endpoint was updated successfully, False otherwise
+            True if the endpoint was updated, None if it does not exist,
+            False on any other error
         """
-        if not self.pool:
-            await self.connect()
+        # Update endpoint fields
+        endpoint_updates = {}
+        
+        if 'context' in updates:
+            endpoint_updates['context'] = updates['context']
+            
+        if 'transport' in updates:
+            endpoint_updates['transport'] = updates['transport']
             
+        if 'codecs' in updates and isinstance(updates['codecs'], list):
+            endpoint_updates['allow'] = ','.join(updates['codecs'])
+            
+        if 'name' in updates:
+            # Update callerid with new name but keep same number
+            endpoint_updates['callerid'] = f'"{updates["name"]}" <{endpoint_id}>'
+        
+        # Update AOR if max_contacts or qualify parameters are specified
+        aor_updates = {
+            key: updates[key] for key in ('max_contacts', 'qualify_frequency', 'qualify_timeout')
+            if key in updates
+        }
+        
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    # Update AOR if max_contacts or qualify parameters are specified
-                    aor_updates = {}
-                    aor_params = []
-                    
-                    if 'max_contacts' in updates:
-                        aor_updates['max_contacts'] = '%s'
-                        aor_params.append(updates['max_contacts'])
-                        
-                    if 'qualify_frequency' in updates:
-                        aor_updates['qualify_frequency'] = '%s'
-                        aor_params.append(updates['qualify_frequency'])
-                        
-                    if 'qualify_timeout' in updates:
-                        aor_updates['qualify_timeout'] = '%s'
-                        aor_params.append(updates['qualify_timeout'])
-                    
-                    if aor_updates:
-                        query = "UPDATE ps_aors SET "
-                        query += ", ".join([f"{k} = {v}" for k, v in aor_updates.items()])
-                        query += " WHERE id = %s"
-                        aor_params.append(endpoint_id)
-                        await cursor.execute(query, aor_params)
-                    
-                    # Update auth if password is specified
-                    if 'password' in updates:
-                        await cursor.execute(
-                            "UPDATE ps_auths SET password = %s WHERE id = %s",
-                            (updates['password'], endpoint_id)
-                        )
-                    
-                    # Update endpoint fields
-                    endpoint_updates = {}
-                    
-                    if 'context' in updates:
-                        endpoint_updates['context'] = updates['context']
-                        
-                    if 'transport' in updates:
-                        endpoint_updates['transport'] = updates['transport']
-                        
-                    if 'codecs' in updates and isinstance(updates['codecs'], list):
-                        endpoint_updates['allow'] = ','.join(updates['codecs'])
-                        
-                    if 'name' in updates:
-                        # Get current callerid to extract number
-                        await cursor.execute(
-                            "SELECT callerid FROM ps_endpoints WHERE id = %s",
-                            (endpoint_id,)
-                        )
-                        result = await cursor.fetchone()
-                        if result and result[0]:
-                            # Update callerid with new name but keep same number
-                            callerid = f'"{updates["name"]}" <{endpoint_id}>'
-                            endpoint_updates['callerid'] = callerid
-                    
-                    # Execute update if there are endpoint fields to update
-                    if endpoint_updates:
-                        query = "UPDATE ps_endpoints SET "
-                        params = []
-                        
-                        for i, (key, value) in enumerate(endpoint_updates.items()):
-                            query += f"{key} = %s"
-                            params.append(value)
-                            if i < len(endpoint_updates) - 1:
-                                query += ", "
-                                
-                        query += " WHERE id = %s"
-                        params.append(endpoint_id)
-                        
-                        await cursor.execute(query, params)
-                    
-                    logger.info(f"Updated endpoint {endpoint_id}")
-                    
-                    # Trigger Asterisk to reload configuration and generate events
-                    if self.ami_client:
-                        try:
-                            # Use PJSIPReload action to reload PJSIP configuration
-                            logger.info(f"Reloading PJSIP configuration after endpoint update")
-                            reload_result = await self.ami_client.manager.send_action({
-                                'Action': 'PJSIPReload'
-                            })
-                            logger.info(f"PJSIP configuration reloaded: {reload_result}")
-                            
-                            # Force a device state refresh for this endpoint
-                            logger.info(f"Triggering device state refresh for endpoint {endpoint_id}")
-                            state_result = await self.ami_client.manager.send_action({
-                                'Action': 'DeviceStateList'
-                            })
-                            logger.info(f"Device state refresh triggered")
-                        except Exception as e:
-                            logger.error(f"Failed to reload PJSIP configuration: {e}")
-                    else:
-                        logger.warning("AMI client not set, unable to reload configuration")
-                        
-                    return True
+            async with self._transaction() as cursor:
+                # Without endpoint fields the no-op assignment still finds
+                # and locks the row
+                assignments = ", ".join(f"{key} = %s" for key in endpoint_updates) or "id = id"
+                await cursor.execute(
+                    f"UPDATE ps_endpoints SET {assignments} WHERE id = %s",
+                    [*endpoint_updates.values(), endpoint_id]
+                )
+                if cursor.rowcount == 0:
+                    logger.warning(f"Endpoint {endpoint_id} not found")
+                    return None
+                
+                if aor_updates:
+                    assignments = ", ".join(f"{key} = %s" for key in aor_updates)
+                    await cursor.execute(
+                        f"UPDATE ps_aors SET {assignments} WHERE id = %s",
+                        [*aor_updates.values(), endpoint_id]
+                    )
+                
+                # Update auth if password is specified
+                if 'password' in updates:
+                    await cursor.execute(
+                        "UPDATE ps_auths SET password = %s WHERE id = %s",
+                        (updates['password'], endpoint_id)
+                    )
+            
+            self.invalidate_cache()
+            logger.info(f"Updated endpoint {endpoint_id}")
+            
+            # Apply the change in Asterisk, coalesced with other edits
+            self._request_reload()
+            return True
                     
         except Exception as e:
             logger.error(f"Failed to update endpoint {endpoint_id}: {e}")
             return False
     
-    async def delete_endpoint(self, endpoint_id: str) -> bool:
+    async def delete_endpoint(self, endpoint_id: str) -> Optional[bool]:
         """
-        Delete an endpoint and its associated records.
+        Delete an endpoint and its associated records in one transaction.
         
         Args:
             endpoint_id: The extension number/endpoint ID
             
         Returns:
-            bool: True if endpoint was deleted successfully, False otherwise
+            True if the endpoint was deleted, None if none of its rows
+            exist, False on any other error
         """
-        if not self.pool:
-            await self.connect()
-            
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    # Delete from ps_endpoints
-                    await cursor.execute(
-                        "DELETE FROM ps_endpoints WHERE id = %s",
-                        (endpoint_id,)
-                    )
-                    
-                    # Delete from ps_auths
-                    await cursor.execute(
-                        "DELETE FROM ps_auths WHERE id = %s",
-                        (endpoint_id,)
-                    )
-                    
-                    # Delete from ps_aors
-                    await cursor.execute(
-                        "DELETE FROM ps_aors WHERE id = %s",
-                        (endpoint_id,)
-                    )
-                    
-                    logger.info(f"Deleted endpoint {endpoint_id}")
-                    
-                    # Trigger Asterisk to reload configuration and generate events
-                    if self.ami_client:
-                        try:
-                            # Use PJSIPReload action to reload PJSIP configuration
-                            logger.info(f"Reloading PJSIP configuration after endpoint deletion")
-                            reload_result = await self.ami_client.manager.send_action({
-                                'Action': 'PJSIPReload'
-                            })
-                            logger.info(f"PJSIP configuration reloaded: {reload_result}")
-                            
-                            # Force a device state refresh
-                            logger.info(f"Triggering device state refresh after deletion")
-                            state_result = await self.ami_client.manager.send_action({
-                                'Action': 'DeviceStateList'
-                            })
-                            logger.info(f"Device state refresh triggered")
-                        except Exception as e:
-                            logger.error(f"Failed to reload PJSIP configuration: {e}")
-                    else:
-                        logger.warning("AMI client not set, unable to reload configuration")
-                        
-                    return True
+            async with self._transaction() as cursor:
+                deleted = 0
+                for table in ('ps_endpoints', 'ps_auths', 'ps_aors'):
+                    await cursor.execute(f"DELETE FROM {table} WHERE id = %s", (endpoint_id,))
+                    deleted += cursor.rowcount
+            
+            if not deleted:
+                logger.warning(f"Endpoint {endpoint_id} not found")
+                return None
+            
+            self.invalidate_cache()
+            logger.info(f"Deleted endpoint {endpoint_id}")
+            
+            # Apply the change in Asterisk, coalesced with other edits
+            self._request_reload()
+            return True
                     
         except Exception as e:
             logger.error(f"Failed to delete endpoint {endpoint_id}: {e}")
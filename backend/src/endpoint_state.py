@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/endpoint_state.py
+
+import logging
+from typing import Dict, List, Optional, Any
+from parser import parse_endpoint_callerid
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Fields the endpoint view can be sorted by
+VIEW_SORT_FIELDS = ('endpoint_id', 'name', 'state', 'context', 'transport', 'contacts')
+
+# Contact statuses that mean the device can be reached
+REACHABLE_STATUSES = {'Created', 'Updated', 'Reachable', 'NonQualified', 'Avail'}
+
+def normalize_state(state: Optional[str]) -> Optional[str]:
+    """
+    Bring a device state to the DeviceStateChange spelling.
+
+    PJSIPShowEndpoints reports "Not in use" where DeviceStateChange reports
+    NOT_INUSE; both end up as NOT_INUSE.
+
+    Args:
+        state: Device state as reported by Asterisk
+
+    Returns:
+        Upper-case state with underscores, or None if empty
+    """
+    if not state:
+        return None
+    state = state.strip().upper().replace(' ', '_')
+    return 'NOT_INUSE' if state == 'NOT_IN_USE' else state
+
+def _natural_key(value: Optional[str]):
+    """Sort numeric extensions by value and before names"""
+    value = value or ''
+    # isdigit() alone accepts digits such as '²' that int() rejects
+    return (0, int(value), '') if value.isascii() and value.isdigit() else (1, 0, value.lower())
+
+class EndpointStateCache:
+    """
+    Live PJSIP device state and registered contacts, kept in memory.
+
+    Seeded with one PJSIPShowEndpoints and one PJSIPShowContacts, then kept
+    current from DeviceStateChange and ContactStatus events. Reads never
+    touch AMI, unlike the per-endpoint PJSIPShowEndpoint sweep behind
+    /api/endpoints.
+    """
+
+    def __init__(self):
+        """Initialize empty state"""
+        self.states: Dict[str, str] = {}
+        # Endpoint id -> contact URI -> contact details
+        self.contacts: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.seeded = False
+
+    async def seed(self, ami_client):
+        """
+        Load current states and contacts from Asterisk.
+
+        Args:
+            ami_client: Connected AmiClient used for the two list actions
+        """
+        endpoints = await ami_client.manager.send_action({'Action': 'PJSIPShowEndpoints'})
+        contacts = await ami_client.manager.send_action({'Action': 'PJSIPShowContacts'})
+
+        states = {}
+        for event in endpoints:
+            if event.get('Event') == 'EndpointList' and event.get('ObjectName'):
+                states[event['ObjectName']] = normalize_state(event.get('DeviceState'))
+
+        self.contacts = {}
+        for event in contacts:
+            if event.get('Event') == 'ContactList' and event.get('Endpoint'):
+                self._set_contact(event['Endpoint'], {
+                    'uri': event.get('Uri'),
+                    'status': event.get('Status'),
+                    'user_agent': event.get('UserAgent'),
+                    'via_address': event.get('ViaAddress'),
+                    'reg_expire': event.get('RegExpire'),
+                    'roundtrip_usec': event.get('RoundtripUsec')
+                })
+
+        self.states = states
+        self.seeded = True
+        logger.info(f"Seeded endpoint state with {len(states)} endpoints and "
+                    f"{sum(len(c) for c in self.contacts.values())} contacts")
+
+    def _set_contact(self, endpoint_id: str, contact: Dict[str, Any]):
+        """Store or replace one contact of an endpoint"""
+        if contact.get('uri'):
+            self.contacts.setdefault(endpoint_id, {})[contact['uri']] = contact
+
+    def observe(self, event_type: str, event_data: Dict[str, Any]):
+        """
+        Apply an AMI event.
+
+        Args:
+            event_type: AMI event name
+            event_data: AMI event fields
+        """
+        if event_type == 'DeviceStateChange':
+            technology, _, endpoint_id = (event_data.get('Device') or '').partition('/')
+            if technology == 'PJSIP' and endpoint_id:
+                self.states[endpoint_id] = normalize_state(event_data.get('State'))
+
+        elif event_type == 'ContactStatus':
+            endpoint_id = event_data.get('EndpointName') or event_data.get('AOR')
+            uri = event_data.get('URI')
+            if not endpoint_id or not uri:
+                return
+            status = event_data.get('ContactStatus')
+            if status == 'Removed':
+                contacts = self.contacts.get(endpoint_id, {})
+                contacts.pop(uri, None)
+                if not contacts:
+                    self.contacts.pop(endpoint_id, None)
+                return
+            # Events only carry the fields that changed, keep the rest
+            contact = dict(self.contacts.get(endpoint_id, {}).get(uri, {}))
+            contact.update({'uri': uri, 'status': status})
+            for key, field in (('user_agent', 'UserAgent'), ('via_address', 'ViaAddress'),
+                               ('reg_expire', 'RegExpire'), ('roundtrip_usec', 'RoundtripUsec')):
+                if event_data.get(field):
+                    contact[key] = event_data[field]
+            self._set_contact(endpoint_id, contact)
+
+    def state_of(self, endpoint_id: str) -> str:
+        """
+        Get the device state of an endpoint.
+
+        Args:
+            endpoint_id: The extension number/endpoint ID
+
+        Returns:
+            Last reported state; endpoints not reported yet are NOT_INUSE
+            with a reachable contact and UNAVAILABLE without
+        """
+        state = self.states.get(endpoint_id)
+        if state:
+            return state
+        contacts = self.contacts.get(endpoint_id, {})
+        if any(c.get('status') in REACHABLE_STATUSES for c in contacts.values()):
+            return 'NOT_INUSE'
+        return 'UNAVAILABLE'
+
+    def view(self, endpoints: List[Dict[str, Any]],
+             search: Optional[str] = None,
+             states: Optional[List[str]] = None,
+             context: Optional[str] = None,
+             registered: Optional[bool] = None,
+             sort: str = 'endpoint_id',
+             order: str = 'asc',
+             offset: int = 0,
+             limit: int = 100) -> Dict[str, Any]:
+        """
+        Join endpoint config with live state, then filter, sort and page it.
+
+        Rows are built and filtered in a single pass over the config; only
+        the rows that pass the filters are sorted.
+
+        Args:
+            endpoints: Rows from EndpointManager.list_endpoints
+            search: Case-insensitive substring of the id or name
+            states: Device states to keep (e.g. NOT_INUSE, INUSE, UNAVAILABLE)
+            context: Dialplan context to keep
+            registered: Keep only endpoints with (True) or without (False) contacts
+            sort: One of VIEW_SORT_FIELDS
+            order: asc or desc
+            offset: Rows to skip
+            limit: Rows to return
+
+        Returns:
+            Dictionary with the total after filtering and the page of rows
+
+        Raises:
+            ValueError: If sort or order is invalid
+        """
+        if sort not in VIEW_SORT_FIELDS:
+            raise ValueError(f"Sort must be one of {', '.join(VIEW_SORT_FIELDS)}")
+        if order not in ('asc', 'desc'):
+            raise ValueError("Order must be asc or desc")
+
+        search = search.lower() if search else None
+        states = {normalize_state(s) for s in states} if states else None
+
+        rows = []
+        for endpoint in endpoints:
+            endpoint_id = endpoint.get('id')
+            name = parse_endpoint_callerid(endpoint.get('callerid') or '')['name'] or endpoint_id
+            if search and search not in endpoint_id.lower() and search not in name.lower():
+                continue
+            if context and endpoint.get('context') != context:
+                continue
+            contacts = list(self.contacts.get(endpoint_id, {}).values())
+            if registered is not None and bool(contacts) != registered:
+                continue
+            state = self.state_of(endpoint_id)
+            if states and state not in states:
+                continue
+            rows.append({
+                'endpoint_id': endpoint_id,
+                'name': name,
+                'state': state,
+                'context': endpoint.get('context'),
+                'transport': endpoint.get('transport'),
+                'max_contacts': endpoint.get('max_contacts'),
+                'username': endpoint.get('username'),
+                'auth_type': endpoint.get('auth_type'),
+                'contacts': contacts
+            })
+
+        if sort == 'endpoint_id':
+            key = lambda row: _natural_key(row['endpoint_id'])
+        elif sort == 'contacts':
+            key = lambda row: (len(row['contacts']), _natural_key(row['endpoint_id']))
+        else:
+            key = lambda row: ((row[sort] or '').lower(), _natural_key(row['endpoint_id']))
+        rows.sort(key=key, reverse=order == 'desc')
+
+        return {
+            'total': len(rows),
+            'offset': offset,
+            'limit': limit,
+            'endpoints': rows[offset:offset + limit]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary with the number of endpoints per state and of contacts
+        """
+        by_state: Dict[str, int] = {}
+        for state in self.states.values():
+            by_state[state] = by_state.get(state, 0) + 1
+        return {
+            'seeded': self.seeded,
+            'endpoints': len(self.states),
+            'states': by_state,
+            'contacts': sum(len(c) for c in self.contacts.values())
+        }
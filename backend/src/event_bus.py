@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/event_bus.py
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Any, Callable, Awaitable
+from event_history import EventHistory
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = '/tmp/ispbx-events.sock'
+
+# Largest single line accepted by subscribers (snapshots can be big)
+MAX_LINE_SIZE = 64 * 1024 * 1024
+
+class EventPublisher:
+    """
+    Publishes AMI events over a local Unix socket.
+
+    Runs inside the ingester process, which owns the only AMI session. Each
+    connected worker first receives a snapshot of the event history and then
+    every new event as one NDJSON line. Workers that stop reading are
+    disconnected instead of buffering without bound; they resynchronise from
+    the snapshot when they reconnect.
+    """
+
+    def __init__(self, path: str = DEFAULT_SOCKET_PATH,
+                 history: Optional[EventHistory] = None,
+                 max_buffer: int = 8 * 1024 * 1024):
+        """
+        Initialize the event publisher.
+
+        Args:
+            path: Filesystem path of the Unix socket
+            history: Event history used to assign sequence numbers and build snapshots
+            max_buffer: Maximum bytes buffered per subscriber before it is dropped
+        """
+        self.path = path
+        self.history = history or EventHistory()
+        self.max_buffer = max_buffer
+        self._server = None
+        self._subscribers = set()
+
+    async def start(self):
+        """Start listening for worker connections"""
+        if self._server:
+            return
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle_subscriber, path=self.path)
+        logger.info(f"Event publisher listening on {self.path}")
+
+    async def close(self):
+        """Stop listening and disconnect all workers"""
+        for writer in list(self._subscribers):
+            writer.close()
+        self._subscribers.clear()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        logger.info("Event publisher closed")
+
+    async def _handle_subscriber(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Send the current snapshot to a new worker and register it for events"""
+        snapshot = self.history.snapshot()
+        writer.write(self._encode({'type': 'snapshot', **snapshot}))
+        self._subscribers.add(writer)
+        logger.info(f"Worker subscribed to events ({len(self._subscribers)} connected)")
+
+        try:
+            await writer.drain()
+            # Workers never send anything, reading only detects the disconnect
+            await reader.read()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            writer.close()
+            logger.info(f"Worker unsubscribed from events ({len(self._subscribers)} connected)")
+
+    def _encode(self, message: Dict[str, Any]) -> bytes:
+        """Encode a message as one NDJSON line"""
+        return (json.dumps(message, default=str) + '\n').encode()
+
+    async def publish(self, event_type: str, event_data: dict):
+        """
+        Record an event and send it to every connected worker.
+
+        Has the same signature as broadcast_event, so it can be passed to
+        AmiClient as the event callback.
+
+        Args:
+            event_type: AMI event name
+            event_data: AMI event payload
+        """
+        ts = time.time()
+        seq = self.history.record(event_type, event_data, ts=ts)
+        line = self._encode({
+            'type': 'event',
+            'seq': seq,
+            'ts': ts,
+            'event': event_type,
+            'data': event_data
+        })
+
+        for writer in list(self._subscribers):
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                logger.warning("Dropping worker that stopped reading events")
+                self._subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get publisher statistics.
+
+        Returns:
+            Dictionary with the subscriber count and event history stats
+        """
+        return {
+            'subscribers': len(self._subscribers),
+            'history': self.history.stats()
+        }
+
+class EventSubscriber:
+    """
+    Receives events from the ingester's EventPublisher.
+
+    Runs inside each API/Socket.IO worker process and hands every event to a
+    callback with the sequence number and timestamp assigned by the ingester.
+    Reconnects automatically if the ingester restarts.
+    """
+
+    def __init__(self, event_callback: Callable[..., Awaitable[None]],
+                 snapshot_callback: Optional[Callable[[List[Dict[str, Any]], int], None]] = None,
+                 path: str = DEFAULT_SOCKET_PATH, reconnect_delay: float = 2.0):
+        """
+        Initialize the event subscriber.
+
+        Args:
+            event_callback: Coroutine called as callback(event_type, event_data, seq=, ts=)
+            snapshot_callback: Function called with (events, last_seq) on every (re)connect
+            path: Filesystem path of the ingester's Unix socket
+            reconnect_delay: Seconds to wait before reconnecting
+        """
+        self.event_callback = event_callback
+        self.snapshot_callback = snapshot_callback
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self._task = None
+        self._connected = False
+
+    @property
+    def connected(self) -> bool:
+        """Whether the subscriber is currently connected to the ingester"""
+        return self._connected
+
+    async def start(self):
+        """Start receiving events in a background task"""
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop receiving events"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """Connect to the ingester and dispatch events, reconnecting on failure"""
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_LINE_SIZE)
+            except (FileNotFoundError, ConnectionError) as e:
+                logger.warning(f"Event ingester not reachable at {self.path}: {e}")
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+
+            self._connected = True
+            logger.info(f"Subscribed to event ingester at {self.path}")
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    await self._dispatch(json.loads(line))
+            except (ConnectionError, ValueError) as e:
+                logger.error(f"Event ingester connection failed: {e}")
+            finally:
+                self._connected = False
+                writer.close()
+
+            logger.warning("Lost connection to event ingester, reconnecting")
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _dispatch(self, message: Dict[str, Any]):
+        """Hand one message from the ingester to the callbacks"""
+        if message.get('type') == 'snapshot':
+            if self.snapshot_callback:
+                self.snapshot_callback(message['events'], message['last_seq'])
+            return
+
+        try:
+            await self.event_callback(
+                message['event'], message['data'],
+                seq=message['seq'], ts=message['ts']
+            )
+        except Exception as e:
+            logger.error(f"Error in event callback for {message.get('event')}: {e}")
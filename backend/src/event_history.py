@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/event_history.py
+
+import time
+import logging
+from collections import deque
+from typing import Dict, List, Optional, Any
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class EventHistory:
+    """
+    Bounded in-memory ring buffer of recently broadcast events.
+
+    Every recorded event gets a monotonically increasing sequence number and
+    a timestamp, so a client that lost its Socket.IO connection can ask for
+    everything it missed instead of reloading all state over REST.
+    """
+
+    def __init__(self, maxlen: int = 5000, max_age: Optional[float] = None):
+        """
+        Initialize the event history.
+
+        Args:
+            maxlen: Maximum number of events kept in the buffer
+            max_age: Optional maximum age in seconds of replayable events
+        """
+        self.maxlen = maxlen
+        self.max_age = max_age
+        self._events = deque(maxlen=maxlen)
+        self._last_seq = 0
+        # Timestamp of the newest event no longer in the buffer, None if none was dropped
+        self._dropped_ts = None
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the most recently recorded event (0 if none)"""
+        return self._last_seq
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest event still in the buffer"""
+        if self._events:
+            return self._events[0]['seq']
+        return self._last_seq + 1
+
+    def record(self, event_type: str, event_data: Dict[str, Any],
+               seq: Optional[int] = None, ts: Optional[float] = None) -> int:
+        """
+        Record an event and return its sequence number.
+
+        Args:
+            event_type: Event name as emitted to clients
+            event_data: Event payload as emitted to clients
+            seq: Sequence number assigned upstream (e.g. by the AMI ingester)
+            ts: Timestamp assigned upstream
+
+        Returns:
+            int: Sequence number assigned to the event
+        """
+        if seq is None:
+            seq = self._last_seq + 1
+        if ts is None:
+            ts = time.time()
+        if seq != self._last_seq + 1:
+            # Lookups rely on contiguous sequence numbers, so a gap resets the buffer
+            logger.warning(f"Event sequence jumped from {self._last_seq} to {seq}, clearing history")
+            self._events.clear()
+            # The skipped events happened no later than this one
+            self._dropped_ts = ts
+        elif len(self._events) == self.maxlen:
+            self._dropped_ts = self._events[0]['ts']
+
+        self._last_seq = seq
+        self._events.append({
+            'seq': seq,
+            'ts': ts,
+            'event': event_type,
+            'data': event_data
+        })
+        return seq
+
+    def load(self, events: List[Dict[str, Any]], last_seq: int):
+        """
+        Replace the buffer contents with a snapshot taken elsewhere.
+
+        Args:
+            events: Recorded events in sequence order
+            last_seq: Last sequence number known to the snapshot source
+        """
+        self._events.clear()
+        self._events.extend(events)
+        self._last_seq = last_seq
+        # Anything the source dropped happened before its oldest event, or before now
+        first_seq = events[0]['seq'] if events else last_seq + 1
+        if first_seq > 1:
+            self._dropped_ts = events[0]['ts'] if events else time.time()
+        else:
+            self._dropped_ts = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the whole buffer in a form accepted by load().
+
+        Returns:
+            Dictionary with the buffered events and the last sequence number
+        """
+        self._expire()
+        return {'events': list(self._events), 'last_seq': self._last_seq}
+
+    def _expire(self):
+        """Drop events older than max_age from the head of the buffer"""
+        if self.max_age is None:
+            return
+        cutoff = time.time() - self.max_age
+        while self._events and self._events[0]['ts'] < cutoff:
+            self._dropped_ts = self._events.popleft()['ts']
+
+    def since(self, seq: int, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get every event recorded after the given sequence number.
+
+        Sequence numbers are contiguous, so the position of ``seq`` in the
+        buffer is computed directly instead of scanning for it.
+
+        Args:
+            seq: Last sequence number the client has seen
+            limit: Optional maximum number of events to return
+
+        Returns:
+            Dictionary with the replayed events, the current last sequence
+            number and a ``snapshot_required`` flag that is set when events
+            after ``seq`` have already been evicted from the buffer
+        """
+        self._expire()
+
+        if seq > self._last_seq:
+            # The client saw a sequence from before a backend restart
+            return {
+                'events': [],
+                'last_seq': self._last_seq,
+                'snapshot_required': True
+            }
+
+        if seq + 1 < self.first_seq:
+            return {
+                'events': [],
+                'last_seq': self._last_seq,
+                'snapshot_required': True
+            }
+
+        start = seq + 1 - self.first_seq if self._events else 0
+        events = [self._events[i] for i in range(start, len(self._events))]
+        if limit is not None and len(events) > limit:
+            # Too many events to replay in one batch, a snapshot is cheaper
+            return {
+                'events': [],
+                'last_seq': self._last_seq,
+                'snapshot_required': True
+            }
+
+        return {
+            'events': events,
+            'last_seq': self._last_seq,
+            'snapshot_required': False
+        }
+
+    def since_time(self, timestamp: float) -> Dict[str, Any]:
+        """
+        Get every event recorded at or after the given UNIX timestamp.
+
+        Args:
+            timestamp: UNIX timestamp in seconds
+
+        Returns:
+            Dictionary shaped like since(): the replayed events, the current
+            last sequence number and a ``snapshot_required`` flag that is set
+            when events at or after ``timestamp`` may already have been
+            evicted from the buffer
+        """
+        self._expire()
+
+        if self._dropped_ts is not None and timestamp <= self._dropped_ts:
+            return {
+                'events': [],
+                'last_seq': self._last_seq,
+                'snapshot_required': True
+            }
+
+        # Timestamps are non-decreasing, so bisect over the buffer indices
+        lo, hi = 0, len(self._events)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._events[mid]['ts'] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return {
+            'events': [self._events[i] for i in range(lo, len(self._events))],
+            'last_seq': self._last_seq,
+            'snapshot_required': False
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get buffer statistics.
+
+        Returns:
+            Dictionary with buffer size, capacity and sequence bounds
+        """
+        return {
+            'size': len(self._events),
+            'maxlen': self.maxlen,
+            'first_seq': self.first_seq,
+            'last_seq': self._last_seq
+        }
@@ -1,7 +1,10 @@
 # /home/ubuntu/Documents/ispbx/backend/src/events.py
 
+import os
 import socketio
 import logging
+from event_history import EventHistory
+from stream import StreamHub
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -11,13 +14,31 @@ sio = socketio.AsyncServer(
     cors_allowed_origins=['http://localhost:5000', 'http://127.0.0.1:5000', '*']
 )
 
-async def broadcast_event(event_type: str, event_data: dict):
-    """Broadcast an event to all connected Socket.IO clients"""
+# Recent broadcast events, replayed to clients that reconnect
+event_history = EventHistory(
+    maxlen=int(os.getenv('EVENT_HISTORY_SIZE', '5000'))
+)
+
+# SSE and raw WebSocket consumers of the same events (see /api/stream)
+stream_hub = StreamHub()
+
+async def broadcast_event(event_type: str, event_data: dict, seq: int = None, ts: float = None):
+    """Broadcast an event to all connected Socket.IO clients
+    
+    When running as a worker behind the AMI ingester, seq and ts are assigned
+    by the ingester so every worker replays identical sequence numbers.
+    """
     
     try:
         logger.info(f"Broadcasting event: {event_type}")
         
+        # Record the event so reconnecting clients can replay it
+        seq = event_history.record(event_type, event_data, seq=seq, ts=ts)
+        
         # Emit the event to all connected clients
-        await sio.emit(event_type, {"data": event_data})
+        await sio.emit(event_type, {"data": event_data, "seq": seq})
+        
+        # Hand the event to lightweight stream consumers
+        stream_hub.publish(event_type, event_data, seq)
     except Exception as e:
-        logger.error(f"Error broadcasting event {event_type}: {e}")
\ No newline at end of file
+        logger.error(f"Error broadcasting event {event_type}: {e}")
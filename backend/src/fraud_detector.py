@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/fraud_detector.py
+
+import time
+import logging
+import numpy as np
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import datetime
+from cdr_analytics import channel_peer, is_trunk_peer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Rule name -> what is counted per key over the sliding window
+FRAUD_RULES = {
+    'calls': 'Calls started per source extension',
+    'intl_calls': 'International dial attempts per source',
+    'prefix_calls': 'International dial attempts per destination prefix, all sources',
+    'intl_seconds': 'Answered international seconds per source',
+}
+
+def dialed_number(dial_string: str) -> str:
+    """
+    Get the number out of a DialBegin DialString.
+
+    Args:
+        dial_string: Dial target after the technology, e.g. '0044207@trunk' or 'trunk/0044207'
+
+    Returns:
+        Dialed number
+    """
+    return (dial_string or '').split('/')[-1].split('@')[0]
+
+class SlidingCountMinSketch:
+    """
+    Count-min sketch over a sliding time window, in constant memory.
+
+    The window is a ring of buckets, each a depth x width counter matrix.
+    Counts go into the current bucket and into a running total; when time
+    moves past a bucket, its counts are subtracted from the total and the
+    slot is reused. An estimate is the minimum over the depth rows of the
+    total, so it never undercounts and overcounts by at most about
+    e / width of all counts in the window, with probability 1 - e^-depth.
+    Memory is buckets x depth x width counters whatever the number of keys.
+    """
+
+    def __init__(self, window: float = 900.0, buckets: int = 30,
+                 width: int = 2048, depth: int = 4):
+        """
+        Initialize the sketch.
+
+        Args:
+            window: Window length in seconds
+            buckets: Number of ring buckets the window is divided into
+            width: Counters per row
+            depth: Number of rows (hash functions)
+        """
+        self.window = window
+        self.buckets = buckets
+        self.width = width
+        self.depth = depth
+        self.bucket_seconds = window / buckets
+        self._ring = np.zeros((buckets, depth, width), dtype=np.int32)
+        self._total = np.zeros((depth, width), dtype=np.int32)
+        self._rows = np.arange(depth)
+        self._epoch: Optional[int] = None
+
+    def _columns(self, key: str) -> np.ndarray:
+        """Get the counter of the key in each row"""
+        return np.array([hash((row, key)) % self.width for row in range(self.depth)])
+
+    def _advance(self, now: float):
+        """Expire the buckets that fell out of the window"""
+        epoch = int(now // self.bucket_seconds)
+        if self._epoch is None:
+            self._epoch = epoch
+            return
+        if epoch <= self._epoch:
+            return
+        for step in range(1, min(epoch - self._epoch, self.buckets) + 1):
+            slot = (self._epoch + step) % self.buckets
+            self._total -= self._ring[slot]
+            self._ring[slot] = 0
+        self._epoch = epoch
+
+    def add(self, key: str, count: int = 1, now: Optional[float] = None) -> int:
+        """
+        Count a key.
+
+        Args:
+            key: Counted key
+            count: Amount to add
+            now: Current time in epoch seconds
+
+        Returns:
+            Estimated count of the key over the window, this one included
+        """
+        self._advance(time.time() if now is None else now)
+        columns = self._columns(key)
+        self._ring[self._epoch % self.buckets, self._rows, columns] += count
+        self._total[self._rows, columns] += count
+        return int(self._total[self._rows, columns].min())
+
+    def estimate(self, key: str, now: Optional[float] = None) -> int:
+        """
+        Estimate the count of a key over the window.
+
+        Args:
+            key: Counted key
+            now: Current time in epoch seconds
+
+        Returns:
+            Estimated count, never below the true count
+        """
+        self._advance(time.time() if now is None else now)
+        return int(self._total[self._rows, self._columns(key)].min())
+
+    def total(self) -> int:
+        """Get the sum of every count in the window"""
+        return int(self._total[0].sum())
+
+    def error_bound(self) -> int:
+        """Get the overcount an estimate stays within, with probability 1 - e^-depth"""
+        return int(np.e / self.width * self.total())
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the counters"""
+        return self._ring.nbytes + self._total.nbytes
+
+class FraudDetector:
+    """
+    Streaming toll-fraud detector fed by AMI events.
+
+    Newchannel, DialBegin and Cdr events are counted per source extension
+    and per international destination prefix in sliding-window count-min
+    sketches (see FRAUD_RULES), so memory stays constant at any event rate
+    and nothing touches MySQL. When a count crosses its threshold an alert
+    is raised, at most once per key and rule per cooldown. Thresholds can
+    be scaled down during quiet hours, when any burst of international
+    calls is suspect.
+    """
+
+    # AMI events the detector looks at
+    EVENTS = ('Newchannel', 'DialBegin', 'Cdr')
+
+    def __init__(self, thresholds: Dict[str, int], window: float = 900.0,
+                 buckets: int = 30, width: int = 2048, depth: int = 4,
+                 intl_prefixes: Tuple[str, ...] = ('00', '+'), prefix_digits: int = 4,
+                 quiet_hours: Optional[Tuple[int, int]] = None, quiet_factor: float = 1.0,
+                 cooldown: Optional[float] = None, max_alerts: int = 200, timezone=None):
+        """
+        Initialize the detector.
+
+        Args:
+            thresholds: Rule name -> count over the window that raises an alert (0 disables)
+            window: Sliding window length in seconds
+            buckets: Ring buckets per window
+            width: Count-min sketch counters per row
+            depth: Count-min sketch rows
+            intl_prefixes: Dialing prefixes that mark an international number
+            prefix_digits: Digits of the international number, after the prefix,
+                           that make up a destination prefix
+            quiet_hours: (first hour, end hour) of the quiet period, e.g. (0, 6)
+            quiet_factor: Threshold multiplier during quiet hours
+            cooldown: Seconds before the same key and rule alert again (defaults to window)
+            max_alerts: Number of recent alerts kept
+            timezone: Timezone of the quiet hours (tzinfo or None for local time)
+        """
+        unknown = set(thresholds) - set(FRAUD_RULES)
+        if unknown:
+            raise ValueError(f"Unknown fraud rules: {', '.join(sorted(unknown))}")
+        self.thresholds = {rule: thresholds.get(rule, 0) for rule in FRAUD_RULES}
+        self.window = window
+        self.intl_prefixes = tuple(sorted(intl_prefixes, key=len, reverse=True))
+        self.prefix_digits = prefix_digits
+        self.quiet_hours = quiet_hours
+        self.quiet_factor = quiet_factor
+        self.cooldown = window if cooldown is None else cooldown
+        self.timezone = timezone
+        self._sketches = {
+            rule: SlidingCountMinSketch(window, buckets, width, depth)
+            for rule, threshold in self.thresholds.items() if threshold > 0
+        }
+        self._alerted: OrderedDict = OrderedDict()
+        self._alerts = deque(maxlen=max_alerts)
+        self._observed = 0
+        self._alert_count = 0
+
+    def international(self, number: str) -> Optional[str]:
+        """
+        Get the destination prefix of an international number.
+
+        Args:
+            number: Dialed number
+
+        Returns:
+            '+' and the first prefix_digits digits after the international
+            prefix, or None for a national or internal number
+        """
+        for prefix in self.intl_prefixes:
+            if number.startswith(prefix) and len(number) > len(prefix):
+                digits = number[len(prefix):]
+                if digits.isdigit():
+                    return '+' + digits[:self.prefix_digits]
+        return None
+
+    def _quiet(self, now: float) -> bool:
+        """Whether now falls in the quiet hours"""
+        if not self.quiet_hours:
+            return False
+        first, end = self.quiet_hours
+        hour = datetime.fromtimestamp(now, self.timezone).hour
+        return first <= hour < end if first <= end else (hour >= first or hour < end)
+
+    def threshold(self, rule: str, now: Optional[float] = None) -> int:
+        """
+        Get the threshold of a rule in effect at a time.
+
+        Args:
+            rule: Rule name
+            now: Epoch seconds
+
+        Returns:
+            Threshold count, 0 when the rule is disabled
+        """
+        threshold = self.thresholds[rule]
+        if threshold and self._quiet(time.time() if now is None else now):
+            threshold = max(1, int(threshold * self.quiet_factor))
+        return threshold
+
+    def _count(self, rule: str, key: str, amount: int, now: float,
+               detail: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Count towards a rule and return an alert if it crossed its threshold"""
+        sketch = self._sketches.get(rule)
+        if sketch is None or not key:
+            return None
+        count = sketch.add(key, amount, now)
+        threshold = self.threshold(rule, now)
+        if count < threshold:
+            return None
+
+        last = self._alerted.get((rule, key))
+        if last is not None and now - last < self.cooldown:
+            return None
+        self._alerted[(rule, key)] = now
+        self._alerted.move_to_end((rule, key))
+        # Keys that alerted longer than a cooldown ago can alert again anyway
+        while self._alerted and (len(self._alerted) > 10000
+                                 or now - next(iter(self._alerted.values())) >= self.cooldown):
+            self._alerted.popitem(last=False)
+
+        alert = {
+            'rule': rule,
+            'description': FRAUD_RULES[rule],
+            'key': key,
+            'count': count,
+            'threshold': threshold,
+            'window': self.window,
+            'time': datetime.fromtimestamp(now, self.timezone).isoformat(),
+            **detail
+        }
+        self._alerts.appendleft(alert)
+        self._alert_count += 1
+        logger.warning(f"Fraud alert: {rule} for {key} reached {count} in {self.window}s (threshold {threshold})")
+        return alert
+
+    def observe(self, event_type: str, event_data: Dict[str, Any],
+                now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Count an AMI event.
+
+        Args:
+            event_type: AMI event name
+            event_data: AMI event payload
+            now: Event time in epoch seconds (defaults to now)
+
+        Returns:
+            List of alerts raised by the event
+        """
+        if event_type not in self.EVENTS:
+            return []
+        now = time.time() if now is None else now
+        self._observed += 1
+        alerts = []
+
+        if event_type == 'Newchannel':
+            # Only the first channel of a call; the legs it dials share its Linkedid
+            linkedid = event_data.get('Linkedid')
+            if linkedid and linkedid != event_data.get('Uniqueid'):
+                return alerts
+            source = channel_peer(event_data.get('Channel'))
+            if source and not is_trunk_peer(source):
+                alerts.append(self._count('calls', source, 1, now, {
+                    'source': source, 'channel': event_data.get('Channel'),
+                    'number': event_data.get('Exten')
+                }))
+
+        elif event_type == 'DialBegin':
+            number = dialed_number(event_data.get('DialString')) or event_data.get('DestExten') or ''
+            prefix = self.international(number)
+            if prefix:
+                source = channel_peer(event_data.get('Channel')) or event_data.get('CallerIDNum')
+                detail = {'source': source, 'channel': event_data.get('Channel'),
+                          'number': number, 'prefix': prefix}
+                alerts.append(self._count('intl_calls', source, 1, now, detail))
+                alerts.append(self._count('prefix_calls', prefix, 1, now, detail))
+
+        elif event_type == 'Cdr':
+            number = event_data.get('Destination') or ''
+            prefix = self.international(number)
+            if prefix and event_data.get('Disposition') == 'ANSWERED':
+                try:
+                    billsec = int(event_data.get('BillableSeconds') or 0)
+                except ValueError:
+                    billsec = 0
+                source = channel_peer(event_data.get('Channel')) or event_data.get('Source')
+                if billsec > 0:
+                    alerts.append(self._count('intl_seconds', source, billsec, now, {
+                        'source': source, 'channel': event_data.get('Channel'),
+                        'number': number, 'prefix': prefix
+                    }))
+
+        return [alert for alert in alerts if alert]
+
+    def estimates(self, key: str, now: Optional[float] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Get the current window count of a source or prefix under every rule.
+
+        Args:
+            key: Source extension or destination prefix (e.g. '+4470')
+            now: Epoch seconds
+
+        Returns:
+            Dictionary of rule name to count and threshold
+        """
+        now = time.time() if now is None else now
+        return {
+            rule: {'count': sketch.estimate(key, now), 'threshold': self.threshold(rule, now)}
+            for rule, sketch in self._sketches.items()
+        }
+
+    def alerts(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get recent alerts, newest first.
+
+        Args:
+            limit: Maximum number of alerts
+
+        Returns:
+            List of alerts
+        """
+        alerts = list(self._alerts)
+        return alerts[:limit] if limit else alerts
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get detector configuration and counters.
+
+        Returns:
+            Dictionary with thresholds in effect, window, sketch size and totals
+        """
+        now = time.time()
+        sketch = next(iter(self._sketches.values()), None)
+        return {
+            'window': self.window,
+            'thresholds': {rule: self.threshold(rule, now) for rule in FRAUD_RULES},
+            'quiet': self._quiet(now),
+            'events_observed': self._observed,
+            'alerts_raised': self._alert_count,
+            'window_totals': {rule: s.total() for rule, s in self._sketches.items()},
+            # Thresholds should sit well above these to avoid false alerts
+            'error_bounds': {rule: s.error_bound() for rule, s in self._sketches.items()},
+            'sketch': {
+                'buckets': sketch.buckets,
+                'width': sketch.width,
+                'depth': sketch.depth,
+                'bytes': sum(s.nbytes for s in self._sketches.values())
+            } if sketch else None
+        }
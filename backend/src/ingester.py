@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/ingester.py
+"""AMI ingester process.
+
+Owns the single AMI event session and publishes every event over a local
+Unix socket to the API/Socket.IO worker processes started with
+ISPBX_MODE=worker. Running the ingester separately lets uvicorn run several
+workers without opening duplicate AMI connections or emitting duplicate events.
+
+Usage:
+    python3 src/ingester.py
+    ISPBX_MODE=worker ISPBX_WORKERS=4 python3 src/main.py
+
+Socket.IO long-polling needs sticky sessions when several workers share a
+port; clients connecting over websocket (the frontend default) do not.
+"""
+
+import os
+import signal
+import asyncio
+import logging
+from client import AmiClient
+from event_bus import EventPublisher, DEFAULT_SOCKET_PATH
+from event_history import EventHistory
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+async def run_ingester():
+    """Connect to AMI and publish its events until interrupted"""
+    publisher = EventPublisher(
+        path=os.getenv('ISPBX_EVENT_SOCKET', DEFAULT_SOCKET_PATH),
+        history=EventHistory(maxlen=int(os.getenv('EVENT_HISTORY_SIZE', '5000')))
+    )
+    ami_client = AmiClient(
+        event_callback=publisher.publish,
+        host=os.getenv('ASTERISK_HOST', '127.0.0.1'),
+        port=int(os.getenv('ASTERISK_AMI_PORT', '5038')),
+        username=os.getenv('ASTERISK_AMI_USER', 'admin'),
+        password=os.getenv('ASTERISK_AMI_PASSWORD', 'admin'),
+        partitions=int(os.getenv('EVENT_PARTITIONS', '4'))
+    )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await publisher.start()
+        logger.info("Starting ingester, connecting to AMI...")
+        await ami_client.connect()
+        logger.info("AMI connection established successfully")
+        await stop.wait()
+    finally:
+        logger.info("Shutting down ingester...")
+        await ami_client.close()
+        await publisher.close()
+
+if __name__ == "__main__":
+    asyncio.run(run_ingester())
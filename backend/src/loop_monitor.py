@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/loop_monitor.py
+
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, List, Optional, Any
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the loop lag histogram buckets, in seconds
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class LoopMonitor:
+    """
+    Monitors event loop responsiveness.
+
+    A sampler task sleeps for a fixed interval and records how late it wakes
+    up into a lag histogram, along with the number of live tasks. A watchdog
+    thread keeps posting ping callbacks to the loop and times when they run;
+    once the loop has not run one for longer than the slow threshold it
+    captures the stack of the loop thread while it is still blocked, which
+    points at the offending coroutine or callback.
+    """
+
+    def __init__(self, interval: float = 0.5, slow_threshold: float = 0.25,
+                 max_slow_events: int = 50):
+        """
+        Initialize the loop monitor.
+
+        Args:
+            interval: Seconds between lag samples
+            slow_threshold: Seconds the loop may be blocked before a stack is captured
+            max_slow_events: Number of captured slow events kept for inspection
+        """
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self._bucket_counts = [0] * (len(LAG_BUCKETS) + 1)
+        self._lag_sum = 0.0
+        self._lag_count = 0
+        self._lag_max = 0.0
+        self._lag_last = 0.0
+        self._tasks = 0
+        self._slow_events = deque(maxlen=max_slow_events)
+        self._slow_total = 0
+        # Monotonic time the loop last ran a watchdog ping
+        self._pong = time.monotonic()
+        self._ping_pending = False
+        self._loop = None
+        self._loop_thread_id = None
+        self._task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+
+    async def start(self):
+        """Start the lag sampler and the watchdog thread"""
+        if self._task:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._pong = time.monotonic()
+        self._ping_pending = False
+        self._stop.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+        logger.info(f"Loop monitor started (interval={self.interval}s, slow_threshold={self.slow_threshold}s)")
+
+    async def close(self):
+        """Stop the lag sampler and the watchdog thread"""
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog:
+            self._watchdog.join(timeout=self.interval * 2)
+            self._watchdog = None
+        logger.info("Loop monitor stopped")
+
+    async def _sample(self):
+        """Measure how late the loop wakes up after each sleep"""
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._record_lag(max(0.0, now - start - self.interval))
+            self._tasks = len(asyncio.all_tasks(self._loop))
+
+    def _record_lag(self, lag: float):
+        """Add one lag sample to the histogram"""
+        self._bucket_counts[bisect_left(LAG_BUCKETS, lag)] += 1
+        self._lag_sum += lag
+        self._lag_count += 1
+        self._lag_last = lag
+        if lag > self._lag_max:
+            self._lag_max = lag
+
+    def _on_ping(self):
+        """Loop callback posted by the watchdog: record that the loop is running"""
+        self._pong = time.monotonic()
+        self._ping_pending = False
+
+    def _watch(self):
+        """Watchdog thread: capture the loop thread's stack while it is blocked"""
+        # Ping often enough that the gap since the last pong is within a
+        # tenth of the threshold of how long the loop has been stuck
+        check_every = max(self.slow_threshold / 10, 0.005)
+        reported = None
+
+        while not self._stop.wait(check_every):
+            if not self._ping_pending:
+                self._ping_pending = True
+                try:
+                    self._loop.call_soon_threadsafe(self._on_ping)
+                except RuntimeError:
+                    # Loop closed
+                    return
+                continue
+
+            pong = self._pong
+            blocked_for = time.monotonic() - pong
+            if blocked_for < self.slow_threshold or reported == pong:
+                continue
+
+            # Report each blocking episode once
+            reported = pong
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = traceback.format_stack(frame) if frame else []
+            self._slow_total += 1
+            self._slow_events.append({
+                'detected_at': time.time(),
+                'blocked_for': round(blocked_for, 4),
+                'stack': stack
+            })
+            location = stack[-1].strip().splitlines()[0] if stack else 'unknown'
+            logger.warning(f"Event loop blocked for over {self.slow_threshold}s at {location}")
+
+    def stats(self, include_stacks: bool = True) -> Dict[str, Any]:
+        """
+        Get loop monitor statistics.
+
+        Args:
+            include_stacks: Whether to include captured stacks of slow events
+
+        Returns:
+            Dictionary with lag histogram, task count and slow event details
+        """
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip(LAG_BUCKETS + (float('inf'),), self._bucket_counts):
+            cumulative += count
+            buckets['+Inf' if bound == float('inf') else str(bound)] = cumulative
+
+        slow_events = list(self._slow_events)
+        if not include_stacks:
+            slow_events = [{k: v for k, v in e.items() if k != 'stack'} for e in slow_events]
+
+        return {
+            'running': self._task is not None,
+            'lag': {
+                'last': round(self._lag_last, 6),
+                'max': round(self._lag_max, 6),
+                'avg': round(self._lag_sum / self._lag_count, 6) if self._lag_count else 0,
+                'count': self._lag_count,
+                'sum': round(self._lag_sum, 6),
+                'buckets': buckets
+            },
+            'tasks': self._tasks,
+            'slow_callbacks': {
+                'total': self._slow_total,
+                'threshold': self.slow_threshold,
+                'recent': slow_events
+            }
+        }
+
+    def prometheus(self) -> List[str]:
+        """
+        Render the statistics in Prometheus text exposition format.
+
+        Returns:
+            List of exposition lines
+        """
+        stats = self.stats(include_stacks=False)
+        lines = [
+            '# HELP ispbx_loop_lag_seconds Event loop scheduling lag',
+            '# TYPE ispbx_loop_lag_seconds histogram'
+        ]
+        for bound, count in stats['lag']['buckets'].items():
+            lines.append(f'ispbx_loop_lag_seconds_bucket{{le="{bound}"}} {count}')
+        lines += [
+            f"ispbx_loop_lag_seconds_sum {stats['lag']['sum']}",
+            f"ispbx_loop_lag_seconds_count {stats['lag']['count']}",
+            '# HELP ispbx_loop_tasks Number of live asyncio tasks',
+            '# TYPE ispbx_loop_tasks gauge',
+            f"ispbx_loop_tasks {stats['tasks']}",
+            '# HELP ispbx_loop_slow_callbacks_total Times the event loop was blocked past the threshold',
+            '# TYPE ispbx_loop_slow_callbacks_total counter',
+            f"ispbx_loop_slow_callbacks_total {stats['slow_callbacks']['total']}"
+        ]
+        return lines
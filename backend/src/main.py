@@ -1,20 +1,38 @@
 #app.py
 import os
+import io
+import asyncio
+import csv
+import json
 import socketio
 import uvicorn
-from fastapi import FastAPI, Body, Query
+from fastapi import FastAPI, Body, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from typing import Optional, List
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
+from typing import Dict, Optional, List, Any
 from fastapi import HTTPException
 import logging
 from contextlib import asynccontextmanager
 from client import AmiClient
-from events import sio, broadcast_event  # Import from events.py
+from events import sio, broadcast_event, event_history, stream_hub  # Import from events.py
+from stream import StreamFilter
+from loop_monitor import LoopMonitor
+from event_bus import EventSubscriber, DEFAULT_SOCKET_PATH
 from endpoint_manager import EndpointManager
+from endpoint_state import EndpointStateCache
 from cdr_manager import CDRManager
+from cdr_rollup import CDRRollup
+from cdr_live import LiveCDRStream
+from cdr_analytics import CDRAnalytics, ANALYTICS_SECTIONS
+from cdr_top import CDRTop
+from cdr_capacity import CapacityPlanner, MAX_TRUNK_LINES
+from cdr_archive import CDRArchive
+from cdr_search import NgramIndex
+from fraud_detector import FraudDetector
+import cdr_indexes
 from queue_manager import QueueManager
+from reload_scheduler import ReloadScheduler
 from pydantic import BaseModel
 
 # Configure logging
@@ -31,6 +49,9 @@ class EndpointCreate(BaseModel):
     codecs: List[str] = ["g722"]
     max_contacts: int = 1
 
+class EndpointBulkCreate(BaseModel):
+    endpoints: List[EndpointCreate]  # Required
+
 class EndpointUpdate(BaseModel):
     password: Optional[str] = None
     name: Optional[str] = None
@@ -74,15 +95,56 @@ class QueueMemberUpdate(BaseModel):
     paused: Optional[int] = None
     wrapuptime: Optional[int] = None
 
-# Initialize AMI client with the broadcast_event
+# Deployment mode: 'standalone' owns the AMI event session itself, 'worker'
+# receives events from the ingester process (see ingester.py) so several
+# uvicorn workers can run without duplicate AMI connections
+ISPBX_MODE = os.getenv('ISPBX_MODE', 'standalone')
+WORKER_MODE = ISPBX_MODE == 'worker'
+
+async def handle_ami_event(event_type: str, event_data: dict, seq: int = None, ts: float = None):
+    """Update local state from an AMI event, then broadcast it to clients"""
+    await broadcast_event(event_type, event_data, seq=seq, ts=ts)
+    
+    endpoint_state.observe(event_type, event_data)
+    
+    for alert in fraud_detector.observe(event_type, event_data):
+        await sio.emit('FraudAlert', {"data": alert})
+    
+    if event_type == 'Reload' and 'pjsip' in event_data.get('Module', ''):
+        # PJSIP config was reloaded, possibly after edits made outside this API
+        endpoint_manager.invalidate_cache()
+    
+    if event_type == 'Cdr':
+        # A call just finished and its CDR was written, cached CDR results are stale
+        cdr_manager.invalidate_cache()
+        
+        # Push the finished call to the CDR page. Emitted directly rather than
+        # through broadcast_event so worker sequence numbers stay in step with
+        # the ingester; replaying clients still get the raw Cdr event
+        record = cdr_live.ingest(event_data)
+        cdr_search_index.add(record)
+        cdr_top.add(record)
+        await sio.emit('NewCDR', {"data": {"record": record, "stats": cdr_live.stats()}})
+
+# Initialize AMI client with the AMI event handler
+# In worker mode the session is only used for actions, events come from the ingester
 ami_client = AmiClient(
-    event_callback=broadcast_event,
+    event_callback=None if WORKER_MODE else handle_ami_event,
     host=os.getenv('ASTERISK_HOST', '127.0.0.1'),
     port=int(os.getenv('ASTERISK_AMI_PORT', '5038')),
     username=os.getenv('ASTERISK_AMI_USER', 'admin'),
-    password=os.getenv('ASTERISK_AMI_PASSWORD', 'admin')
+    password=os.getenv('ASTERISK_AMI_PASSWORD', 'admin'),
+    events=not WORKER_MODE,
+    partitions=0 if WORKER_MODE else int(os.getenv('EVENT_PARTITIONS', '4'))
 )
 
+# Initialize event subscriber for worker mode
+event_subscriber = EventSubscriber(
+    event_callback=handle_ami_event,
+    snapshot_callback=event_history.load,
+    path=os.getenv('ISPBX_EVENT_SOCKET', DEFAULT_SOCKET_PATH)
+) if WORKER_MODE else None
+
 # Initialize endpoint manager
 endpoint_manager = EndpointManager(
     host=os.getenv('MYSQL_HOST', 'localhost'),
@@ -101,6 +163,63 @@ cdr_manager = CDRManager(
     db=os.getenv('CDR_MYSQL_DATABASE', 'asterisk')
 )
 
+# Initialize CDR rollups behind the CDR statistics
+cdr_rollup = CDRRollup(
+    cdr_manager,
+    interval=float(os.getenv('CDR_ROLLUP_INTERVAL', '60'))
+)
+
+# Initialize live CDR stream fed by AMI Cdr events
+cdr_live = LiveCDRStream(
+    per_extension=int(os.getenv('CDR_LIVE_PER_EXTENSION', '20')),
+    timezone=cdr_manager.timezone,
+    db_timezone=cdr_manager.db_timezone
+)
+
+# Initialize the columnar CDR archive for closed days (enabled by CDR_ARCHIVE_DIR)
+cdr_archive = CDRArchive(
+    cdr_manager,
+    os.getenv('CDR_ARCHIVE_DIR'),
+    interval=float(os.getenv('CDR_ARCHIVE_INTERVAL', '3600')),
+    close_after=float(os.getenv('CDR_ARCHIVE_CLOSE_AFTER', '21600')),
+    recheck_days=int(os.getenv('CDR_ARCHIVE_RECHECK_DAYS', '3'))
+) if os.getenv('CDR_ARCHIVE_DIR') else None
+
+# Initialize the n-gram index behind partial CDR searches over recent days
+cdr_search_index = NgramIndex(days=int(os.getenv('CDR_SEARCH_DAYS', '7')))
+cdr_manager.search_index = cdr_search_index
+search_index_task = None
+
+# Initialize the streaming toll-fraud detector fed by AMI events
+quiet_hours = os.getenv('FRAUD_QUIET_HOURS')  # e.g. "0-6"
+fraud_detector = FraudDetector(
+    thresholds={
+        'calls': int(os.getenv('FRAUD_MAX_CALLS', '100')),
+        'intl_calls': int(os.getenv('FRAUD_MAX_INTL_CALLS', '10')),
+        'prefix_calls': int(os.getenv('FRAUD_MAX_PREFIX_CALLS', '30')),
+        'intl_seconds': int(os.getenv('FRAUD_MAX_INTL_SECONDS', '3600'))
+    },
+    window=float(os.getenv('FRAUD_WINDOW', '900')),
+    width=int(os.getenv('FRAUD_SKETCH_WIDTH', '2048')),
+    intl_prefixes=tuple(os.getenv('FRAUD_INTL_PREFIXES', '00,+').split(',')),
+    quiet_hours=tuple(int(hour) for hour in quiet_hours.split('-')) if quiet_hours else None,
+    quiet_factor=float(os.getenv('FRAUD_QUIET_FACTOR', '0.5')),
+    timezone=cdr_manager.timezone
+)
+
+# Initialize vectorized CDR analytics
+cdr_analytics = CDRAnalytics(
+    cdr_manager,
+    default_days=int(os.getenv('CDR_ANALYTICS_DEFAULT_DAYS', '7'))
+)
+
+# Initialize top-N talkers and destinations, live for today from Cdr events
+cdr_top = CDRTop(
+    cdr_manager,
+    cdr_analytics,
+    prefix_digits=int(os.getenv('CDR_TOP_PREFIX_DIGITS', '4'))
+)
+
 # Initialize queue manager
 queue_manager = QueueManager(
     host=os.getenv('MYSQL_HOST', 'localhost'),
@@ -110,10 +229,36 @@ queue_manager = QueueManager(
     db=os.getenv('MYSQL_DATABASE', 'asterisk')
 )
 
+# Initialize live PJSIP device state and contacts, fed by AMI events
+endpoint_state = EndpointStateCache()
+
+# Initialize debounced PJSIP/queue reloads shared by the managers and routes
+reload_scheduler = ReloadScheduler(delay=float(os.getenv('RELOAD_DEBOUNCE', '0.5')))
+endpoint_manager.reload_scheduler = reload_scheduler
+queue_manager.reload_scheduler = reload_scheduler
+
+# Initialize Erlang-C/Erlang-B capacity planning from CDR and queue data
+capacity_planner = CapacityPlanner(
+    cdr_manager,
+    queue_manager,
+    cdr_analytics,
+    default_days=int(os.getenv('CAPACITY_DEFAULT_DAYS', '28')),
+    default_handle_time=float(os.getenv('CAPACITY_DEFAULT_HANDLE_TIME', '180'))
+)
+
+# Initialize event loop lag / blocking-call monitor
+loop_monitor = LoopMonitor(
+    interval=float(os.getenv('LOOP_MONITOR_INTERVAL', '0.5')),
+    slow_threshold=float(os.getenv('LOOP_SLOW_THRESHOLD', '0.25'))
+)
+
 # Define lifespan context manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global search_index_task
     try:
+        await loop_monitor.start()
+        
         logger.info("Starting application, connecting to AMI...")
         await ami_client.connect()
         logger.info("AMI connection established successfully")
@@ -128,6 +273,63 @@ async def lifespan(app: FastAPI):
         await cdr_manager.connect()
         logger.info("CDR MySQL connection established successfully")
         
+        # Probe for new CDRs only on an indexed column, never with a table scan
+        try:
+            cdr_manager.probe_column = await cdr_indexes.probe_column(cdr_manager)
+            if not cdr_manager.probe_column:
+                logger.warning("No index on cdr.end or cdr.start, CDR cache probe disabled "
+                               "(run cdr_indexes.py --create)")
+        except Exception as e:
+            logger.error(f"Failed to check CDR indexes for the cache probe: {e}")
+        
+        # Maintain CDR rollups in the background and serve stats from them. The
+        # refresher's watermark reads cdr.end, which must be indexed
+        try:
+            if cdr_manager.probe_column == 'end':
+                await cdr_rollup.start()
+                cdr_manager.rollup = cdr_rollup
+                logger.info("CDR rollups enabled")
+            else:
+                logger.warning("No index on cdr.end, CDR rollups disabled and stats will query "
+                               "the cdr table (run cdr_indexes.py --create)")
+        except Exception as e:
+            logger.error(f"CDR rollups unavailable, stats will query the cdr table: {e}")
+        
+        # Serve closed days from the archive and only recent ones from MySQL
+        if cdr_archive:
+            try:
+                await cdr_archive.start()
+                cdr_manager.archive = cdr_archive
+                logger.info(f"CDR archive enabled at {cdr_archive.path}")
+            except Exception as e:
+                logger.error(f"CDR archive unavailable, history will query the cdr table: {e}")
+        
+        # Suffix searches use the reversed number columns when they exist
+        try:
+            cdr_manager.reversed_columns = await cdr_indexes.reversed_columns(cdr_manager)
+        except Exception as e:
+            logger.error(f"Failed to check reversed CDR columns: {e}")
+        
+        # Build the search index in the background, searches use SQL until it is ready
+        search_index_task = asyncio.create_task(cdr_search_index.load(cdr_manager))
+        
+        # Seed today's live CDR counters and latest calls once
+        try:
+            await cdr_live.seed(cdr_manager)
+        except Exception as e:
+            logger.error(f"Failed to seed live CDR stream: {e}")
+        try:
+            await cdr_top.seed()
+        except Exception as e:
+            logger.error(f"Failed to seed live top-N: {e}")
+        try:
+            await endpoint_state.seed(ami_client)
+        except Exception as e:
+            logger.error(f"Failed to seed endpoint state: {e}")
+        
+        # Set AMI client in reload scheduler to enable configuration reloads
+        reload_scheduler.ami_client = ami_client
+        
         # Set AMI client in endpoint manager to enable configuration reloads
         endpoint_manager.ami_client = ami_client
         logger.info("AMI client set in endpoint manager")
@@ -136,20 +338,30 @@ async def lifespan(app: FastAPI):
         queue_manager.ami_client = ami_client
         logger.info("AMI client set in queue manager")
         
-        # Test AMI event handling
-        logger.info("Testing AMI event handling...")
-        test_event = {
-            "Event": "TestEvent",
-            "Message": "This is a test event to verify event handling"
-        }
-        await broadcast_event("TestEvent", test_event)
-        logger.info("Test event broadcast completed")
+        if event_subscriber:
+            # Events are published by the ingester process
+            logger.info(f"Running in worker mode (pid {os.getpid()}), subscribing to ingester events...")
+            await event_subscriber.start()
+        else:
+            # Test AMI event handling
+            logger.info("Testing AMI event handling...")
+            test_event = {
+                "Event": "TestEvent",
+                "Message": "This is a test event to verify event handling"
+            }
+            await broadcast_event("TestEvent", test_event)
+            logger.info("Test event broadcast completed")
         
         yield
     except Exception as e:
         logger.error(f"Error during startup: {e}")
     finally:
         try:
+            if event_subscriber:
+                await event_subscriber.close()
+            
+            await reload_scheduler.close()
+            
             logger.info("Shutting down, closing AMI connection...")
             await ami_client.close()
             logger.info("AMI connection closed successfully")
@@ -157,8 +369,16 @@ async def lifespan(app: FastAPI):
             # Close MySQL connections
             logger.info("Closing MySQL connections...")
             await endpoint_manager.close()
+            await cdr_rollup.close()
+            if search_index_task and not search_index_task.done():
+                search_index_task.cancel()
+            if cdr_archive:
+                await cdr_archive.close()
+            await cdr_manager.close()
             await queue_manager.close()
             logger.info("MySQL connections closed successfully")
+            
+            await loop_monitor.close()
         except Exception as e:
             logger.error(f"Error during shutdown: {e}")
 
@@ -181,15 +401,32 @@ app.add_middleware(
 
 # Socket.IO event handlers
 @sio.event
-async def connect(sid, environ):
+async def connect(sid, environ, auth=None):
     logger.info(f"SocketIO client connected: {sid}")
-    pass
+    
+    # Clients reconnecting after a blip send the last sequence they saw
+    if auth and auth.get('last_seq') is not None:
+        try:
+            replay = event_history.since(int(auth['last_seq']))
+            await sio.emit('EventReplay', replay, to=sid)
+            logger.info(f"Replayed {len(replay['events'])} events to {sid}, snapshot_required={replay['snapshot_required']}")
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid last_seq from {sid}: {auth.get('last_seq')}")
 
 @sio.event
 async def disconnect(sid):
     logger.info(f"SocketIO client disconnected: {sid}")
     pass
 
+@sio.event
+async def replay(sid, data):
+    """Return every event broadcast after the sequence number the client last saw"""
+    try:
+        since = int((data or {}).get('since', 0))
+    except (TypeError, ValueError):
+        return {"error": "Invalid sequence number"}
+    return event_history.since(since)
+
 # API root endpoint
 
 # Mount Socket.IO on the FastAPI app
@@ -204,11 +441,47 @@ async def root():
 
 @app.get("/api")
 async def api_root():
-    return {
+    response = {
         "message": "ISPBX Manager API",
         "status": "healthy",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "mode": ISPBX_MODE
     }
+    if event_subscriber:
+        response["ingester_connected"] = event_subscriber.connected
+    return response
+
+@app.get("/api/endpoints/view")
+async def get_endpoints_view(
+    search: Optional[str] = Query(None, description="Substring of the extension or name"),
+    state: Optional[str] = Query(None, description="Comma-separated device states (NOT_INUSE, INUSE, UNAVAILABLE, ...)"),
+    context: Optional[str] = Query(None, description="Dialplan context"),
+    registered: Optional[bool] = Query(None, description="Only endpoints with (true) or without (false) contacts"),
+    sort: str = Query("endpoint_id", description="Sort field"),
+    order: str = Query("asc", description="Sort order (asc or desc)"),
+    offset: int = Query(0, ge=0, description="Rows to skip"),
+    limit: int = Query(100, ge=1, le=1000, description="Rows to return")
+):
+    """Get endpoint config joined with live state and contacts, from memory"""
+    try:
+        endpoints = await endpoint_manager.list_endpoints()
+        view = endpoint_state.view(
+            endpoints,
+            search=search,
+            states=[s for s in state.split(',') if s] if state else None,
+            context=context,
+            registered=registered,
+            sort=sort,
+            order=order,
+            offset=offset,
+            limit=limit
+        )
+        return {"status": "success", **view}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error building endpoint view: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get endpoint view")
 
 @app.get("/api/endpoints")
 @app.get("/api/endpoints/{extension}")
@@ -239,18 +512,206 @@ async def get_pjsip_details(extension: Optional[str] = None):
         logger.error(f"Error getting PJSIP details: {e}")
         raise HTTPException(status_code=500, detail="Failed to get endpoint details")
 
+@app.get("/api/debug/loop")
+async def get_loop_debug(stacks: bool = Query(True, description="Include stacks of slow callbacks")):
+    """Get event loop lag histogram, task count and recent blocking calls"""
+    return {"status": "success", "loop": loop_monitor.stats(include_stacks=stacks)}
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Expose backend metrics in Prometheus text format"""
+    lines = loop_monitor.prometheus()
+    
+    history = event_history.stats()
+    lines += [
+        '# HELP ispbx_event_history_size Events held in the replay buffer',
+        '# TYPE ispbx_event_history_size gauge',
+        f"ispbx_event_history_size {history['size']}",
+        '# HELP ispbx_events_broadcast_total Events broadcast since startup',
+        '# TYPE ispbx_events_broadcast_total counter',
+        f"ispbx_events_broadcast_total {history['last_seq']}",
+        '# HELP ispbx_stream_subscribers Connected SSE/WebSocket stream consumers',
+        '# TYPE ispbx_stream_subscribers gauge',
+        f"ispbx_stream_subscribers {stream_hub.stats()['subscribers']}"
+    ]
+    
+    cache = cdr_manager.cache.stats()
+    lines += [
+        '# HELP ispbx_cdr_cache_lookups_total CDR query cache lookups by result',
+        '# TYPE ispbx_cdr_cache_lookups_total counter',
+        f'ispbx_cdr_cache_lookups_total{{result="hit"}} {cache["hits"]}',
+        f'ispbx_cdr_cache_lookups_total{{result="miss"}} {cache["misses"]}',
+        '# HELP ispbx_cdr_cache_evictions_total CDR query cache LRU evictions',
+        '# TYPE ispbx_cdr_cache_evictions_total counter',
+        f'ispbx_cdr_cache_evictions_total {cache["evictions"]}',
+        '# HELP ispbx_cdr_cache_size CDR query cache entries',
+        '# TYPE ispbx_cdr_cache_size gauge',
+        f'ispbx_cdr_cache_size {cache["size"]}'
+    ]
+    
+    fraud = fraud_detector.stats()
+    lines += [
+        '# HELP ispbx_fraud_alerts_total Toll-fraud alerts raised since startup',
+        '# TYPE ispbx_fraud_alerts_total counter',
+        f"ispbx_fraud_alerts_total {fraud['alerts_raised']}"
+    ]
+    
+    if ami_client.dispatcher:
+        lines += [
+            '# HELP ispbx_dispatcher_queue_depth Pending events per dispatcher partition',
+            '# TYPE ispbx_dispatcher_queue_depth gauge'
+        ]
+        for index, depth in enumerate(ami_client.dispatcher.stats()['queue_depths']):
+            lines.append(f'ispbx_dispatcher_queue_depth{{partition="{index}"}} {depth}')
+    
+    return "\n".join(lines) + "\n"
+
+@app.get("/api/events/history")
+async def get_event_history(
+    since: Optional[int] = Query(None, description="Return events after this sequence number"),
+    since_time: Optional[float] = Query(None, description="Return events at or after this UNIX timestamp")
+):
+    """Get recently broadcast events for clients catching up after a reconnect"""
+    if since is not None:
+        return {"status": "success", **event_history.since(since)}
+    
+    if since_time is not None:
+        return {"status": "success", **event_history.since_time(since_time)}
+    
+    return {"status": "success", "history": event_history.stats()}
+
+@app.get("/api/events/dispatcher")
+async def get_event_dispatcher_stats():
+    """Get per-partition queue depths of the AMI event dispatcher"""
+    if not ami_client.dispatcher:
+        return {"status": "success", "dispatcher": None}
+    return {"status": "success", "dispatcher": ami_client.dispatcher.stats()}
+
+@app.get("/api/reloads")
+async def get_reload_stats():
+    """Get requested vs. sent PJSIP and queue reloads"""
+    return {"status": "success", "reloads": reload_scheduler.stats()}
+
+# Seconds between keepalives on idle event streams
+STREAM_KEEPALIVE = 15
+
+# Keepalive message of the WebSocket and NDJSON streams, shaped like any other event
+STREAM_KEEPALIVE_MESSAGE = stream_hub.serialize('Keepalive', {}, None)
+
+@app.get("/api/stream")
+async def stream_events_sse(
+    request: Request,
+    events: Optional[str] = Query(None, description="Comma-separated event types"),
+    extension: Optional[str] = Query(None, description="Comma-separated extensions"),
+    queue: Optional[str] = Query(None, description="Comma-separated queue names"),
+    format: str = Query("sse", description="Stream format (sse or ndjson)")
+):
+    """Stream broadcast events as Server-Sent Events or NDJSON
+
+    SSE clients resuming with a Last-Event-ID that is no longer replayable get
+    a snapshot_required event first. Idle NDJSON streams receive a Keepalive
+    event (seq null) every STREAM_KEEPALIVE seconds.
+    """
+    stream_filter = StreamFilter.from_query(events, extension, queue)
+    subscriber = stream_hub.subscribe(stream_filter)
+    
+    # SSE clients resume from the last event id they received
+    last_event_id = request.headers.get('last-event-id')
+    backlog = []
+    snapshot_required = None
+    resume_seq = None
+    if format == "sse" and last_event_id and last_event_id.isdigit():
+        replay = event_history.since(int(last_event_id))
+        if replay['snapshot_required']:
+            # Events after the id were evicted or the sequence was reset
+            snapshot_required = json.dumps({'last_seq': replay['last_seq']})
+            resume_seq = replay['last_seq']
+            logger.info(f"SSE resume from {last_event_id} needs a snapshot, last_seq={replay['last_seq']}")
+        backlog = [
+            (entry['seq'], stream_hub.serialize(entry['event'], entry['data'], entry['seq']))
+            for entry in replay['events']
+            if stream_filter.matches(entry['event'], entry['data'])
+        ]
+    
+    async def generate():
+        try:
+            if snapshot_required:
+                # Tell the client to reload state instead of carrying on with a gap
+                yield f"id: {resume_seq}\nevent: snapshot_required\ndata: {snapshot_required}\n\n"
+            for seq, line in backlog:
+                yield f"id: {seq}\ndata: {line}\n\n"
+            while not await request.is_disconnected():
+                item = await subscriber.get(timeout=STREAM_KEEPALIVE)
+                if format == "ndjson":
+                    # Keepalive events keep idle connections alive, one JSON object per line
+                    yield (item[1] if item else STREAM_KEEPALIVE_MESSAGE) + "\n"
+                elif item is None:
+                    yield ": keepalive\n\n"
+                else:
+                    seq, line = item
+                    yield f"id: {seq}\ndata: {line}\n\n"
+        finally:
+            stream_hub.unsubscribe(subscriber)
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    return StreamingResponse(generate(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/api/stream")
+async def stream_events_ws(
+    websocket: WebSocket,
+    events: Optional[str] = None,
+    extension: Optional[str] = None,
+    queue: Optional[str] = None
+):
+    """Stream broadcast events over a plain WebSocket, one JSON object per message
+
+    Idle connections receive a Keepalive event (seq null) every STREAM_KEEPALIVE seconds.
+    """
+    await websocket.accept()
+    subscriber = stream_hub.subscribe(StreamFilter.from_query(events, extension, queue))
+    try:
+        while True:
+            item = await subscriber.get(timeout=STREAM_KEEPALIVE)
+            if item is None:
+                # Keep idle connections alive through proxies
+                await websocket.send_text(STREAM_KEEPALIVE_MESSAGE)
+                continue
+            await websocket.send_text(item[1])
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stream_hub.unsubscribe(subscriber)
+
+async def wait_for_reload(module: str, target: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Wait for a batched Asterisk reload and fail the request if it was not sent.
+
+    Args:
+        module: res_pjsip or app_queue
+        target: Queue name for app_queue
+
+    Returns:
+        Reload result from the scheduler
+
+    Raises:
+        HTTPException: 502 if the reload failed; the database change is kept
+    """
+    result = await reload_scheduler.reload(module, target)
+    if not result['success']:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Change saved but the {module} reload failed: {result['error']}"
+        )
+    return result
+
 # Endpoint Management API Routes
 @app.post("/api/endpoints", status_code=201)
 async def create_endpoint(endpoint: EndpointCreate):
     """Create a new SIP endpoint"""
     try:
-        # Check if endpoint already exists
         logger.info(f"Creating endpoint {endpoint.endpoint_id}, payload={endpoint}")
-        existing = await endpoint_manager.get_endpoint(endpoint.endpoint_id)
-        if existing:
-            raise HTTPException(status_code=409, detail=f"Endpoint {endpoint.endpoint_id} already exists")
         
-        # Create the endpoint
+        # Create the endpoint, an existing one is reported by the insert
         success = await endpoint_manager.create_endpoint(
             endpoint_id=endpoint.endpoint_id,
             password=endpoint.password,
@@ -261,20 +722,54 @@ async def create_endpoint(endpoint: EndpointCreate):
             max_contacts=endpoint.max_contacts
         )
         
+        if success is None:
+            raise HTTPException(status_code=409, detail=f"Endpoint {endpoint.endpoint_id} already exists")
         if not success:
             raise HTTPException(status_code=500, detail="Failed to create endpoint")
         
-        # Reload Asterisk to apply changes
-        await ami_client.manager.send_action({'Action': 'PJSIPReload'})
+        # Reload Asterisk to apply changes, coalesced with concurrent edits
+        reload = await wait_for_reload('res_pjsip')
         
         logger.info(f"Created endpoint {endpoint.endpoint_id}")
-        return {"status": "success", "message": f"Endpoint {endpoint.endpoint_id} created successfully"}
+        return {"status": "success", "message": f"Endpoint {endpoint.endpoint_id} created successfully",
+                "reload": reload}
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error creating endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to create endpoint: {str(e)}")
 
+@app.post("/api/endpoints/bulk")
+async def create_endpoints_bulk(request: EndpointBulkCreate):
+    """Create many SIP endpoints in one transaction with a single PJSIP reload"""
+    max_bulk = int(os.getenv('ENDPOINT_BULK_MAX', '1000'))
+    if not request.endpoints:
+        raise HTTPException(status_code=400, detail="No endpoints given")
+    if len(request.endpoints) > max_bulk:
+        raise HTTPException(status_code=400, detail=f"At most {max_bulk} endpoints per request")
+    
+    try:
+        logger.info(f"Creating {len(request.endpoints)} endpoints in bulk")
+        results = await endpoint_manager.create_endpoints([e.dict() for e in request.endpoints])
+        created = sum(1 for r in results if r['status'] == 'created')
+        
+        # One reload for the whole batch
+        reload = await wait_for_reload('res_pjsip') if created else None
+        
+        logger.info(f"Created {created} of {len(results)} endpoints in bulk")
+        return {
+            "status": "success" if created == len(results) else "partial",
+            "created": created,
+            "failed": len(results) - created,
+            "results": results,
+            "reload": reload
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating endpoints in bulk: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to create endpoints: {str(e)}")
+
 @app.get("/api/endpoints/db")
 async def list_db_endpoints():
     """List all endpoints from the database"""
@@ -285,6 +780,11 @@ async def list_db_endpoints():
         logger.error(f"Error listing endpoints: {e}")
         raise HTTPException(status_code=500, detail="Failed to list endpoints")
 
+@app.get("/api/endpoints/db/cache")
+async def get_endpoint_cache_stats():
+    """Get endpoint config cache counters"""
+    return {"status": "success", "cache": endpoint_manager.cache.stats()}
+
 @app.get("/api/endpoints/db/{endpoint_id}")
 async def get_db_endpoint(endpoint_id: str):
     """Get details for a specific endpoint from the database"""
@@ -301,14 +801,10 @@ async def get_db_endpoint(endpoint_id: str):
         raise HTTPException(status_code=500, detail="Failed to get endpoint details")
 
 @app.put("/api/endpoints/{endpoint_id}")
-async def update_endpoint(endpoint_id: str, updates: EndpointUpdate):
+async def update_endpoint(endpoint_id: str, updates: EndpointUpdate,
+                          wait: bool = Query(False, description="Wait until the PJSIP reload has been sent")):
     """Update an existing SIP endpoint"""
     try:
-        # Check if endpoint exists
-        existing = await endpoint_manager.get_endpoint(endpoint_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail=f"Endpoint {endpoint_id} not found")
-        
         # Convert Pydantic model to dict, excluding None values
         updates_dict = {k: v for k, v in updates.dict().items() if v is not None}
         
@@ -318,14 +814,17 @@ async def update_endpoint(endpoint_id: str, updates: EndpointUpdate):
         # Update the endpoint
         success = await endpoint_manager.update_endpoint(endpoint_id, updates_dict)
         
+        if success is None:
+            raise HTTPException(status_code=404, detail=f"Endpoint {endpoint_id} not found")
         if not success:
             raise HTTPException(status_code=500, detail="Failed to update endpoint")
         
-        # Reload Asterisk to apply changes
-        await ami_client.manager.send_action({'Action': 'PJSIPReload'})
+        # The manager queued a reload; joining its batch sends no extra one
+        reload = await wait_for_reload('res_pjsip') if wait else None
         
         logger.info(f"Updated endpoint {endpoint_id}")
-        return {"status": "success", "message": f"Endpoint {endpoint_id} updated successfully"}
+        return {"status": "success", "message": f"Endpoint {endpoint_id} updated successfully",
+                "reload": reload}
     except HTTPException:
         raise
     except Exception as e:
@@ -333,25 +832,24 @@ async def update_endpoint(endpoint_id: str, updates: EndpointUpdate):
         raise HTTPException(status_code=500, detail=f"Failed to update endpoint: {str(e)}")
 
 @app.delete("/api/endpoints/{endpoint_id}")
-async def delete_endpoint(endpoint_id: str):
+async def delete_endpoint(endpoint_id: str,
+                          wait: bool = Query(False, description="Wait until the PJSIP reload has been sent")):
     """Delete a SIP endpoint"""
     try:
-        # Check if endpoint exists
-        existing = await endpoint_manager.get_endpoint(endpoint_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail=f"Endpoint {endpoint_id} not found")
-        
         # Delete the endpoint
         success = await endpoint_manager.delete_endpoint(endpoint_id)
         
+        if success is None:
+            raise HTTPException(status_code=404, detail=f"Endpoint {endpoint_id} not found")
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete endpoint")
         
-        # Reload Asterisk to apply changes
-        await ami_client.manager.send_action({'Action': 'PJSIPReload'})
+        # The manager queued a reload; joining its batch sends no extra one
+        reload = await wait_for_reload('res_pjsip') if wait else None
         
         logger.info(f"Deleted endpoint {endpoint_id}")
-        return {"status": "success", "message": f"Endpoint {endpoint_id} deleted successfully"}
+        return {"status": "success", "message": f"Endpoint {endpoint_id} deleted successfully",
+                "reload": reload}
     except HTTPException:
         raise
     except Exception as e:
@@ -365,12 +863,7 @@ async def create_queue(queue: QueueCreate):
     try:
         logger.info(f"Creating queue {queue.queue_name}, payload={queue}")
         
-        # Check if queue already exists
-        existing = await queue_manager.get_queue(queue.queue_name)
-        if existing:
-            raise HTTPException(status_code=409, detail=f"Queue {queue.queue_name} already exists")
-        
-        # Create queue
+        # Create queue, an existing one is reported by the insert
         success = await queue_manager.create_queue(
             queue_name=queue.queue_name,
             strategy=queue.strategy,
@@ -383,16 +876,22 @@ async def create_queue(queue: QueueCreate):
             wrapuptime=queue.wrapuptime
         )
         
+        if success is None:
+            raise HTTPException(status_code=409, detail=f"Queue {queue.queue_name} already exists")
         if not success:
             raise HTTPException(status_code=500, detail="Failed to create queue")
         
+        # Wait for the reload the manager requested, so the queue is live
+        reload = await wait_for_reload('app_queue', queue.queue_name)
+        
         # Get the created queue
         created_queue = await queue_manager.get_queue(queue.queue_name)
         
         return {
             "status": "success",
             "message": f"Queue {queue.queue_name} created successfully",
-            "queue": created_queue
+            "queue": created_queue,
+            "reload": reload
         }
     except HTTPException:
         raise
@@ -435,11 +934,6 @@ async def get_queue(queue_name: str):
 async def update_queue(queue_name: str, updates: QueueUpdate):
     """Update an existing queue"""
     try:
-        # Check if queue exists
-        existing = await queue_manager.get_queue(queue_name)
-        if not existing:
-            raise HTTPException(status_code=404, detail=f"Queue {queue_name} not found")
-        
         # Convert Pydantic model to dict, excluding None values
         update_data = {k: v for k, v in updates.dict().items() if v is not None}
         
@@ -452,6 +946,8 @@ async def update_queue(queue_name: str, updates: QueueUpdate):
         # Update queue
         success = await queue_manager.update_queue(queue_name, update_data)
         
+        if success is None:
+            raise HTTPException(status_code=404, detail=f"Queue {queue_name} not found")
         if not success:
             raise HTTPException(status_code=500, detail="Failed to update queue")
         
@@ -473,14 +969,11 @@ async def update_queue(queue_name: str, updates: QueueUpdate):
 async def delete_queue(queue_name: str):
     """Delete a queue"""
     try:
-        # Check if queue exists
-        existing = await queue_manager.get_queue(queue_name)
-        if not existing:
-            raise HTTPException(status_code=404, detail=f"Queue {queue_name} not found")
-        
         # Delete queue
         success = await queue_manager.delete_queue(queue_name)
         
+        if success is None:
+            raise HTTPException(status_code=404, detail=f"Queue {queue_name} not found")
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete queue")
         
@@ -498,11 +991,6 @@ async def delete_queue(queue_name: str):
 async def add_queue_member(queue_name: str, member: QueueMemberAdd):
     """Add a member to a queue"""
     try:
-        # Check if queue exists
-        existing = await queue_manager.get_queue(queue_name)
-        if not existing:
-            raise HTTPException(status_code=404, detail=f"Queue {queue_name} not found")
-        
         # Add member to queue
         success = await queue_manager.add_queue_member(
             queue_name=queue_name,
@@ -513,6 +1001,11 @@ async def add_queue_member(queue_name: str, member: QueueMemberAdd):
             wrapuptime=member.wrapuptime
         )
         
+        if success is None:
+            # Only a failed insert needs to tell a missing queue from a duplicate member
+            if not await queue_manager.get_queue(queue_name):
+                raise HTTPException(status_code=404, detail=f"Queue {queue_name} not found")
+            raise HTTPException(status_code=409, detail=f"Member {member.interface} already in queue {queue_name}")
         if not success:
             raise HTTPException(status_code=500, detail="Failed to add member to queue")
         
@@ -573,8 +1066,10 @@ async def update_queue_member(queue_name: str, interface: str, updates: QueueMem
         logger.debug(f"Updating member {interface} in queue {queue_name} with updates: {update_data}")
         success = await queue_manager.update_queue_member(queue_name, interface, update_data)
         
-        if not success:
+        if success is None:
             raise HTTPException(status_code=404, detail=f"Member {interface} not found in queue {queue_name}")
+        if not success:
+            raise HTTPException(status_code=500, detail="Failed to update queue member")
         
         # Get updated queue members
         members = await queue_manager.list_queue_members(queue_name)
@@ -603,8 +1098,10 @@ async def remove_queue_member(queue_name: str, interface: str):
         logger.info(f"Removing member {interface} from queue {queue_name}")
         success = await queue_manager.remove_queue_member(queue_name, interface)
         
-        if not success:
+        if success is None:
             raise HTTPException(status_code=404, detail=f"Member {interface} not found in queue {queue_name}")
+        if not success:
+            raise HTTPException(status_code=500, detail="Failed to remove queue member")
         
         return {
             "status": "success",
@@ -616,6 +1113,32 @@ async def remove_queue_member(queue_name: str, interface: str):
         logger.error(f"Error removing member {interface} from queue {queue_name}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to remove queue member: {str(e)}")
 
+@app.get("/api/queues/capacity")
+async def get_queue_capacity(
+    start_date: Optional[str] = Query(None, description="Start of the history (YYYY-MM-DD), defaults to the last 28 days"),
+    end_date: Optional[str] = Query(None, description="End of the history, inclusive (YYYY-MM-DD)"),
+    target: float = Query(80.0, description="Service level target in percent"),
+    blocking: float = Query(1.0, description="Trunk blocking target in percent"),
+    lines: Optional[int] = Query(None, ge=0, le=MAX_TRUNK_LINES, description="Installed trunk lines, to report their blocking"),
+    weekdays: bool = Query(False, description="Only use Monday to Friday traffic")
+):
+    """Get required agents per queue and hour (Erlang-C) and trunk lines per hour (Erlang-B)"""
+    try:
+        plan = await capacity_planner.plan(
+            start_date=start_date,
+            end_date=end_date,
+            target=target,
+            blocking=blocking,
+            lines=lines,
+            weekdays=weekdays
+        )
+        return {"status": "success", "capacity": plan}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid parameter: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error computing queue capacity: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute queue capacity: {str(e)}")
+
 @app.get("/api/queues/status")
 @app.get("/api/queues/{queue_name}/status")
 async def get_queue_status(queue_name: Optional[str] = None):
@@ -631,18 +1154,42 @@ async def get_queue_status(queue_name: Optional[str] = None):
         logger.error(f"Error getting queue status: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get queue status: {str(e)}")
 
+# Fraud detection API Routes
+@app.get("/api/fraud/alerts")
+async def get_fraud_alerts(limit: Optional[int] = Query(None, description="Maximum number of alerts")):
+    """Get recent toll-fraud alerts, newest first"""
+    alerts = fraud_detector.alerts(limit)
+    return {"status": "success", "count": len(alerts), "alerts": alerts}
+
+@app.get("/api/fraud/stats")
+async def get_fraud_stats():
+    """Get fraud detector thresholds, window totals and sketch size"""
+    return {"status": "success", "fraud": fraud_detector.stats()}
+
+@app.get("/api/fraud/counts/{key}")
+async def get_fraud_counts(key: str):
+    """Get the current window counts of a source extension or destination prefix (e.g. +4470)"""
+    return {"status": "success", "key": key, "counts": fraud_detector.estimates(key)}
+
 # CDR API Routes
 @app.get("/api/cdr")
 async def get_cdr_records(
-    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD or ISO datetime)"),
+    end_date: Optional[str] = Query(None, description="End date, inclusive (YYYY-MM-DD or ISO datetime)"),
     src: Optional[str] = Query(None, description="Source extension"),
     dst: Optional[str] = Query(None, description="Destination extension"),
     disposition: Optional[str] = Query(None, description="Call disposition (ANSWERED, NO ANSWER, BUSY, FAILED)"),
     limit: int = Query(100, description="Maximum number of records to return"),
-    offset: int = Query(0, description="Number of records to skip")
+    offset: int = Query(0, description="Number of records to skip (offset pagination)"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor (keyset pagination)"),
+    search: Optional[str] = Query(None, description="Partial number or caller ID to look for"),
+    search_field: str = Query("src", description="Field to search: src, dst or clid"),
+    search_mode: str = Query("contains", description="Match mode: prefix, suffix or contains")
 ):
-    """Get CDR records with optional filtering"""
+    """Get CDR records with optional filtering and partial number/caller ID search"""
+    if cursor and offset:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset, not both")
+    
     try:
         logger.info(f"Fetching CDR records with filters: start_date={start_date}, end_date={end_date}, src={src}, dst={dst}, disposition={disposition}")
         records = await cdr_manager.get_cdr_records(
@@ -652,38 +1199,362 @@ async def get_cdr_records(
             dst=dst,
             disposition=disposition,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor,
+            search=search,
+            search_field=search_field,
+            search_mode=search_mode
         )
         
+        # A full page means there may be more, hand out the position of its last record
+        next_cursor = cdr_manager.encode_cursor(records[-1]) if records and len(records) == limit else None
+        
         return {
             "status": "success",
             "count": len(records),
-            "records": records
+            "records": records,
+            "next_cursor": next_cursor
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {str(e)}")
     except Exception as e:
         logger.error(f"Error fetching CDR records: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch CDR records: {str(e)}")
 
+@app.get("/api/cdr/sessions")
+async def get_cdr_sessions(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD or ISO datetime)"),
+    end_date: Optional[str] = Query(None, description="End date, inclusive (YYYY-MM-DD or ISO datetime)"),
+    src: Optional[str] = Query(None, description="Source extension"),
+    dst: Optional[str] = Query(None, description="Destination extension"),
+    disposition: Optional[str] = Query(None, description="Call disposition (ANSWERED, NO ANSWER, BUSY, FAILED)"),
+    limit: int = Query(50, description="Maximum number of sessions to return"),
+    offset: int = Query(0, description="Number of sessions to skip (offset pagination)"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor (keyset pagination)"),
+    search: Optional[str] = Query(None, description="Partial number or caller ID to look for"),
+    search_field: str = Query("src", description="Field to search: src, dst or clid"),
+    search_mode: str = Query("contains", description="Match mode: prefix, suffix or contains")
+):
+    """Get calls with their CDR legs grouped by linkedid, total talk time and final disposition"""
+    if cursor and offset:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset, not both")
+    
+    try:
+        sessions = await cdr_manager.get_cdr_sessions(
+            start_date=start_date,
+            end_date=end_date,
+            src=src,
+            dst=dst,
+            disposition=disposition,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            search=search,
+            search_field=search_field,
+            search_mode=search_mode
+        )
+        
+        next_cursor = cdr_manager.session_cursor(sessions[-1]) if sessions and len(sessions) == limit else None
+        
+        return {
+            "status": "success",
+            "count": len(sessions),
+            "sessions": sessions,
+            "next_cursor": next_cursor
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error fetching CDR sessions: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch CDR sessions: {str(e)}")
+
+@app.get("/api/cdr/export")
+async def export_cdr_records(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD or ISO datetime)"),
+    end_date: Optional[str] = Query(None, description="End date, inclusive (YYYY-MM-DD or ISO datetime)"),
+    src: Optional[str] = Query(None, description="Source extension"),
+    dst: Optional[str] = Query(None, description="Destination extension"),
+    disposition: Optional[str] = Query(None, description="Call disposition (ANSWERED, NO ANSWER, BUSY, FAILED)"),
+    format: str = Query("csv", description="Export format (csv or ndjson)"),
+    search: Optional[str] = Query(None, description="Partial number or caller ID to look for"),
+    search_field: str = Query("src", description="Field to search: src, dst or clid"),
+    search_mode: str = Query("contains", description="Match mode: prefix, suffix or contains")
+):
+    """Stream CDR records as CSV or NDJSON without buffering the result set"""
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Format must be csv or ndjson")
+    
+    try:
+        # Validate filters before the response starts streaming
+        cdr_manager.build_filters(
+            start_date=start_date,
+            end_date=end_date,
+            search=search,
+            search_field=search_field,
+            search_mode=search_mode
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {str(e)}")
+    
+    logger.info(f"Exporting CDR records as {format} with filters: start_date={start_date}, end_date={end_date}, src={src}, dst={dst}, disposition={disposition}")
+    chunks = cdr_manager.stream_cdr_records(
+        start_date=start_date,
+        end_date=end_date,
+        src=src,
+        dst=dst,
+        disposition=disposition,
+        search=search,
+        search_field=search_field,
+        search_mode=search_mode
+    )
+    
+    async def generate_csv():
+        header_written = False
+        try:
+            async for columns, rows in chunks:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                if not header_written:
+                    writer.writerow(columns)
+                    header_written = True
+                writer.writerows(rows)
+                yield buffer.getvalue()
+        finally:
+            # Release the database connection as soon as the client goes away
+            await chunks.aclose()
+    
+    async def generate_ndjson():
+        try:
+            async for columns, rows in chunks:
+                yield "".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows)
+        finally:
+            await chunks.aclose()
+    
+    filename = f"cdr_{start_date or 'all'}_{end_date or 'now'}.{format}"
+    return StreamingResponse(
+        generate_csv() if format == "csv" else generate_ndjson(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.get("/api/cdr/stats")
-async def get_cdr_stats():
+async def get_cdr_stats(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD or ISO datetime)"),
+    end_date: Optional[str] = Query(None, description="End date, inclusive (YYYY-MM-DD or ISO datetime)")
+):
     """Get CDR statistics"""
     try:
-        logger.info("Fetching CDR statistics")
-        stats = await cdr_manager.get_cdr_stats()
+        logger.info(f"Fetching CDR statistics: start_date={start_date}, end_date={end_date}")
+        stats = await cdr_manager.get_cdr_stats(start_date=start_date, end_date=end_date)
         
         return {
             "status": "success",
             "stats": stats
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {str(e)}")
     except Exception as e:
         logger.error(f"Error fetching CDR statistics: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch CDR statistics: {str(e)}")
 
+@app.get("/api/cdr/analytics")
+async def get_cdr_analytics(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD or ISO datetime), defaults to the last 7 days"),
+    end_date: Optional[str] = Query(None, description="End date, inclusive (YYYY-MM-DD or ISO datetime)"),
+    src: Optional[str] = Query(None, description="Source extension"),
+    dst: Optional[str] = Query(None, description="Destination extension"),
+    disposition: Optional[str] = Query(None, description="Call disposition"),
+    sections: str = Query("summary,busy_hour", description=f"Comma separated sections: {', '.join(ANALYTICS_SECTIONS)}"),
+    limit: int = Query(20, description="Maximum number of extensions or trunks")
+):
+    """Get CDR analytics: ASR, ACD, busy hour, per-extension and per-trunk KPIs, histograms"""
+    requested = tuple(s.strip() for s in sections.split(',') if s.strip())
+    unknown = [s for s in requested if s not in ANALYTICS_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown analytics sections: {', '.join(unknown)}")
+    
+    try:
+        analytics = await cdr_analytics.report(
+            start_date=start_date,
+            end_date=end_date,
+            src=src,
+            dst=dst,
+            disposition=disposition,
+            sections=requested,
+            limit=limit
+        )
+        return {"status": "success", "analytics": analytics}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error computing CDR analytics: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute CDR analytics: {str(e)}")
+
+@app.get("/api/cdr/analytics/{section}")
+async def get_cdr_analytics_section(
+    section: str,
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD or ISO datetime), defaults to the last 7 days"),
+    end_date: Optional[str] = Query(None, description="End date, inclusive (YYYY-MM-DD or ISO datetime)"),
+    src: Optional[str] = Query(None, description="Source extension"),
+    dst: Optional[str] = Query(None, description="Destination extension"),
+    disposition: Optional[str] = Query(None, description="Call disposition"),
+    limit: int = Query(20, description="Maximum number of extensions or trunks")
+):
+    """Get a single CDR analytics section"""
+    return await get_cdr_analytics(
+        start_date=start_date,
+        end_date=end_date,
+        src=src,
+        dst=dst,
+        disposition=disposition,
+        sections=section,
+        limit=limit
+    )
+
+@app.get("/api/cdr/concurrency")
+async def get_cdr_concurrency(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD or ISO datetime), defaults to the last 7 days"),
+    end_date: Optional[str] = Query(None, description="End date, inclusive (YYYY-MM-DD or ISO datetime), defaults to now"),
+    bucket: str = Query("hour", description="Bucket size: minute, hour, day or seconds"),
+    trunk: Optional[str] = Query(None, description="Only calls over this trunk"),
+    src: Optional[str] = Query(None, description="Source extension"),
+    dst: Optional[str] = Query(None, description="Destination extension")
+):
+    """Get the concurrent calls timeline: peak, percentiles and per-bucket peak/average"""
+    try:
+        timeline = await cdr_analytics.concurrency(
+            start_date=start_date,
+            end_date=end_date,
+            bucket=bucket,
+            trunk=trunk,
+            src=src,
+            dst=dst
+        )
+        return {"status": "success", "concurrency": timeline}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid parameter: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error computing CDR concurrency: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute CDR concurrency: {str(e)}")
+
+@app.get("/api/cdr/top")
+async def get_cdr_top(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD or ISO datetime), defaults to the last 7 days"),
+    end_date: Optional[str] = Query(None, description="End date, inclusive (YYYY-MM-DD or ISO datetime)"),
+    limit: int = Query(20, description="Number of entries per list"),
+    prefix_digits: Optional[int] = Query(None, description="Leading digits that make up a destination prefix")
+):
+    """Get the top extensions by minutes and by calls, and the top destination prefixes"""
+    try:
+        top = await cdr_top.top(
+            start_date=start_date,
+            end_date=end_date,
+            limit=limit,
+            prefix_digits=prefix_digits
+        )
+        return {"status": "success", "top": top}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error computing CDR top-N: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute CDR top-N: {str(e)}")
+
+@app.get("/api/cdr/top/today")
+async def get_cdr_top_today(limit: int = Query(20, description="Number of entries per list")):
+    """Get today's top extensions and destinations, kept live from Cdr events"""
+    return {"status": "success", "top": cdr_top.today(limit)}
+
+@app.get("/api/cdr/live")
+@app.get("/api/cdr/live/{extension}")
+async def get_live_cdr(
+    extension: Optional[str] = None,
+    limit: int = Query(50, description="Maximum number of records to return")
+):
+    """Get today's live CDR counters and the latest calls without querying the database"""
+    records = cdr_live.recent(extension, limit)
+    return {
+        "status": "success",
+        "stats": cdr_live.stats(),
+        "count": len(records),
+        "records": records
+    }
+
+@app.get("/api/cdr/cache")
+async def get_cdr_cache_stats():
+    """Get CDR query cache counters"""
+    return {"status": "success", "cache": cdr_manager.cache.stats()}
+
+@app.post("/api/cdr/rollup/refresh")
+async def refresh_cdr_rollup():
+    """Bring the CDR rollups up to date immediately"""
+    if cdr_manager.rollup is None:
+        raise HTTPException(status_code=503, detail="CDR rollups are disabled")
+    try:
+        result = await cdr_rollup.refresh()
+        return {
+            "status": "success",
+            "rebuilt": result,
+            "last_refresh": cdr_rollup.last_refresh.isoformat() if cdr_rollup.last_refresh else None
+        }
+    except Exception as e:
+        logger.error(f"Error refreshing CDR rollups: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to refresh CDR rollups: {str(e)}")
+
+@app.get("/api/cdr/search/index")
+async def get_cdr_search_index():
+    """Get the size and window of the in-memory CDR search index"""
+    return {"status": "success", "index": cdr_search_index.stats()}
+
+@app.get("/api/cdr/archive")
+async def get_cdr_archive_status():
+    """Get the columnar CDR archive status"""
+    if not cdr_archive:
+        raise HTTPException(status_code=404, detail="CDR archive is not enabled (set CDR_ARCHIVE_DIR)")
+    return {"status": "success", "archive": cdr_archive.stats()}
+
+@app.post("/api/cdr/archive/run")
+async def run_cdr_archive():
+    """Archive every closed CDR day now"""
+    if not cdr_archive:
+        raise HTTPException(status_code=404, detail="CDR archive is not enabled (set CDR_ARCHIVE_DIR)")
+    try:
+        archived = await cdr_archive.archive_closed_days()
+        return {
+            "status": "success",
+            "archived": [day.isoformat() for day in archived],
+            "archive": cdr_archive.stats()
+        }
+    except Exception as e:
+        logger.error(f"Error archiving CDRs: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to archive CDRs: {str(e)}")
+
+@app.get("/api/cdr/indexes")
+async def get_cdr_indexes():
+    """Report missing CDR indexes and the query plan of each CDR filter shape"""
+    try:
+        result = await cdr_indexes.report(cdr_manager)
+        return {
+            "status": "success",
+            **result
+        }
+    except Exception as e:
+        logger.error(f"Error checking CDR indexes: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to check CDR indexes: {str(e)}")
+
 # Expose socket_app for uvicorn
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:socket_app",
-        host="127.0.0.1",
-        port=8000,
-        reload=True
-    )
\ No newline at end of file
+    if WORKER_MODE:
+        # Several workers share the port; reload cannot be combined with workers
+        uvicorn.run(
+            "main:socket_app",
+            host="127.0.0.1",
+            port=8000,
+            workers=int(os.getenv('ISPBX_WORKERS', '4'))
+        )
+    else:
+        uvicorn.run(
+            "main:socket_app",
+            host="127.0.0.1",
+            port=8000,
+            reload=True
+        )
\ No newline at end of file
@@ -3,6 +3,8 @@
 
 import logging
 import aiomysql
+from contextlib import asynccontextmanager
+from pymysql.constants import CLIENT, ER
 from typing import Dict, List, Optional, Union, Any
 
 # Configure logging
@@ -36,10 +38,13 @@ class QueueManager:
             'user': user,
             'password': password,
             'db': db,
-            'autocommit': True
+            'autocommit': True,
+            # rowcount counts matched rows, so an unchanged row still reads as found
+            'client_flag': CLIENT.FOUND_ROWS
         }
         self.pool = None
         self.ami_client = None  # Will be set externally
+        self.reload_scheduler = None  # Will be set externally
     
     async def connect(self):
         """Establish connection pool to the MySQL database"""
@@ -58,15 +63,52 @@ class QueueManager:
             await self.pool.wait_closed()
             self.pool = None
             logger.info("Disconnected from MySQL database for queue management")
+
+    @asynccontextmanager
+    async def _transaction(self):
+        """
+        Run statements in one transaction.
+        
+        Yields:
+            Cursor whose statements are committed together when the block
+            exits, or rolled back if it raises
+        """
+        if not self.pool:
+            await self.connect()
+        
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await conn.begin()
+                try:
+                    yield cursor
+                    await conn.commit()
+                except BaseException:
+                    await conn.rollback()
+                    raise
+    
+    def _request_reload(self, queue_name: Optional[str] = None):
+        """
+        Ask the reload scheduler to reload app_queue.
+
+        Args:
+            queue_name: Queue that changed, or None to reload all queues
+        """
+        if self.reload_scheduler:
+            self.reload_scheduler.request('app_queue', queue_name)
+        else:
+            logger.warning("Reload scheduler not set, unable to reload configuration")
     
     async def create_queue(self, queue_name: str, strategy: str = 'ringall', 
                           timeout: int = 15, musiconhold: str = 'default',
                           announce: str = None, context: str = 'from-queue',
                           maxlen: int = 0, servicelevel: int = 60,
-                          wrapuptime: int = 0) -> bool:
+                          wrapuptime: int = 0) -> Optional[bool]:
         """
         Create a new queue in the database.
         
+        An existing queue is detected from the duplicate-key error of the
+        insert rather than read beforehand.
+        
         Args:
             queue_name: The name of the queue
             strategy: Queue strategy (ringall, leastrecent, fewestcalls, random, etc.)
@@ -79,7 +121,8 @@ class QueueManager:
             wrapuptime: Time in seconds after a call before agent can receive another call
             
         Returns:
-            bool: True if queue was created successfully, False otherwise
+            True if the queue was created, None if it already exists,
+            False on any other error
         """
         if not self.pool:
             await self.connect()
@@ -102,22 +145,16 @@ class QueueManager:
                     
                     logger.info(f"Created queue {queue_name} with strategy '{strategy}'")
                     
-                    # Trigger Asterisk to reload configuration
-                    if self.ami_client:
-                        try:
-                            # Reload queue configuration
-                            logger.info(f"Reloading queue configuration after queue creation")
-                            reload_result = await self.ami_client.manager.send_action({
-                                'Action': 'QueueReload',
-                                'Queue': queue_name
-                            })
-                            logger.info(f"Queue configuration reloaded: {reload_result}")
-                        except Exception as e:
-                            logger.error(f"Failed to reload queue configuration: {e}")
-                    else:
-                        logger.warning("AMI client not set, unable to reload configuration")
+                    # Apply the change in Asterisk, coalesced with other edits
+                    self._request_reload(queue_name)
                     return True
                     
+        except aiomysql.IntegrityError as e:
+            if e.args[0] != ER.DUP_ENTRY:
+                logger.error(f"Failed to create queue {queue_name}: {e}")
+                return False
+            logger.warning(f"Queue {queue_name} already exists")
+            return None
         except Exception as e:
             logger.error(f"Failed to create queue {queue_name}: {e}")
             return False
@@ -201,7 +238,26 @@ class QueueManager:
             logger.error(f"Failed to list queues: {e}")
             return []
     
-    async def update_queue(self, queue_name: str, updates: Dict[str, Any]) -> bool:
+    async def get_queue_settings(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the service level and wrap-up settings of every queue.
+        
+        Returns:
+            Dictionary of queue name to its servicelevel and wrapuptime
+        """
+        if not self.pool:
+            await self.connect()
+            
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute("SELECT name, servicelevel, wrapuptime FROM queues")
+                    return {row['name']: row for row in await cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Failed to get queue settings: {e}")
+            return {}
+    
+    async def update_queue(self, queue_name: str, updates: Dict[str, Any]) -> Optional[bool]:
         """
         Update an existing queue in the database.
         
@@ -210,7 +266,8 @@ class QueueManager:
             updates: Dictionary containing fields to update
             
         Returns:
-            bool: True if queue was updated successfully, False otherwise
+            True if the queue was updated, None if it does not exist,
+            False on any other error
         """
         if not self.pool:
             await self.connect()
@@ -239,23 +296,13 @@ class QueueManager:
                     await cursor.execute(query, values)
                     
                     if cursor.rowcount == 0:
-                        logger.warning(f"Queue {queue_name} not found or no changes made")
-                        return False
+                        logger.warning(f"Queue {queue_name} not found")
+                        return None
                     
                     logger.info(f"Updated queue {queue_name}")
                     
-                    # Trigger Asterisk to reload configuration
-                    if self.ami_client:
-                        try:
-                            # Reload queue configuration
-                            logger.info(f"Reloading queue configuration after queue update")
-                            reload_result = await self.ami_client.manager.send_action({
-                                'Action': 'QueueReload',
-                                'Queue': queue_name
-                            })
-                            logger.info(f"Queue configuration reloaded: {reload_result}")
-                        except Exception as e:
-                            logger.error(f"Failed to reload queue configuration: {e}")
+                    # Apply the change in Asterisk, coalesced with other edits
+                    self._request_reload(queue_name)
                     
                     return True
                     
@@ -263,53 +310,39 @@ class QueueManager:
             logger.error(f"Failed to update queue {queue_name}: {e}")
             return False
     
-    async def delete_queue(self, queue_name: str) -> bool:
+    async def delete_queue(self, queue_name: str) -> Optional[bool]:
         """
-        Delete a queue from the database.
+        Delete a queue and its members in one transaction.
         
         Args:
             queue_name: The name of the queue to delete
             
         Returns:
-            bool: True if queue was deleted successfully, False otherwise
+            True if the queue was deleted, None if it does not exist,
+            False on any other error
         """
-        if not self.pool:
-            await self.connect()
-            
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    # Delete queue members first
-                    await cursor.execute(
-                        "DELETE FROM queue_members WHERE queue_name = %s",
-                        (queue_name,)
-                    )
-                    
-                    # Delete queue
-                    await cursor.execute(
-                        "DELETE FROM queues WHERE name = %s",
-                        (queue_name,)
-                    )
-                    
-                    if cursor.rowcount == 0:
-                        logger.warning(f"Queue {queue_name} not found")
-                        return False
-                    
-                    logger.info(f"Deleted queue {queue_name}")
-                    
-                    # Trigger Asterisk to reload configuration
-                    if self.ami_client:
-                        try:
-                            # Reload queue configuration
-                            logger.info(f"Reloading queue configuration after queue deletion")
-                            reload_result = await self.ami_client.manager.send_action({
-                                'Action': 'QueueReload'
-                            })
-                            logger.info(f"Queue configuration reloaded: {reload_result}")
-                        except Exception as e:
-                            logger.error(f"Failed to reload queue configuration: {e}")
-                    
-                    return True
+            async with self._transaction() as cursor:
+                # Delete queue first, its rowcount tells whether it existed
+                await cursor.execute(
+                    "DELETE FROM queues WHERE name = %s",
+                    (queue_name,)
+                )
+                if cursor.rowcount == 0:
+                    logger.warning(f"Queue {queue_name} not found")
+                    return None
+                
+                # Delete queue members
+                await cursor.execute(
+                    "DELETE FROM queue_members WHERE queue_name = %s",
+                    (queue_name,)
+                )
+            
+            logger.info(f"Deleted queue {queue_name}")
+            
+            # Apply the change in Asterisk, coalesced with other edits
+            self._request_reload()
+            return True
                     
         except Exception as e:
             logger.error(f"Failed to delete queue {queue_name}: {e}")
@@ -317,10 +350,14 @@ class QueueManager:
     
     async def add_queue_member(self, queue_name: str, interface: str, 
                               membername: str = None, penalty: int = 0,
-                              paused: int = 0, wrapuptime: int = None) -> bool:
+                              paused: int = 0, wrapuptime: int = None) -> Optional[bool]:
         """
         Add a member to a queue.
         
+        The insert only produces a row if the queue exists, and a member
+        already in the queue fails on the duplicate key, so neither needs a
+        read beforehand.
+        
         Args:
             queue_name: The name of the queue
             interface: The interface to add (e.g., 'PJSIP/1000')
@@ -330,7 +367,8 @@ class QueueManager:
             wrapuptime: Time in seconds after a call before agent can receive another call
             
         Returns:
-            bool: True if member was added successfully, False otherwise
+            True if the member was added, None if the queue does not exist
+            or the member is already in it, False on any other error
         """
         if not self.pool:
             await self.connect()
@@ -347,57 +385,38 @@ class QueueManager:
         try:
             async with self.pool.acquire() as conn:
                 async with conn.cursor() as cursor:
-                    # Check if queue exists
-                    await cursor.execute(
-                        "SELECT name FROM queues WHERE name = %s",
-                        (queue_name,)
-                    )
-                    if not await cursor.fetchone():
-                        logger.error(f"Queue {queue_name} does not exist")
-                        return False
-                    
-                    # Check if member already exists in the queue
-                    await cursor.execute(
-                        "SELECT interface FROM queue_members WHERE queue_name = %s AND interface = %s",
-                        (queue_name, interface)
-                    )
-                    if await cursor.fetchone():
-                        logger.warning(f"Member {interface} already exists in queue {queue_name}")
-                        return False
-                    
-                    # Add member to queue
+                    # Add member to queue, if the queue exists
                     query = """
                     INSERT INTO queue_members (
                         queue_name, interface, membername, penalty, paused, wrapuptime
-                    ) VALUES (%s, %s, %s, %s, %s, %s)
+                    ) SELECT name, %s, %s, %s, %s, %s FROM queues WHERE name = %s
                     """
                     await cursor.execute(
                         query,
-                        (queue_name, interface, membername, penalty, paused, wrapuptime)
+                        (interface, membername, penalty, paused, wrapuptime, queue_name)
                     )
+                    if cursor.rowcount == 0:
+                        logger.warning(f"Queue {queue_name} does not exist")
+                        return None
                     
                     logger.info(f"Added member {interface} to queue {queue_name}")
                     
-                    # Trigger Asterisk to reload configuration
-                    if self.ami_client:
-                        try:
-                            # Reload queue configuration
-                            logger.info(f"Reloading queue configuration after adding member")
-                            reload_result = await self.ami_client.manager.send_action({
-                                'Action': 'QueueReload',
-                                'Queue': queue_name
-                            })
-                            logger.info(f"Queue configuration reloaded: {reload_result}")
-                        except Exception as e:
-                            logger.error(f"Failed to reload queue configuration: {e}")
+                    # Apply the change in Asterisk, coalesced with other edits
+                    self._request_reload(queue_name)
                     
                     return True
                     
+        except aiomysql.IntegrityError as e:
+            if e.args[0] != ER.DUP_ENTRY:
+                logger.error(f"Failed to add member {interface} to queue {queue_name}: {e}")
+                return False
+            logger.warning(f"Member {interface} already exists in queue {queue_name}")
+            return None
         except Exception as e:
             logger.error(f"Failed to add member {interface} to queue {queue_name}: {e}")
             return False
     
-    async def remove_queue_member(self, queue_name: str, interface: str) -> bool:
+    async def remove_queue_member(self, queue_name: str, interface: str) -> Optional[bool]:
         """
         Remove a member from a queue.
         
@@ -406,7 +425,8 @@ class QueueManager:
             interface: The interface to remove (e.g., 'PJSIP/1000')
             
         Returns:
-            bool: True if member was removed successfully, False otherwise
+            True if the member was removed, None if it is not in the queue,
+            False on any other error
         """
         if not self.pool:
             await self.connect()
@@ -422,22 +442,12 @@ class QueueManager:
                     
                     if cursor.rowcount == 0:
                         logger.warning(f"Member {interface} not found in queue {queue_name}")
-                        return False
+                        return None
                     
                     logger.info(f"Removed member {interface} from queue {queue_name}")
                     
-                    # Trigger Asterisk to reload configuration
-                    if self.ami_client:
-                        try:
-                            # Reload queue configuration
-                            logger.info(f"Reloading queue configuration after removing member")
-                            reload_result = await self.ami_client.manager.send_action({
-                                'Action': 'QueueReload',
-                                'Queue': queue_name
-                            })
-                            logger.info(f"Queue configuration reloaded: {reload_result}")
-                        except Exception as e:
-                            logger.error(f"Failed to reload queue configuration: {e}")
+                    # Apply the change in Asterisk, coalesced with other edits
+                    self._request_reload(queue_name)
                     
                     return True
                     
@@ -474,7 +484,7 @@ class QueueManager:
             return []
     
     async def update_queue_member(self, queue_name: str, interface: str, 
-                                 updates: Dict[str, Any]) -> bool:
+                                 updates: Dict[str, Any]) -> Optional[bool]:
         """
         Update a queue member's settings.
         
@@ -484,7 +494,8 @@ class QueueManager:
             updates: Dictionary containing fields to update
             
         Returns:
-            bool: True if member was updated successfully, False otherwise
+            True if the member was updated, None if it is not in the queue,
+            False on any other error
         """
         if not self.pool:
             await self.connect()
@@ -514,23 +525,13 @@ class QueueManager:
                     await cursor.execute(query, values)
                     
                     if cursor.rowcount == 0:
-                        logger.warning(f"Member {interface} not found in queue {queue_name} or no changes made")
-                        return False
+                        logger.warning(f"Member {interface} not found in queue {queue_name}")
+                        return None
                     
                     logger.info(f"Updated member {interface} in queue {queue_name}")
                     
-                    # Trigger Asterisk to reload configuration
-                    if self.ami_client:
-                        try:
-                            # Reload queue configuration
-                            logger.info(f"Reloading queue configuration after member update")
-                            reload_result = await self.ami_client.manager.send_action({
-                                'Action': 'QueueReload',
-                                'Queue': queue_name
-                            })
-                            logger.info(f"Queue configuration reloaded: {reload_result}")
-                        except Exception as e:
-                            logger.error(f"Failed to reload queue configuration: {e}")
+                    # Apply the change in Asterisk, coalesced with other edits
+                    self._request_reload(queue_name)
                     
                     return True
                     
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/reload_scheduler.py
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Any, Set
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Asterisk module -> AMI actions that reload it
+RELOAD_ACTIONS = {
+    'res_pjsip': [{'Action': 'PJSIPReload'}, {'Action': 'DeviceStateList'}],
+    'app_queue': [{'Action': 'QueueReload'}],
+}
+
+class _Batch:
+    """Reload requests collected for one module until they are sent"""
+
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+        # Queue names for app_queue; None means the whole module
+        self.targets: Optional[Set[str]] = set()
+        self.requests = 0
+
+    def add(self, target: Optional[str]):
+        """Join a request, widening to the whole module when needed"""
+        self.requests += 1
+        if target is None or self.targets is None:
+            self.targets = None
+        else:
+            self.targets.add(target)
+
+class ReloadScheduler:
+    """
+    Debounced, coalescing reloads of Asterisk modules.
+
+    Configuration writes request a reload instead of sending one. The first
+    request for a module opens a short window; every request in it joins
+    the same batch and one reload is sent when it closes. Each module has a
+    single worker, so at most one reload is in flight; requests arriving
+    meanwhile form the one pending batch, sent after the window once the
+    in-flight reload is done. Callers get the batch's future and may await
+    it to know when their change is live.
+    """
+
+    def __init__(self, delay: float = 0.5):
+        """
+        Initialize the scheduler.
+
+        Args:
+            delay: Seconds a batch collects requests before its reload is sent
+        """
+        self.delay = delay
+        self.ami_client = None  # Will be set externally
+        self._pending: Dict[str, _Batch] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._requested = {module: 0 for module in RELOAD_ACTIONS}
+        self._sent = {module: 0 for module in RELOAD_ACTIONS}
+        self._failed = {module: 0 for module in RELOAD_ACTIONS}
+
+    def request(self, module: str, target: Optional[str] = None) -> asyncio.Future:
+        """
+        Request a reload without waiting for it.
+
+        Args:
+            module: res_pjsip or app_queue
+            target: Queue name to reload only that queue (app_queue only)
+
+        Returns:
+            Future resolving to the reload result dictionary
+
+        Raises:
+            ValueError: If the module is unknown
+        """
+        if module not in RELOAD_ACTIONS:
+            raise ValueError(f"Unknown reload module: {module}")
+
+        batch = self._pending.get(module)
+        if batch is None:
+            batch = self._pending[module] = _Batch()
+        batch.add(target)
+        self._requested[module] += 1
+
+        worker = self._workers.get(module)
+        if worker is None or worker.done():
+            self._workers[module] = asyncio.create_task(self._run(module))
+        return batch.future
+
+    async def reload(self, module: str, target: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Request a reload and wait until it has been sent.
+
+        Args:
+            module: res_pjsip or app_queue
+            target: Queue name to reload only that queue (app_queue only)
+
+        Returns:
+            Dictionary with the module, success flag, number of coalesced
+            requests and error if any
+        """
+        return await asyncio.shield(self.request(module, target))
+
+    async def _run(self, module: str):
+        """Send the module's batches one at a time until none is pending"""
+        while module in self._pending:
+            await asyncio.sleep(self.delay)
+            # Requests from here on form the next pending batch
+            batch = self._pending.pop(module)
+            result = await self._send(module, batch)
+            if not batch.future.done():
+                batch.future.set_result(result)
+
+    async def _send(self, module: str, batch: _Batch) -> Dict[str, Any]:
+        """Send the AMI actions of one batch"""
+        result = {'module': module, 'success': False, 'requests': batch.requests, 'error': None}
+        if not self.ami_client:
+            logger.warning(f"AMI client not set, unable to reload {module}")
+            result['error'] = 'AMI client not set'
+            self._failed[module] += 1
+            return result
+
+        actions: List[Dict[str, Any]] = [dict(action) for action in RELOAD_ACTIONS[module]]
+        if module == 'app_queue' and batch.targets and len(batch.targets) == 1:
+            # A single queue changed, reload just that one
+            actions[0]['Queue'] = next(iter(batch.targets))
+
+        try:
+            for action in actions:
+                await self.ami_client.manager.send_action(action)
+            self._sent[module] += 1
+            result['success'] = True
+            logger.info(f"Reloaded {module} for {batch.requests} coalesced request(s)")
+        except Exception as e:
+            self._failed[module] += 1
+            result['error'] = str(e)
+            logger.error(f"Failed to reload {module}: {e}")
+        return result
+
+    async def close(self):
+        """Stop the workers, dropping reloads that were not sent yet"""
+        for worker in self._workers.values():
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        for batch in self._pending.values():
+            batch.future.cancel()
+        self._workers.clear()
+        self._pending.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get reload counters per module.
+
+        Returns:
+            Dictionary with requested, sent and failed reloads and whether
+            one is pending or in flight
+        """
+        return {
+            module: {
+                'requested': self._requested[module],
+                'sent': self._sent[module],
+                'failed': self._failed[module],
+                'pending': module in self._pending,
+                'running': module in self._workers and not self._workers[module].done()
+            }
+            for module in RELOAD_ACTIONS
+        }
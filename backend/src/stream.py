@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/src/stream.py
+
+import json
+import asyncio
+import logging
+from typing import Dict, Optional, Any, Set, Tuple
+from parser import parse_extension
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Event fields that may identify an extension
+EXTENSION_FIELDS = ('CallerIDNum', 'ConnectedLineNum', 'Exten', 'DestCallerIDNum', 'DestExten')
+
+# Event fields that may hold a channel or device name
+CHANNEL_FIELDS = ('Device', 'Channel', 'DestChannel', 'Interface')
+
+class StreamFilter:
+    """
+    Server-side filter for a stream subscriber.
+
+    Empty criteria match everything. An event matches when it passes every
+    non-empty criterion (event type, extension and queue).
+    """
+
+    def __init__(self, events: Optional[Set[str]] = None,
+                 extensions: Optional[Set[str]] = None,
+                 queues: Optional[Set[str]] = None):
+        """
+        Initialize the filter.
+
+        Args:
+            events: Event types to accept
+            extensions: Extensions to accept (matched against caller IDs and channels)
+            queues: Queue names to accept
+        """
+        self.events = events or set()
+        self.extensions = extensions or set()
+        self.queues = queues or set()
+
+    @classmethod
+    def from_query(cls, events: Optional[str] = None, extension: Optional[str] = None,
+                   queue: Optional[str] = None) -> 'StreamFilter':
+        """
+        Build a filter from comma-separated query string values.
+
+        Args:
+            events: Comma-separated event types (e.g. 'Newchannel,Hangup')
+            extension: Comma-separated extensions (e.g. '1001,1002')
+            queue: Comma-separated queue names
+
+        Returns:
+            StreamFilter instance
+        """
+        def split(value):
+            return {v.strip() for v in value.split(',') if v.strip()} if value else set()
+
+        return cls(events=split(events), extensions=split(extension), queues=split(queue))
+
+    def matches(self, event_type: str, event_data: Dict[str, Any]) -> bool:
+        """
+        Check whether an event passes the filter.
+
+        Args:
+            event_type: Event name
+            event_data: Event payload
+
+        Returns:
+            bool: True if the event should be sent to the subscriber
+        """
+        if self.events and event_type not in self.events:
+            return False
+
+        if self.queues and event_data.get('Queue') not in self.queues:
+            return False
+
+        if self.extensions:
+            for field in EXTENSION_FIELDS:
+                if event_data.get(field) in self.extensions:
+                    return True
+            for field in CHANNEL_FIELDS:
+                if parse_extension(event_data.get(field, '')) in self.extensions:
+                    return True
+            return False
+
+        return True
+
+class StreamSubscriber:
+    """A single SSE or WebSocket consumer with a bounded outgoing queue"""
+
+    def __init__(self, stream_filter: StreamFilter, max_queue: int = 1000):
+        """
+        Initialize the subscriber.
+
+        Args:
+            stream_filter: Filter applied before events are serialized
+            max_queue: Maximum number of pending lines before events are dropped
+        """
+        self.filter = stream_filter
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def offer(self, seq: Optional[int], line: str):
+        """Queue a serialized event, dropping it if the consumer is too slow"""
+        try:
+            self.queue.put_nowait((seq, line))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Tuple[Optional[int], str]]:
+        """
+        Wait for the next serialized event.
+
+        Args:
+            timeout: Seconds to wait before returning None (for keepalives)
+
+        Returns:
+            Tuple of (sequence number, JSON line) or None on timeout
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class StreamHub:
+    """
+    Fans broadcast events out to lightweight SSE and WebSocket consumers.
+
+    Events are filtered per subscriber before serialization, and each event
+    is serialized at most once no matter how many subscribers receive it.
+    """
+
+    def __init__(self, max_queue: int = 1000):
+        """
+        Initialize the stream hub.
+
+        Args:
+            max_queue: Per-subscriber queue bound
+        """
+        self.max_queue = max_queue
+        self._subscribers: Set[StreamSubscriber] = set()
+
+    def subscribe(self, stream_filter: StreamFilter) -> StreamSubscriber:
+        """Register a new subscriber"""
+        subscriber = StreamSubscriber(stream_filter, self.max_queue)
+        self._subscribers.add(subscriber)
+        logger.info(f"Stream subscriber added ({len(self._subscribers)} connected)")
+        return subscriber
+
+    def unsubscribe(self, subscriber: StreamSubscriber):
+        """Remove a subscriber"""
+        self._subscribers.discard(subscriber)
+        if subscriber.dropped:
+            logger.warning(f"Stream subscriber removed after dropping {subscriber.dropped} events")
+        logger.info(f"Stream subscriber removed ({len(self._subscribers)} connected)")
+
+    @staticmethod
+    def serialize(event_type: str, event_data: Dict[str, Any], seq: Optional[int] = None) -> str:
+        """Serialize an event as one JSON line (without the trailing newline)"""
+        return json.dumps({'event': event_type, 'seq': seq, 'data': event_data}, default=str)
+
+    def publish(self, event_type: str, event_data: Dict[str, Any], seq: Optional[int] = None):
+        """
+        Send an event to every subscriber whose filter matches.
+
+        Args:
+            event_type: Event name
+            event_data: Event payload
+            seq: Event sequence number from the event history
+        """
+        line = None
+        for subscriber in self._subscribers:
+            if not subscriber.filter.matches(event_type, event_data):
+                continue
+            if line is None:
+                line = self.serialize(event_type, event_data, seq)
+            subscriber.offer(seq, line)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hub statistics.
+
+        Returns:
+            Dictionary with subscriber count and queue depths
+        """
+        return {
+            'subscribers': len(self._subscribers),
+            'queue_depths': [s.queue.qsize() for s in self._subscribers],
+            'dropped': sum(s.dropped for s in self._subscribers)
+        }
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/tests/test_cdr_analytics.py
+
+from cdr_analytics import CDRFrame, concurrency
+
+def make_frame(calls):
+    """Build a frame from (start, duration) pairs of answered internal calls"""
+    count = len(calls)
+    return CDRFrame.from_columns([
+        [start for start, _ in calls],
+        [duration for _, duration in calls],
+        [duration for _, duration in calls],
+        ['ANSWERED'] * count,
+        ['100'] * count,
+        ['101'] * count,
+        ['100'] * count,
+        ['101'] * count
+    ])
+
+def test_concurrency_three_calls():
+    # Up: [0, 120), [30, 90) and [100, 200). Level 1 until 30, 2 until 90,
+    # 1 until 100, 2 until 120, 1 until 200, then 0 until 300
+    frame = make_frame([(0, 120), (30, 60), (100, 100)])
+    result = concurrency(frame, bucket_seconds=60, lower=0, upper=300)
+
+    assert result['calls'] == 3
+    assert result['peak'] == {'calls': 2, 'at': '1970-01-01T00:00:30'}
+    assert [b['peak'] for b in result['buckets']] == [2, 2, 1, 1, 0]
+    # Averages are the area under the level curve over each minute
+    assert [b['average'] for b in result['buckets']] == [1.5, 1.833, 1.0, 0.333, 0.0]
+    # 100s at level 0, 120s at level 1 and 80s at level 2
+    assert result['percentiles'] == {'p50': 1, 'p90': 2, 'p95': 2, 'p99': 2}
+
+def test_concurrency_back_to_back_calls_do_not_overlap():
+    # A call ending at the second the next one starts is not concurrent with it
+    frame = make_frame([(0, 60), (60, 60)])
+    result = concurrency(frame, bucket_seconds=120, lower=0, upper=120)
+
+    assert result['peak']['calls'] == 1
+    assert result['buckets'][0]['average'] == 1.0
+
+def test_concurrency_skips_zero_length_calls():
+    frame = make_frame([(10, 0), (20, 30)])
+    result = concurrency(frame, bucket_seconds=60, lower=0, upper=60)
+
+    assert result['calls'] == 1
+    assert result['buckets'][0]['peak'] == 1
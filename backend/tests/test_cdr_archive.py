@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/tests/test_cdr_archive.py
+
+import os
+from datetime import datetime, date
+import pytest
+from cdr_archive import CDRArchive, ArchivePartition
+
+DAY = date(2024, 3, 1)
+
+@pytest.fixture
+def partition(tmp_path):
+    """An archived day of four calls, sorted by start like an export"""
+    starts = [datetime(2024, 3, 1, 9, 0, 0), datetime(2024, 3, 1, 9, 0, 0),
+              datetime(2024, 3, 1, 10, 0, 0), datetime(2024, 3, 1, 11, 30, 0)]
+    columns = ['start', 'uniqueid', 'src', 'dst', 'disposition', 'clid']
+    values = [
+        starts,
+        ['1.1', '1.2', '2.1', '3.1'],
+        ['100', '101', '100', None],
+        ['200', '200', '201', '202'],
+        ['ANSWERED', 'NO ANSWER', 'ANSWERED', 'BUSY'],
+        ['"Alice" <100>', '"Bob" <101>', '"Alice" <100>', None]
+    ]
+    archive = CDRArchive(None, str(tmp_path))
+    assert archive._write_partition(DAY, columns, values) == 4
+    return ArchivePartition(os.path.join(str(tmp_path), DAY.isoformat()))
+
+def test_select_without_bounds_returns_every_row(partition):
+    assert list(partition.select(None, None, {})) == [0, 1, 2, 3]
+
+def test_select_lower_is_inclusive_and_upper_exclusive(partition):
+    lower, upper = datetime(2024, 3, 1, 9, 0, 0), datetime(2024, 3, 1, 11, 30, 0)
+    assert list(partition.select(lower, upper, {})) == [0, 1, 2]
+
+def test_select_partial_second_lower_skips_that_second(partition):
+    # Stored starts are whole seconds, so 09:00:00.5 starts after both 09:00:00 calls
+    assert list(partition.select(datetime(2024, 3, 1, 9, 0, 0, 500000), None, {})) == [2, 3]
+
+def test_select_range_between_rows_is_empty(partition):
+    lower, upper = datetime(2024, 3, 1, 10, 0, 1), datetime(2024, 3, 1, 11, 0, 0)
+    assert len(partition.select(lower, upper, {})) == 0
+
+def test_select_equality_filters(partition):
+    assert list(partition.select(None, None, {'src': '100'})) == [0, 2]
+    assert list(partition.select(None, None, {'dst': '200', 'disposition': 'ANSWERED'})) == [0]
+    # A value missing from the day's dictionary matches nothing
+    assert len(partition.select(None, None, {'src': '999'})) == 0
+
+def test_select_search_skips_null_values(partition):
+    filters = {'search': 'alice', 'search_field': 'clid', 'search_mode': 'contains'}
+    assert list(partition.select(None, None, filters)) == [0, 2]
+    filters = {'search': '10', 'search_field': 'src', 'search_mode': 'prefix'}
+    assert list(partition.select(datetime(2024, 3, 1, 9, 30), None, filters)) == [2]
+
+def test_record_decodes_null_and_datetime(partition):
+    record = partition.record(3)
+    assert record['start'] == '2024-03-01T11:30:00'
+    assert record['src'] is None
+    assert record['disposition'] == 'BUSY'
+
+def test_write_partition_replace_swaps_in_the_new_day(tmp_path):
+    archive = CDRArchive(None, str(tmp_path))
+    columns = ['start', 'uniqueid']
+    archive._write_partition(DAY, columns, [[datetime(2024, 3, 1, 9, 0)], ['1.1']])
+    late = [[datetime(2024, 3, 1, 9, 0), datetime(2024, 3, 1, 23, 30)], ['1.1', '9.9']]
+    # Without replace the day already archived is kept
+    archive._write_partition(DAY, columns, late)
+    assert ArchivePartition(os.path.join(str(tmp_path), DAY.isoformat())).rows == 1
+
+    assert archive._write_partition(DAY, columns, late, replace=True) == 2
+    partition = ArchivePartition(os.path.join(str(tmp_path), DAY.isoformat()))
+    assert partition.record(1)['uniqueid'] == '9.9'
+    assert sorted(os.listdir(str(tmp_path))) == [DAY.isoformat()]
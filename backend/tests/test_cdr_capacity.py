@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/tests/test_cdr_capacity.py
+
+import numpy as np
+import pytest
+from cdr_capacity import erlang_b_table, erlang_c_table, staffing, trunk_lines
+
+def test_erlang_b_small_cases():
+    # B(1, 1) = 1/2 and B(2, 2) = 2/5
+    table = erlang_b_table(np.array([1.0, 2.0]), 2)
+    assert table[:, 0] == pytest.approx([1.0, 1.0])
+    assert table[0, 1] == pytest.approx(0.5)
+    assert table[1, 2] == pytest.approx(0.4)
+
+def test_erlang_b_ten_erlangs_twelve_lines():
+    assert erlang_b_table(np.array([10.0]), 12)[0, 12] == pytest.approx(0.11974, abs=1e-5)
+
+def test_erlang_c_ten_erlangs_twelve_agents():
+    assert erlang_c_table(np.array([10.0]), 12)[0, 12] == pytest.approx(0.44939, abs=1e-5)
+
+def test_erlang_c_small_case():
+    # One Erlang on two agents waits with probability 1/3
+    assert erlang_c_table(np.array([1.0]), 2)[0, 2] == pytest.approx(1 / 3)
+
+def test_erlang_c_every_call_waits_without_spare_agents():
+    table = erlang_c_table(np.array([10.0]), 12)
+    assert np.all(table[0, :11] == 1.0)
+
+def test_staffing_eighty_in_twenty():
+    # 10 Erlangs at 180s handle time: 13 agents reach 79.6%, 14 reach 88.8%
+    result = staffing(np.array([10.0, 0.0]), np.array([180.0, 180.0]), np.array([20.0, 20.0]), 0.8)
+    assert list(result['agents']) == [14, 0]
+    assert result['service_level'][0] == pytest.approx(0.8884, abs=1e-4)
+    assert result['asa'][0] == pytest.approx(7.84, abs=1e-2)
+    assert result['occupancy'][0] == pytest.approx(10 / 14)
+    # No traffic needs no agents and meets any target
+    assert result['service_level'][1] == 1.0
+
+def test_staffing_unmet_target_is_nan():
+    result = staffing(np.array([10.0]), np.array([180.0]), np.array([20.0]), 0.8, max_agents=12)
+    assert result['agents'][0] == -1
+    assert np.isnan(result['service_level'][0])
+
+def test_trunk_lines_one_percent_blocking():
+    # The Erlang-B table gives 18 lines for 10 Erlangs at 1% blocking
+    result = trunk_lines(np.array([10.0, 0.0]), 0.01, lines=12)
+    assert list(result['lines_required']) == [18, 0]
+    assert result['blocking'][0] == pytest.approx(0.11974, abs=1e-5)
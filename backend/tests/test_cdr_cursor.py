@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/tests/test_cdr_cursor.py
+
+from datetime import datetime
+import pytest
+from cdr_manager import CDRManager
+
+def test_cursor_round_trip():
+    record = {'start': datetime(2024, 3, 1, 9, 30, 15), 'uniqueid': '1709285415.42'}
+    cursor = CDRManager.encode_cursor(record)
+    assert CDRManager.decode_cursor(cursor) == (datetime(2024, 3, 1, 9, 30, 15), '1709285415.42')
+
+def test_cursor_accepts_iso_start_and_is_url_safe():
+    cursor = CDRManager.encode_cursor({'start': '2024-03-01T09:30:15.250000', 'uniqueid': 'a/b+c?'})
+    assert '=' not in cursor and '+' not in cursor and '/' not in cursor
+    assert CDRManager.decode_cursor(cursor) == (datetime(2024, 3, 1, 9, 30, 15, 250000), 'a/b+c?')
+
+def test_session_cursor_uses_sort_start_and_session_id():
+    session = {'sort_start': datetime(2024, 3, 1, 9, 0), 'session_id': 'abc'}
+    assert CDRManager.session_cursor(session) == \
+        CDRManager.encode_cursor({'start': datetime(2024, 3, 1, 9, 0), 'uniqueid': 'abc'})
+
+@pytest.mark.parametrize('cursor', ['', 'not-a-cursor', 'WzFd', 'WyJ4IiwieSJd'])
+def test_malformed_cursor_raises_value_error(cursor):
+    # WzFd is [1] and WyJ4IiwieSJd is ["x","y"], neither a start and uniqueid
+    with pytest.raises(ValueError):
+        CDRManager.decode_cursor(cursor)
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/tests/test_cdr_live.py
+
+from zoneinfo import ZoneInfo
+from cdr_live import LiveCDRStream, start_day
+
+UTC, PARIS = ZoneInfo('UTC'), ZoneInfo('Europe/Paris')
+
+def test_start_day_converts_database_time():
+    # 23:30 UTC is already the next day in Paris
+    assert start_day('2024-03-01T23:30:00', PARIS, UTC) == '2024-03-02'
+    assert start_day('2024-03-01T22:30:00', PARIS, UTC) == '2024-03-01'
+
+def test_start_day_without_filter_timezone_keeps_database_day():
+    assert start_day('2024-03-01T23:30:00', None, UTC) == '2024-03-01'
+    assert start_day(None, PARIS, UTC) is None
+
+def test_live_counts_calls_by_day_in_the_filter_timezone():
+    stream = LiveCDRStream(timezone=UTC, db_timezone=UTC)
+    today = stream._today()
+    stream.add({'start': f'{today}T00:00:01', 'disposition': 'ANSWERED', 'billsec': 30, 'src': '100'})
+    stream.add({'start': '2000-01-01T12:00:00', 'disposition': 'ANSWERED', 'billsec': 30, 'src': '100'})
+    assert stream.stats()['calls_today'] == 1
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/tests/test_cdr_search.py
+
+from datetime import datetime
+import pytest
+from cdr_search import NgramIndex, matches
+
+@pytest.fixture
+def index():
+    index = NgramIndex(days=7)
+    index.add({'start': datetime(2024, 3, 1, 9, 0), 'uniqueid': '1', 'disposition': 'ANSWERED',
+               'src': '0612345678', 'dst': '100', 'clid': '"Alice Martin" <0612345678>'})
+    index.add({'start': datetime(2024, 3, 1, 10, 0), 'uniqueid': '2', 'disposition': 'NO ANSWER',
+               'src': '0698765432', 'dst': '101', 'clid': '"Bob" <0698765432>'})
+    index.add({'start': '2024-03-02T08:00:00', 'uniqueid': '3', 'disposition': 'ANSWERED',
+               'src': '100', 'dst': '0612345678', 'clid': '"Reception" <100>'})
+    return index
+
+def keys(*pairs):
+    return [(datetime.fromisoformat(start), uniqueid) for start, uniqueid in pairs]
+
+def test_matches_modes():
+    assert matches('0612345678', 'prefix', '061')
+    assert not matches('0612345678', 'prefix', '678')
+    assert matches('0612345678', 'suffix', '678')
+    assert matches('"Alice" <100>', 'contains', 'alice')
+    assert not matches(None, 'contains', 'a')
+
+def test_search_modes(index):
+    assert index.search('src', 'contains', '345', None, None, {}) == keys(('2024-03-01T09:00:00', '1'))
+    assert index.search('src', 'prefix', '06', None, None, {}) == \
+        keys(('2024-03-01T10:00:00', '2'), ('2024-03-01T09:00:00', '1'))
+    assert index.search('src', 'suffix', '5678', None, None, {}) == keys(('2024-03-01T09:00:00', '1'))
+
+def test_search_is_case_insensitive_and_verifies_candidates(index):
+    assert index.search('clid', 'contains', 'ALICE', None, None, {}) == keys(('2024-03-01T09:00:00', '1'))
+    # Every trigram of 'martinx' but the last occurs, so the postings rule it out
+    assert index.search('clid', 'contains', 'martinx', None, None, {}) == []
+    # Both trigrams of 'alice' occur, but not as a prefix
+    assert index.search('clid', 'prefix', 'alice', None, None, {}) == []
+
+def test_search_shorter_than_a_gram_checks_every_call(index):
+    assert index.search('dst', 'prefix', '10', None, None, {}) == \
+        keys(('2024-03-01T10:00:00', '2'), ('2024-03-01T09:00:00', '1'))
+
+def test_search_range_and_filters(index):
+    lower, upper = datetime(2024, 3, 1, 9, 30), datetime(2024, 3, 2)
+    assert index.search('src', 'prefix', '06', lower, upper, {}) == keys(('2024-03-01T10:00:00', '2'))
+    assert index.search('src', 'prefix', '06', None, None, {'disposition': 'ANSWERED'}) == \
+        keys(('2024-03-01T09:00:00', '1'))
+    assert index.search('clid', 'contains', 'e', None, None, {'dst': '0612345678'}) == \
+        keys(('2024-03-02T08:00:00', '3'))
+
+def test_add_ignores_duplicates(index):
+    index.add({'start': datetime(2024, 3, 1, 9, 0), 'uniqueid': '1', 'disposition': 'ANSWERED',
+               'src': '0612345678', 'dst': '100', 'clid': ''})
+    assert index.stats()['calls'] == 3
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# /home/ubuntu/Documents/ispbx/backend/tests/test_fraud_detector.py
+
+from fraud_detector import SlidingCountMinSketch
+
+def test_sketch_counts_keys():
+    sketch = SlidingCountMinSketch(window=60, buckets=6, width=1024, depth=4)
+    assert sketch.add('100', now=0) == 1
+    assert sketch.add('100', now=1) == 2
+    assert sketch.add('101', count=5, now=2) == 5
+    assert sketch.estimate('100', now=3) >= 2
+    assert sketch.total() == 7
+
+def test_sketch_never_undercounts():
+    sketch = SlidingCountMinSketch(window=60, buckets=6, width=16, depth=2)
+    # Far more keys than counters, so collisions are certain
+    for key in range(200):
+        sketch.add(str(key), count=key % 3 + 1, now=0)
+    for key in range(200):
+        assert sketch.estimate(str(key), now=0) >= key % 3 + 1
+
+def test_sketch_forgets_counts_outside_the_window():
+    sketch = SlidingCountMinSketch(window=60, buckets=6, width=1024, depth=4)
+    sketch.add('100', count=3, now=0)
+    sketch.add('100', count=2, now=30)
+    # The bucket of t=0 expires once time moves a full window on
+    assert sketch.estimate('100', now=59) == 5
+    assert sketch.estimate('100', now=60) == 2
+    assert sketch.estimate('100', now=95) == 0
+    assert sketch.total() == 0
+
+def test_sketch_skips_past_a_long_gap():
+    sketch = SlidingCountMinSketch(window=60, buckets=6, width=1024, depth=4)
+    sketch.add('100', count=4, now=0)
+    assert sketch.add('100', now=10000) == 1
+
+def test_sketch_error_bound_and_memory():
+    sketch = SlidingCountMinSketch(window=60, buckets=6, width=1000, depth=4)
+    sketch.add('100', count=1000, now=0)
+    # e / width of 1000 counts
+    assert sketch.error_bound() == 2
+    assert sketch.nbytes == (6 * 4 * 1000 + 4 * 1000) * 4
@@ -59,6 +59,12 @@ document.addEventListener('DOMContentLoaded', async () => {
         cdrManager = new CDRManager();
         console.debug('CDRManager created');
         
+        // Calls appear as soon as they finish, without polling
+        socket.on('NewCDR', (event) => {
+            console.debug('[Socket.IO] NewCDR:', event);
+            cdrManager.handleNewRecord(event.data);
+        });
+        
         // Make instance available globally for debugging
         window.cdrManager = cdrManager;
         
@@ -13,8 +13,11 @@ class CDRManager {
             end_date: null,
             src: null,
             dst: null,
-            disposition: null
+            disposition: null,
+            search: null
         };
+        this.searchField = 'src';
+        this.searchMode = 'contains';
         
         // DOM elements
         this.filterForm = document.getElementById('cdr-filter-form');
@@ -101,6 +104,9 @@ class CDRManager {
         this.filters.src = document.getElementById('src').value || null;
         this.filters.dst = document.getElementById('dst').value || null;
         this.filters.disposition = document.getElementById('disposition').value || null;
+        this.filters.search = document.getElementById('search').value || null;
+        this.searchField = document.getElementById('search-field').value;
+        this.searchMode = document.getElementById('search-mode').value;
         // start_date and end_date are updated by the datepicker onChange events
     }
     
@@ -114,6 +120,9 @@ class CDRManager {
         document.getElementById('src').value = '';
         document.getElementById('dst').value = '';
         document.getElementById('disposition').value = '';
+        document.getElementById('search').value = '';
+        document.getElementById('search-field').value = 'src';
+        document.getElementById('search-mode').value = 'contains';
         
         // Reset filter values
         this.filters = {
@@ -121,8 +130,11 @@ class CDRManager {
             end_date: null,
             src: null,
             dst: null,
-            disposition: null
+            disposition: null,
+            search: null
         };
+        this.searchField = 'src';
+        this.searchMode = 'contains';
         
         // Reset datepickers
         const startDatePicker = document.getElementById('start-date')._flatpickr;
@@ -164,6 +176,36 @@ class CDRManager {
         this.avgDurationElement.textContent = this.stats.avg_duration || 0;
     }
     
+    /**
+     * Handle a call that just finished, pushed over Socket.IO
+     * @param {Object} data - Event data with the new record and today's live stats
+     */
+    handleNewRecord(data) {
+        const { record, stats } = data;
+        const filtered = Object.values(this.filters).some(value => value);
+        
+        // Today's counters come straight from the server
+        if (stats) {
+            this.stats.calls_today = stats.calls_today;
+        }
+        if (!filtered) {
+            this.stats.total_calls = (this.stats.total_calls || 0) + 1;
+            if (record.disposition === 'ANSWERED' && this.stats.disposition_stats) {
+                this.stats.disposition_stats.ANSWERED = (this.stats.disposition_stats.ANSWERED || 0) + 1;
+            }
+        }
+        this.updateStatsDisplay();
+        
+        // Only the unfiltered first page shows the newest calls
+        if (filtered || this.currentPage !== 1) {
+            return;
+        }
+        this.records = [record, ...this.records].slice(0, this.recordsPerPage);
+        this.totalRecords += 1;
+        this.updateRecordsDisplay();
+        this.updatePagination();
+    }
+    
     /**
      * Fetch CDR records from API with current filters and pagination
      */
@@ -185,6 +227,11 @@ class CDRManager {
             if (this.filters.src) params.append('src', this.filters.src);
             if (this.filters.dst) params.append('dst', this.filters.dst);
             if (this.filters.disposition) params.append('disposition', this.filters.disposition);
+            if (this.filters.search) {
+                params.append('search', this.filters.search);
+                params.append('search_field', this.searchField);
+                params.append('search_mode', this.searchMode);
+            }
             
             // Fetch data
             const response = await fetch(`${API_CONFIG.BACKEND_URL}/api/cdr?${params.toString()}`);
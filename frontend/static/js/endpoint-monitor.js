@@ -99,17 +99,29 @@ class EndpointMonitor {
             this.refreshIndicator.style.display = 'inline-block';
             console.debug('refreshIndicator display set to inline-block');
             
-            console.info(`Sending fetch request to ${API_CONFIG.BACKEND_URL}${API_CONFIG.ENDPOINTS.LIST}`);
+            // Config and live state joined server-side from in-memory caches,
+            // paged until every endpoint is loaded
+            const pageSize = 1000;
+            console.info(`Sending fetch requests to ${API_CONFIG.BACKEND_URL}${API_CONFIG.ENDPOINTS.VIEW}`);
             try {
-                const { status, data } = await fetchAPI(API_CONFIG.ENDPOINTS.LIST);
-                console.debug('Response status:', status);
-                console.debug('Parsed response data:', data);
+                let rows = [];
+                let data;
+                do {
+                    const url = `${API_CONFIG.ENDPOINTS.VIEW}?limit=${pageSize}&offset=${rows.length}`;
+                    ({ data } = await fetchAPI(url));
+                    console.debug('Parsed response data:', data);
+                    if (data.status !== 'success' || !Array.isArray(data.endpoints)) break;
+                    rows = rows.concat(data.endpoints);
+                } while (data.endpoints.length > 0 && rows.length < data.total);
                 
                 if (data.status === 'success' && Array.isArray(data.endpoints)) {
-                    console.info(`Received ${data.endpoints.length} endpoints`);
+                    console.info(`Received ${rows.length} endpoints`);
                     // Add timestamp to each endpoint
-                    this.endpoints = data.endpoints.map(endpoint => ({
+                    this.endpoints = rows.map(endpoint => ({
                         ...endpoint,
+                        Extension: endpoint.endpoint_id,
+                        Name: endpoint.name,
+                        State: endpoint.state,
                         lastUpdated: formatTimestamp()
                     }));
                     console.debug('Rendering endpoints table');
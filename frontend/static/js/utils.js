@@ -19,6 +19,7 @@ const API_CONFIG = {
     ENDPOINTS: {
         LIST: '/api/endpoints',
         DB_LIST: '/api/endpoints/db',
+        VIEW: '/api/endpoints/view',
         GET: (id) => `/api/endpoints/${id}`,
         DB_GET: (id) => `/api/endpoints/db/${id}`,
         CREATE: '/api/endpoints',
@@ -49,14 +50,24 @@ function initializeSocketConnection(endpointMonitor, callMonitor) {
 
     // Connect directly to the backend Socket.IO server
     console.log(`Connecting directly to backend Socket.IO server at ${API_CONFIG.BACKEND_URL}`);
+    // Last event sequence seen, sent on reconnect so the backend replays what we missed
+    let lastSeq = null;
+
     const socket = io(API_CONFIG.BACKEND_URL, {
         reconnectionAttempts: 10,
         reconnectionDelay: 2000,
         timeout: 10000,
         withCredentials: false,
-        transports: ['websocket', 'polling']
+        transports: ['websocket', 'polling'],
+        auth: (cb) => cb(lastSeq !== null ? { last_seq: lastSeq } : {})
     });
 
+    function trackSeq(event) {
+        if (event && typeof event.seq === 'number') {
+            lastSeq = event.seq;
+        }
+    }
+
     // Socket connection events
     socket.on('connect', () => {
         console.log('[Socket.IO] Connected directly to backend server');
@@ -81,8 +92,9 @@ function initializeSocketConnection(endpointMonitor, callMonitor) {
 
     // Listen for DeviceStateChange events and transform to EndpointState
     // This maintains consistent endpoint terminology
-    socket.on('DeviceStateChange', (event) => {
+    function handleDeviceStateChange(event) {
         console.log('[Event] DeviceStateChange received:', event);
+        trackSeq(event);
         
         // Extract the actual data from the nested structure
         const data = event.data || event;
@@ -104,10 +116,14 @@ function initializeSocketConnection(endpointMonitor, callMonitor) {
         if (monitor?.handleEvent) {
             monitor.handleEvent(endpointData);
         }
-    });
+    }
+
+    socket.on('DeviceStateChange', handleDeviceStateChange);
     
     // Also listen for individual call events for backward compatibility
     function processEvent(event) {
+        trackSeq(event);
+
         // Extract the actual data from the nested structure
         const data = event.data || event;
         
@@ -128,6 +144,33 @@ function initializeSocketConnection(endpointMonitor, callMonitor) {
     socket.on('DialEnd', processEvent);
     socket.on('Hangup', processEvent);
 
+    // Events missed while disconnected, replayed by the backend on reconnect
+    socket.on('EventReplay', (replay) => {
+        if (replay.snapshot_required) {
+            console.log('[Socket.IO] Replay window exceeded, reloading full state');
+            lastSeq = replay.last_seq;
+            if (monitor?.fetchEndpointData) {
+                monitor.fetchEndpointData();
+            } else if (monitor?.fetchEndpoints) {
+                monitor.fetchEndpoints(true);
+            }
+            return;
+        }
+
+        console.log(`[Socket.IO] Replaying ${replay.events.length} missed events`);
+        for (const entry of replay.events) {
+            const event = { data: entry.data, seq: entry.seq, name: entry.event };
+            if (entry.event === 'DeviceStateChange') {
+                handleDeviceStateChange(event);
+            } else if (['Newchannel', 'DialState', 'DialEnd', 'Hangup'].includes(entry.event)) {
+                processEvent(event);
+            } else {
+                trackSeq(event);
+            }
+        }
+        lastSeq = replay.last_seq;
+    });
+
     return socket;
 }
 